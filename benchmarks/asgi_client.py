@@ -0,0 +1,54 @@
+"""
+Minimal in-process http client for the FastAPI app, so benchmarks exercise the
+full request path (routing, validation, serialization) without a server or
+extra dependencies.
+"""
+import asyncio
+import json
+from typing import Dict, Tuple
+
+
+async def request(app, method: str, path: str, body=None, headers: Dict[str, str] = None) -> Tuple[int, Dict, bytes]:
+    """
+    Send one request to the ASGI app and return (status, headers, body).
+    """
+    raw_body = json.dumps(body).encode() if body is not None else b""
+    path, _, query_string = path.partition("?")
+    raw_headers = [(b"content-type", b"application/json")]
+    raw_headers += [(name.lower().encode(), value.encode()) for name, value in (headers or {}).items()]
+
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": method,
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "query_string": query_string.encode(),
+        "root_path": "",
+        "headers": raw_headers,
+        "client": ("127.0.0.1", 0),
+        "server": ("testserver", 80),
+    }
+
+    body_sent = False
+    response = {"status": None, "headers": {}, "body": []}
+
+    async def receive():
+        nonlocal body_sent
+        if not body_sent:
+            body_sent = True
+            return {"type": "http.request", "body": raw_body, "more_body": False}
+        # the client stays connected until the response is complete
+        await asyncio.Event().wait()
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            response["status"] = message["status"]
+            response["headers"] = {name.decode(): value.decode() for name, value in message.get("headers", [])}
+        elif message["type"] == "http.response.body":
+            response["body"].append(message.get("body", b""))
+
+    await app(scope, receive, send)
+    return response["status"], response["headers"], b"".join(response["body"])
@@ -0,0 +1,86 @@
+"""
+Import throughput of the bulk task endpoint against adding tasks one at a time.
+
+A fresh data folder gets a team with some users and boards, then the same number
+of tasks is added once with add_task per task and once with add_tasks_bulk in
+batches, and the rows/sec of both are reported.
+
+    python -m benchmarks.bulk_import --tasks 5000 --batch 1000 --backend json
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+
+STORE_FILES = ["users.json", "team.json", "board.json", "task.json", "user_team_linking.json"]
+
+
+def run(tasks: int, batch: int, boards: int, users: int) -> dict:
+    from board.controller import ProjectBoardBase
+    from board.schema import BoardBase, TaskBase
+    from common.user_team_linking import UserTeamLinkingBase
+    from teams.controller import TeamBase
+    from teams.schema import TeamCreateRequest
+    from users.controller import UserController
+    from users.schema import UserRequest
+
+    user_results = UserController().create_users_bulk(
+        [UserRequest(name=f"user{i}", display_name=f"User {i}", description="") for i in range(users)])
+    user_ids = [result["id"] for result in user_results]
+    team_id = TeamBase().create_team(TeamCreateRequest(name="team", description="", admin=user_ids[0]))
+    UserTeamLinkingBase().add_users_to_team(team_id, user_ids)
+
+    controller = ProjectBoardBase()
+    board_results = controller.create_boards_bulk(
+        [BoardBase(name=f"board{i}", description="", team_id=team_id) for i in range(boards)])
+    board_ids = [result["id"] for result in board_results]
+
+    def task(prefix, i):
+        return TaskBase(board_id=board_ids[i % boards], title=f"{prefix}{i}", description="",
+                        user_id=user_ids[i % users])
+
+    began = time.perf_counter()
+    for i in range(tasks):
+        controller.add_task(task("single", i))
+    single = time.perf_counter() - began
+
+    requests = [task("bulk", i) for i in range(tasks)]
+    began = time.perf_counter()
+    failed = 0
+    for start in range(0, tasks, batch):
+        results = controller.add_tasks_bulk(requests[start:start + batch])
+        failed += sum(1 for result in results if result["error"] is not None)
+    bulk = time.perf_counter() - began
+
+    return {
+        "single_rows_per_s": round(tasks / single, 1),
+        "bulk_rows_per_s": round(tasks / bulk, 1),
+        "speedup": round(single / bulk, 1),
+        "bulk_failed": failed,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tasks", type=int, default=5000)
+    parser.add_argument("--batch", type=int, default=1000, help="tasks per bulk request")
+    parser.add_argument("--boards", type=int, default=50)
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--backend", choices=["json", "sqlite"], default="json")
+    args = parser.parse_args()
+
+    db_dir = tempfile.mkdtemp(prefix="factwise-bench-")
+    for file_name in STORE_FILES:
+        open(os.path.join(db_dir, file_name), 'w').close()
+    os.environ["FACTWISE_DB_DIR"] = db_dir
+    os.environ["FACTWISE_STORAGE_BACKEND"] = args.backend
+    os.environ["FACTWISE_SQLITE_PATH"] = os.path.join(db_dir, "factwise.sqlite3")
+
+    result = run(args.tasks, args.batch, args.boards, args.users)
+    result.update({"backend": args.backend, "tasks": args.tasks, "batch": args.batch})
+    print(json.dumps(result))
+
+
+if __name__ == "__main__":
+    main()
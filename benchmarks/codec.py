@@ -0,0 +1,81 @@
+"""
+Parse and encode cost of large task and user lists with the stdlib json module and
+with orjson, on the paths the app uses them:
+
+  * store files: parsing and writing the json list of a store
+  * responses: encoding a list of response models (jsonable_encoder + json.dumps
+    against orjson with a model hook)
+
+    python -m benchmarks.codec --rows 100000
+"""
+import argparse
+import json
+import time
+from datetime import datetime
+
+from benchmarks.seeding import synthetic_rows
+
+
+def best_of(function, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        began = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - began)
+    return min(timings)
+
+
+def compare(name: str, stdlib, fast, repeat: int) -> dict:
+    stdlib_s = best_of(stdlib, repeat)
+    fast_s = best_of(fast, repeat) if fast is not None else None
+    return {
+        "case": name,
+        "json_ms": round(stdlib_s * 1000, 2),
+        "orjson_ms": round(fast_s * 1000, 2) if fast_s is not None else None,
+        "speedup": round(stdlib_s / fast_s, 1) if fast_s else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=100000, help="users and tasks in the lists")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    from fastapi.encoders import jsonable_encoder
+
+    from board.schema import TaskList
+    from common import codec
+    from users.schema import UserListResponse
+
+    fast = codec.orjson if codec.FAST else None
+    rows = synthetic_rows(args.rows, 100, 1000, args.rows)
+    results = []
+
+    for store in ("users", "tasks"):
+        data = rows[store]
+        text = json.dumps(data)
+        results.append(compare(f"load {store}", lambda: json.loads(text),
+                               fast and (lambda: fast.loads(text)), args.repeat))
+        results.append(compare(f"save {store}", lambda: json.dumps(data),
+                               fast and (lambda: fast.dumps(data)), args.repeat))
+
+    models = {
+        "users": [UserListResponse(**{**row, "creation_time": datetime.strptime(row["creation_time"],
+                                                                               '%Y-%m-%d %H:%M:%S')})
+                  for row in rows["users"]],
+        "tasks": [TaskList(**row) for row in rows["tasks"]],
+    }
+    for name, items in models.items():
+        results.append(compare(
+            f"response {name}",
+            lambda: json.dumps(jsonable_encoder(items)).encode("utf-8"),
+            fast and (lambda: codec.encode(items)),
+            args.repeat,
+        ))
+
+    print(json.dumps({"rows": args.rows, "orjson": fast is not None, "results": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
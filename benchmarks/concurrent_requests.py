@@ -0,0 +1,92 @@
+"""
+Latency of cheap requests while expensive ones are in flight.
+
+A data folder is seeded with synthetic users, teams, boards and tasks. Slow
+requests (full exports and full user listings) are then sent concurrently with
+a steady stream of cheap ones (describe a user, one every 2ms). If the handlers block the event loop
+the cheap requests queue up behind the slow ones and their latency explodes.
+
+    python -m benchmarks.concurrent_requests --users 20000 --tasks 50000
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import tempfile
+import time
+
+from benchmarks.seeding import seed
+
+
+def percentile(values, fraction: float) -> float:
+    values = sorted(values)
+    return values[min(int(len(values) * fraction), len(values) - 1)]
+
+
+async def measure(app, slow_requests: int, fast_requests: int) -> dict:
+    from benchmarks.asgi_client import request
+
+    async def timed(path, scheduled=None):
+        # latency counts from when the request was due, so time spent waiting
+        # for a blocked event loop is included
+        began = scheduled if scheduled is not None else time.perf_counter()
+        status, _, _ = await request(app, "GET", path)
+        assert status == 200, (path, status)
+        return time.perf_counter() - began
+
+    # warm the caches so both runs measure request handling, not the first load
+    await timed("/users/users/1")
+    await timed("/board/export_board")
+
+    async def fast_stream():
+        began = time.perf_counter()
+        pending = []
+        for i in range(fast_requests):
+            scheduled = began + i * 0.002
+            await asyncio.sleep(max(scheduled - time.perf_counter(), 0))
+            pending.append(asyncio.ensure_future(timed("/users/users/1", scheduled)))
+        return await asyncio.gather(*pending)
+
+    slow = [timed("/board/export_board" if i % 2 == 0 else "/users/users") for i in range(slow_requests)]
+    began = time.perf_counter()
+    results = await asyncio.gather(fast_stream(), *slow)
+    elapsed = time.perf_counter() - began
+
+    fast_latencies, slow_latencies = results[0], results[1:]
+    return {
+        "fast_p50_ms": round(statistics.median(fast_latencies) * 1000, 2),
+        "fast_p99_ms": round(percentile(fast_latencies, 0.99) * 1000, 2),
+        "fast_max_ms": round(max(fast_latencies) * 1000, 2),
+        "slow_mean_ms": round(statistics.mean(slow_latencies) * 1000, 2),
+        "elapsed_s": round(elapsed, 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=20000)
+    parser.add_argument("--teams", type=int, default=20)
+    parser.add_argument("--boards", type=int, default=200)
+    parser.add_argument("--tasks", type=int, default=50000)
+    parser.add_argument("--slow", type=int, default=4, help="number of concurrent slow requests")
+    parser.add_argument("--fast", type=int, default=200, help="number of fast requests, one every 2ms")
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix="factwise-bench-")
+    db_dir = os.path.join(work_dir, "db")
+    os.makedirs(db_dir)
+    os.makedirs(os.path.join(work_dir, "output"))
+    os.environ["FACTWISE_DB_DIR"] = db_dir
+    seed(db_dir, args.users, args.teams, args.boards, args.tasks)
+
+    os.chdir(work_dir)
+    from main import app
+
+    result = asyncio.run(measure(app, args.slow, args.fast))
+    result.update({"users": args.users, "tasks": args.tasks, "slow_requests": args.slow})
+    print(json.dumps(result))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""
+Write throughput of several processes sharing one data folder, the way uvicorn
+workers do, and a check that no update is lost and no id is handed out twice.
+
+    python -m benchmarks.concurrent_writes --workers 4 --ops 250 --backend json
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import tempfile
+import time
+
+STORE_FILES = ["users.json", "team.json", "board.json", "task.json", "user_team_linking.json"]
+
+
+def _worker(db_dir: str, backend: str, worker: int, ops: int, start, results):
+    os.environ["FACTWISE_DB_DIR"] = db_dir
+    os.environ["FACTWISE_STORAGE_BACKEND"] = backend
+    os.environ["FACTWISE_SQLITE_PATH"] = os.path.join(db_dir, "factwise.sqlite3")
+
+    from users.controller import UserController
+    from users.schema import UserRequest
+
+    controller = UserController()
+    start.wait()
+    began = time.perf_counter()
+    for i in range(ops):
+        controller.create_user(UserRequest(name=f"w{worker}-u{i}", display_name=f"user {i}", description=""))
+    results.put(time.perf_counter() - began)
+
+
+def run(workers: int, ops: int, backend: str) -> dict:
+    db_dir = tempfile.mkdtemp(prefix="factwise-bench-")
+    for file_name in STORE_FILES:
+        open(os.path.join(db_dir, file_name), 'w').close()
+
+    ctx = multiprocessing.get_context("spawn")
+    start = ctx.Event()
+    results = ctx.Queue()
+    processes = [
+        ctx.Process(target=_worker, args=(db_dir, backend, worker, ops, start, results))
+        for worker in range(workers)
+    ]
+    for process in processes:
+        process.start()
+
+    began = time.perf_counter()
+    start.set()
+    durations = [results.get() for _ in processes]
+    elapsed = time.perf_counter() - began
+    for process in processes:
+        process.join()
+
+    os.environ["FACTWISE_DB_DIR"] = db_dir
+    os.environ["FACTWISE_STORAGE_BACKEND"] = backend
+    os.environ["FACTWISE_SQLITE_PATH"] = os.path.join(db_dir, "factwise.sqlite3")
+    from common.storage import create_storage
+
+    users = create_storage("users", backend).load()
+    ids = [user["id"] for user in users]
+    expected = workers * ops
+
+    return {
+        "backend": backend,
+        "workers": workers,
+        "ops_per_worker": ops,
+        "rows": len(users),
+        "lost_updates": expected - len(users),
+        "duplicate_ids": len(ids) - len(set(ids)),
+        "elapsed_s": round(elapsed, 3),
+        "slowest_worker_s": round(max(durations), 3),
+        "ops_per_s": round(expected / elapsed, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--ops", type=int, default=250)
+    parser.add_argument("--backend", default="json", choices=["json", "sqlite"])
+    args = parser.parse_args()
+
+    print(json.dumps(run(args.workers, args.ops, args.backend)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""
+Throughput of the batch membership endpoint against the per team endpoints.
+
+A fresh data folder gets users and teams, then every user is linked to some
+teams once with add_users_to_team (per team, at most 50 users per call, like
+POST /teams/teams/{team_id}/users) and once with apply_memberships in batches,
+and the links/sec of both are reported. Half of the links are then removed the
+same two ways.
+
+    python -m benchmarks.memberships --users 2000 --teams 100 --per-user 3 --backend json
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+
+from common.schema import BULK_MAX_ITEMS
+
+# max users per call of the per team endpoints
+TEAM_CALL_USERS = 50
+
+
+def run(users: int, teams: int, per_user: int) -> dict:
+    from common.user_team_linking import UserTeamLinkingBase
+    from teams.controller import TeamBase
+    from teams.schema import MembershipOperation, TeamCreateRequest
+    from users.controller import UserController
+    from users.schema import UserRequest
+
+    user_ids = [result["id"] for result in UserController().create_users_bulk(
+        [UserRequest(name=f"user{i}", display_name=f"User {i}", description="") for i in range(users)])]
+    team_ids = [result["id"] for result in TeamBase().create_teams_bulk(
+        [TeamCreateRequest(name=f"team{i}", description="", admin=user_ids[0]) for i in range(teams)])]
+    linking = UserTeamLinkingBase()
+
+    def pairs(offset):
+        # user i joins the per_user teams following team i + offset
+        return [(team_ids[(i + offset + k) % teams], user_id)
+                for i, user_id in enumerate(user_ids) for k in range(per_user)]
+
+    def per_team(links, add):
+        by_team = {}
+        for team_id, user_id in links:
+            by_team.setdefault(team_id, []).append(user_id)
+        began = time.perf_counter()
+        for team_id, members in by_team.items():
+            for start in range(0, len(members), TEAM_CALL_USERS):
+                chunk = members[start:start + TEAM_CALL_USERS]
+                if add:
+                    linking.add_users_to_team(team_id, chunk)
+                else:
+                    linking.remove_users_from_team(team_id, chunk)
+        return time.perf_counter() - began
+
+    def batched(links, add):
+        operations = [MembershipOperation(team_id=team_id, user_id=user_id, action="add" if add else "remove")
+                      for team_id, user_id in links]
+        began = time.perf_counter()
+        for start in range(0, len(operations), BULK_MAX_ITEMS):
+            linking.apply_memberships(operations[start:start + BULK_MAX_ITEMS])
+        return time.perf_counter() - began
+
+    # different teams for the two methods, so each one creates its own links
+    per_team_links = pairs(0)
+    batch_links = pairs(per_user)
+    results = {
+        "links": len(per_team_links),
+        "add_per_team_s": per_team(per_team_links, True),
+        "add_batched_s": batched(batch_links, True),
+        "remove_per_team_s": per_team(per_team_links[::2], False),
+        "remove_batched_s": batched(batch_links[::2], False),
+    }
+    for name in ("add_per_team", "add_batched"):
+        results[f"{name}_links_per_s"] = round(len(per_team_links) / results[f"{name}_s"], 1)
+    for name in ("remove_per_team", "remove_batched"):
+        results[f"{name}_links_per_s"] = round(len(per_team_links[::2]) / results[f"{name}_s"], 1)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=2000)
+    parser.add_argument("--teams", type=int, default=100)
+    parser.add_argument("--per-user", type=int, default=3, help="teams joined by every user, per method")
+    parser.add_argument("--backend", choices=["json", "sqlite"], default="json")
+    args = parser.parse_args()
+
+    db_dir = tempfile.mkdtemp(prefix="factwise-bench-")
+    os.environ["FACTWISE_DB_DIR"] = db_dir
+    os.environ["FACTWISE_STORAGE_BACKEND"] = args.backend
+    os.environ["FACTWISE_SQLITE_PATH"] = os.path.join(db_dir, "factwise.sqlite3")
+
+    results = run(args.users, args.teams, args.per_user)
+    print(json.dumps({"backend": args.backend, "users": args.users, "teams": args.teams, **results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
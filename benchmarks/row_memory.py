@@ -0,0 +1,90 @@
+"""
+Memory held by the entity cache per task row, with the cached rows kept as dicts
+(FACTWISE_COMPACT_ROWS=0) and as compact slotted records (the default).
+
+For each setting a fresh process loads the task store into the cache and reports
+the memory traced while loading (rows, keys and indexes) per row, the load time
+and the time taken to list the tasks of one board.
+
+    python -m benchmarks.row_memory --tasks 1000000
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from benchmarks.seeding import synthetic_rows
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def measure(compact: str, db_dir: str, tasks: int) -> dict:
+    os.environ["FACTWISE_DB_DIR"] = db_dir
+    os.environ["FACTWISE_COMPACT_ROWS"] = compact
+    from board.controller import ProjectBoardBase
+    from common.storage import get_storage
+
+    tracemalloc.start()
+    began = time.perf_counter()
+    storage = get_storage("tasks")
+    storage.get(1)
+    load_s = time.perf_counter() - began
+    memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    # the load time without the tracing overhead
+    began = time.perf_counter()
+    storage.invalidate()
+    storage.get(1)
+    load_s = min(load_s, time.perf_counter() - began)
+
+    controller = ProjectBoardBase()
+    timings = []
+    for _ in range(5):
+        began = time.perf_counter()
+        controller.list_tasks_in_board(1)
+        timings.append(time.perf_counter() - began)
+
+    return {
+        "rows": "records" if compact == "1" else "dicts",
+        "bytes_per_row": round(memory / tasks, 1),
+        "memory_bytes": memory,
+        "load_ms": round(load_s * 1000, 3),
+        "list_tasks_in_board_ms": round(min(timings) * 1000, 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tasks", type=int, default=1000000)
+    parser.add_argument("--boards", type=int, default=1000)
+    parser.add_argument("--compact", choices=["0", "1"], help=argparse.SUPPRESS)
+    parser.add_argument("--db-dir", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.compact:
+        print(json.dumps(measure(args.compact, args.db_dir, args.tasks)))
+        return
+
+    db_dir = tempfile.mkdtemp(prefix="factwise-bench-")
+    with open(os.path.join(db_dir, "task.json"), 'w') as f:
+        json.dump(synthetic_rows(1000, 10, args.boards, args.tasks)["tasks"], f)
+
+    results = []
+    for compact in ("0", "1"):
+        completed = subprocess.run(
+            [sys.executable, "-m", "benchmarks.row_memory", "--compact", compact, "--db-dir", db_dir,
+             "--tasks", str(args.tasks)],
+            capture_output=True, text=True, check=True, cwd=REPO_DIR,
+        )
+        results.append(json.loads(completed.stdout.strip().splitlines()[-1]))
+
+    print(json.dumps({"tasks": args.tasks, "boards": args.boards, "results": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
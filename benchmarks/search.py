@@ -0,0 +1,99 @@
+"""
+Latency of the task search at scale.
+
+Tasks get titles and descriptions drawn from a synthetic vocabulary, so words
+are shared between tasks like in real text. The benchmark reports the time and
+memory taken to build the text index on the first search, and the latency of
+queries of one and two words, matched in full and as prefixes.
+
+    python -m benchmarks.search --tasks 1000000
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import tempfile
+import time
+import tracemalloc
+
+from benchmarks.seeding import synthetic_rows
+
+SYLLABLES = ["ka", "lo", "mi", "ne", "ru", "ta", "vo", "ze", "pi", "sa", "do", "fe", "gu", "ha", "ji"]
+
+
+def vocabulary(size: int, rng: random.Random):
+    return list(dict.fromkeys(
+        "".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4))) for _ in range(size * 2)
+    ))[:size]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tasks", type=int, default=1000000)
+    parser.add_argument("--words", type=int, default=20000, help="size of the vocabulary")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--limit", type=int, default=20)
+    args = parser.parse_args()
+
+    rng = random.Random(7)
+    words = vocabulary(args.words, rng)
+    rows = synthetic_rows(1000, 10, 1000, args.tasks)
+    for task in rows["tasks"]:
+        task["title"] = " ".join(rng.choices(words, k=3)) + f" {task['id']}"
+        task["description"] = " ".join(rng.choices(words, k=8))
+
+    db_dir = tempfile.mkdtemp(prefix="factwise-bench-")
+    with open(os.path.join(db_dir, "task.json"), 'w') as f:
+        json.dump(rows["tasks"], f)
+    os.environ["FACTWISE_DB_DIR"] = db_dir
+
+    from search.controller import SearchController
+
+    controller = SearchController()
+    controller.task_storage.get(1)
+
+    began = time.perf_counter()
+    controller.search_tasks(words[0], args.limit)
+    build_s = time.perf_counter() - began
+
+    # built again while tracing, to measure its memory
+    controller.task_storage.indexes["text"].rebuild(())
+    tracemalloc.start()
+    controller.search_tasks(words[0], args.limit)
+    memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    cases = {
+        "word": lambda: rng.choice(words),
+        "prefix": lambda: rng.choice(words)[:3],
+        "two_words": lambda: " ".join(rng.choice(rows["tasks"])["description"].split()[:2]),
+        "two_prefixes": lambda: " ".join(word[:3] for word in rng.choice(rows["tasks"])["title"].split()[:2]),
+    }
+    results = {}
+    for name, make_query in cases.items():
+        latencies = []
+        found = 0
+        for _ in range(args.queries):
+            query = make_query()
+            began = time.perf_counter()
+            found += len(controller.search_tasks(query, args.limit))
+            latencies.append(time.perf_counter() - began)
+        latencies.sort()
+        results[name] = {
+            "mean_ms": round(statistics.mean(latencies) * 1000, 3),
+            "p50_ms": round(latencies[len(latencies) // 2] * 1000, 3),
+            "p99_ms": round(latencies[min(int(len(latencies) * 0.99), len(latencies) - 1)] * 1000, 3),
+            "mean_results": round(found / args.queries, 1),
+        }
+
+    print(json.dumps({
+        "tasks": args.tasks,
+        "build_ms": round(build_s * 1000, 1),
+        "index_memory_bytes": memory,
+        "queries": results,
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
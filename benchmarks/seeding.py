@@ -0,0 +1,64 @@
+"""
+Synthetic data for the benchmarks.
+"""
+import json
+import os
+from typing import Dict, List
+
+# users, teams, boards and tasks per named scale; every user is linked to one team
+SCALES = {
+    "1k": {"users": 1000, "teams": 10, "boards": 100, "tasks": 1000},
+    "100k": {"users": 100000, "teams": 100, "boards": 1000, "tasks": 100000},
+    "1m": {"users": 1000000, "teams": 1000, "boards": 10000, "tasks": 1000000},
+}
+
+
+def synthetic_rows(users: int, teams: int, boards: int, tasks: int) -> Dict[str, List[Dict]]:
+    """
+    Rows of every store, keyed by store name. User i is linked to team (i - 1) % teams + 1,
+    board i belongs to team (i - 1) % teams + 1 and each task is assigned to a user of its board's team.
+    """
+    now = "2023-01-01 00:00:00"
+    user_rows = [
+        {"id": i, "name": f"user{i}", "display_name": f"User {i}", "description": "", "creation_time": now}
+        for i in range(1, users + 1)
+    ]
+    team_rows = [
+        {"id": i, "name": f"team{i}", "description": "", "creation_time": "2023-01-01 00:00:00.000000",
+         "admin": 1, "users": []}
+        for i in range(1, teams + 1)
+    ]
+    board_rows = [
+        {"id": i, "name": f"board{i}", "description": "", "team_id": (i - 1) % teams + 1,
+         "creation_time": now, "board_status": "Open", "version": 1}
+        for i in range(1, boards + 1)
+    ]
+    link_rows = [{"user_id": i, "team_id": (i - 1) % teams + 1} for i in range(1, users + 1)]
+    task_rows = []
+    for i in range(1, tasks + 1):
+        board = board_rows[(i - 1) % boards]
+        # assign the task to a user linked to the board's team
+        user_id = board["team_id"] + teams * ((i // boards) % max(users // teams, 1))
+        task_rows.append({"id": i, "creation_time": now, "task_status": "Open", "board_id": board["id"],
+                          "title": f"task{i}", "description": "", "user_id": min(user_id, users)})
+
+    return {"users": user_rows, "teams": team_rows, "boards": board_rows, "tasks": task_rows,
+            "user_team_linking": link_rows}
+
+
+def seed(db_dir: str, users: int, teams: int, boards: int, tasks: int, backend: str = "json",
+         sqlite_path: str = None):
+    """
+    Write synthetic rows straight into the json files of a data folder, or into the
+    sqlite database with the sqlite backend. Set the FACTWISE_* environment first,
+    the app configuration is read when the storage module is imported.
+    """
+    from common.storage import STORES, SQLiteStorage
+
+    for name, rows in synthetic_rows(users, teams, boards, tasks).items():
+        file_name, key_fields = STORES[name]
+        if backend == "sqlite":
+            SQLiteStorage(name, sqlite_path or os.path.join(db_dir, "factwise.sqlite3"), key_fields).insert_many(rows)
+        else:
+            with open(os.path.join(db_dir, file_name), 'w') as f:
+                json.dump(rows, f)
@@ -0,0 +1,90 @@
+"""
+Time to ready of a worker, loading the stores from the data files against
+loading them from their snapshots (python -m common.snapshot).
+
+Every start runs in a fresh process, which imports the app, loads every store
+(FACTWISE_PRELOAD=all) and then serves a first request to a few endpoints,
+building the indexes they use. The starts measured are:
+
+  * engine: snapshots disabled, the stores are parsed from the data files
+  * snapshot: the stores and their indexes are read from the snapshots
+  * lazy: snapshots, nothing preloaded, each store is loaded by its first request
+
+    python -m benchmarks.startup --tasks 1000000
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.seeding import seed
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+FIRST_REQUESTS = ["/board/tasks?board_id=3&limit=10", "/stats", "/users/users/7"]
+
+
+def run_worker() -> dict:
+    began = time.perf_counter()
+    import main
+    from benchmarks.asgi_client import request
+    from common.startup import startup
+
+    import_s = time.perf_counter() - began
+    startup.start()
+    while not startup.ready:
+        time.sleep(0.005)
+
+    first_requests = {}
+    for path in FIRST_REQUESTS:
+        requested = time.perf_counter()
+        status, _, _ = asyncio.run(request(main.app, "GET", path))
+        first_requests[path] = {"status": status, "ms": round((time.perf_counter() - requested) * 1000, 1)}
+    return {
+        "import_s": round(import_s, 3),
+        "time_to_ready_s": startup.ready_s,
+        "stores": startup.stores,
+        "first_requests": first_requests,
+        "total_s": round(time.perf_counter() - began, 3),
+    }
+
+
+def start(environment: dict) -> dict:
+    completed = subprocess.run([sys.executable, "-m", "benchmarks.startup", "--worker"], env=environment,
+                               capture_output=True, text=True, check=True, cwd=REPO_DIR)
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tasks", type=int, default=1000000)
+    parser.add_argument("--boards", type=int, default=1000)
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        print(json.dumps(run_worker()))
+        return
+
+    db_dir = tempfile.mkdtemp(prefix="factwise-bench-")
+    environment = {**os.environ, "FACTWISE_DB_DIR": db_dir, "FACTWISE_SNAPSHOT_DIR": os.path.join(db_dir, "snapshots"),
+                   "FACTWISE_STORAGE_BACKEND": "json", "FACTWISE_SNAPSHOT_INTERVAL": "0"}
+    os.environ.update(environment)
+    seed(db_dir, 1000, 10, args.boards, args.tasks)
+
+    results = {"engine": start({**environment, "FACTWISE_SNAPSHOTS": "0", "FACTWISE_PRELOAD": "all"})}
+    began = time.perf_counter()
+    subprocess.run([sys.executable, "-m", "common.snapshot"], env=environment, capture_output=True, check=True,
+                   cwd=REPO_DIR)
+    results["snapshot_build_s"] = round(time.perf_counter() - began, 3)
+    results["snapshot"] = start({**environment, "FACTWISE_PRELOAD": "all"})
+    results["lazy"] = start({**environment, "FACTWISE_PRELOAD": ""})
+    print(json.dumps({"tasks": args.tasks, "boards": args.boards, **results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""
+Latency of the statistics endpoints at scale, served from the running counts,
+against counting the same tasks with a scan of the cached rows.
+
+The benchmark reports the time and memory taken by the count indexes when the
+task store is loaded, the latency of the overview, team and user statistics,
+and the time taken by a full recount (POST /stats/rebuild).
+
+    python -m benchmarks.stats --tasks 1000000
+"""
+import argparse
+import json
+import os
+import random
+import tempfile
+import time
+import tracemalloc
+
+from benchmarks.seeding import synthetic_rows
+
+STATUSES = ["Open", "In Progress", "Closed"]
+
+
+def timed(run, repeat: int) -> float:
+    best = None
+    for _ in range(repeat):
+        began = time.perf_counter()
+        run()
+        elapsed = time.perf_counter() - began
+        best = elapsed if best is None else min(best, elapsed)
+    return round(best * 1000, 3)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tasks", type=int, default=1000000)
+    parser.add_argument("--boards", type=int, default=1000)
+    parser.add_argument("--teams", type=int, default=10)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    rng = random.Random(7)
+    rows = synthetic_rows(1000, args.teams, args.boards, args.tasks)
+    for task in rows["tasks"]:
+        task["task_status"] = rng.choice(STATUSES)
+
+    db_dir = tempfile.mkdtemp(prefix="factwise-bench-")
+    for name, file_name in [("users", "users.json"), ("teams", "team.json"), ("boards", "board.json"),
+                            ("tasks", "task.json"), ("user_team_linking", "user_team_linking.json")]:
+        with open(os.path.join(db_dir, file_name), 'w') as f:
+            json.dump(rows[name], f)
+    os.environ["FACTWISE_DB_DIR"] = db_dir
+
+    from common.indexes import CountIndex
+    from stats.controller import StatsController
+
+    controller = StatsController()
+    storage = controller.task_storage
+    storage.get(1)
+
+    loaded = list(storage._rows.items())
+    count_indexes = [index for index in storage.indexes.values() if isinstance(index, CountIndex)]
+    began = time.perf_counter()
+    for index in count_indexes:
+        index.rebuild(loaded)
+    build_s = time.perf_counter() - began
+    tracemalloc.start()
+    for index in count_indexes:
+        index.rebuild(loaded)
+    memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    def scanned_team_counts(team_id: int):
+        # what a stats endpoint without running counts would do
+        boards = {board["id"] for board in controller.board_storage.find_all("team_id", team_id)}
+        counts = {}
+        for task in storage.scan(lambda task: task["board_id"] in boards):
+            counts[task["task_status"]] = counts.get(task["task_status"], 0) + 1
+        return counts
+
+    results = {
+        "overview_ms": timed(controller.overview, args.repeat),
+        "team_stats_ms": timed(lambda: controller.team_stats(3), args.repeat),
+        "user_stats_ms": timed(lambda: controller.user_stats(7), args.repeat),
+        "scan_count_ms": timed(lambda: scanned_team_counts(3), 3),
+        "verify_ms": timed(controller.verify, 1),
+    }
+    print(json.dumps({
+        "tasks": args.tasks,
+        "boards": args.boards,
+        "count_indexes": {"build_ms": round(build_s * 1000, 1), "memory_bytes": memory},
+        **results,
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
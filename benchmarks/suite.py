@@ -0,0 +1,231 @@
+"""
+Benchmark suite of the hot paths, at several data scales.
+
+For every scale a fresh data folder is seeded with synthetic users, teams, boards,
+tasks and links, then the suite measures:
+
+  * controller operations: create_user, add_task, list_tasks_in_board,
+    get_teams_of_a_user and export_board (one board and all boards)
+  * end-to-end http requests through the FastAPI app, in process, with a
+    number of concurrent clients
+
+Every scale runs in its own process, so the caches and the configuration read at
+import time start fresh. The results are written as json, one object per scale,
+to compare runs between releases.
+
+    python -m benchmarks.suite --scales 1k 100k --backend json --output results.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from typing import Callable, Dict, List
+
+from benchmarks.seeding import SCALES, seed
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def summarize(latencies: List[float], elapsed: float = None) -> Dict:
+    """
+    Latency percentiles in milliseconds and the throughput of a list of timings in seconds.
+    """
+    latencies = sorted(latencies)
+
+    def percentile(fraction):
+        return round(latencies[min(int(len(latencies) * fraction), len(latencies) - 1)] * 1000, 3)
+
+    elapsed = elapsed if elapsed is not None else sum(latencies)
+    return {
+        "count": len(latencies),
+        "mean_ms": round(statistics.mean(latencies) * 1000, 3),
+        "p50_ms": percentile(0.5),
+        "p95_ms": percentile(0.95),
+        "p99_ms": percentile(0.99),
+        "max_ms": round(latencies[-1] * 1000, 3),
+        "ops_per_s": round(len(latencies) / elapsed, 1) if elapsed else None,
+    }
+
+
+def time_operation(operation: Callable[[int], object], iterations: int) -> Dict:
+    """
+    Time operation(i) for i in range(iterations). The first call, which loads the
+    stores into the caches, is reported separately as cold_ms.
+    """
+    began = time.perf_counter()
+    operation(0)
+    cold = time.perf_counter() - began
+
+    latencies = []
+    for i in range(1, iterations + 1):
+        began = time.perf_counter()
+        operation(i)
+        latencies.append(time.perf_counter() - began)
+
+    return {"cold_ms": round(cold * 1000, 3), **summarize(latencies)}
+
+
+def run_controllers(sizes: Dict, iterations: int) -> Dict:
+    from board.controller import ProjectBoardBase
+    from board.schema import ExportFormat, TaskBase
+    from common.user_team_linking import UserTeamLinkingBase
+    from users.controller import UserController
+    from users.schema import UserRequest
+
+    users = UserController()
+    boards = ProjectBoardBase()
+    linking = UserTeamLinkingBase()
+    # board 1 belongs to team 1, which user 1 is linked to
+    board_id, user_id = 1, 1
+
+    return {
+        "create_user": time_operation(
+            lambda i: users.create_user(UserRequest(name=f"bench-user{i}", display_name="Bench", description="")),
+            iterations),
+        "add_task": time_operation(
+            lambda i: boards.add_task(TaskBase(board_id=board_id, title=f"bench-task{i}", description="",
+                                               user_id=user_id)),
+            iterations),
+        "list_tasks_in_board": time_operation(lambda i: boards.list_tasks_in_board(board_id), iterations),
+        "get_teams_of_a_user": time_operation(lambda i: linking.get_teams_of_a_user(user_id), iterations),
+        "export_board": time_operation(
+            lambda i: os.remove(boards.export_board(ExportFormat.TEXT, board_id=board_id)), iterations),
+        # cold_ms renders every board, the timed runs reuse the cached fragments
+        "export_all_boards": time_operation(
+            lambda i: os.remove(boards.export_board(ExportFormat.TEXT)),
+            max(1, min(iterations, 1_000_000 // sizes["tasks"]))),
+    }
+
+
+async def run_http(app, requests: int, concurrency: int) -> Dict:
+    from benchmarks.asgi_client import request
+
+    endpoints = {
+        "describe_user": lambda i: ("GET", "/users/users/1", None),
+        "create_user": lambda i: ("POST", "/users/users",
+                                  {"name": f"http-user{i}", "display_name": "Http", "description": ""}),
+        "list_tasks_in_board": lambda i: ("GET", "/board/tasks/1?limit=100", None),
+        "get_user_teams": lambda i: ("GET", "/users/users/1/teams", None),
+        "board_detail": lambda i: ("GET", "/board/detail/1", None),
+    }
+
+    results = {}
+    for name, make_request in endpoints.items():
+        # warm the caches before timing
+        method, path, body = make_request(-1)
+        status, _, _ = await request(app, method, path, body)
+        assert status < 300, (name, status)
+
+        latencies = []
+        counter = iter(range(requests))
+
+        async def client():
+            for i in counter:
+                method, path, body = make_request(i)
+                began = time.perf_counter()
+                status, _, _ = await request(app, method, path, body)
+                latencies.append(time.perf_counter() - began)
+                assert status < 300, (name, status)
+
+        began = time.perf_counter()
+        await asyncio.gather(*(client() for _ in range(concurrency)))
+        results[name] = summarize(latencies, time.perf_counter() - began)
+
+    return results
+
+
+def run_scale(scale: str, backend: str, iterations: int, requests: int, concurrency: int) -> Dict:
+    """
+    Seed a fresh data folder at the given scale and measure it. Must run in a fresh process.
+    """
+    sizes = SCALES[scale]
+    work_dir = tempfile.mkdtemp(prefix="factwise-bench-")
+    db_dir = os.path.join(work_dir, "db")
+    os.makedirs(db_dir)
+    os.makedirs(os.path.join(work_dir, "output"))
+
+    os.environ["FACTWISE_DB_DIR"] = db_dir
+    os.environ["FACTWISE_STORAGE_BACKEND"] = backend
+    os.environ["FACTWISE_SQLITE_PATH"] = os.path.join(db_dir, "factwise.sqlite3")
+    os.environ["FACTWISE_OUTPUT_DIR"] = os.path.join(work_dir, "output")
+
+    began = time.perf_counter()
+    seed(db_dir, backend=backend, **sizes)
+    seed_s = time.perf_counter() - began
+
+    controllers = run_controllers(sizes, iterations)
+
+    from main import app
+    http = asyncio.run(run_http(app, requests, concurrency))
+
+    return {
+        "scale": scale,
+        **sizes,
+        "backend": backend,
+        "seed_s": round(seed_s, 3),
+        "controllers": controllers,
+        "http": http,
+    }
+
+
+def environment() -> Dict:
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                                cwd=REPO_DIR).stdout.strip()
+    except OSError:
+        commit = None
+
+    return {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "commit": commit or None,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "json_mode": os.environ.get("FACTWISE_JSON_MODE", "rewrite"),
+        "cache": os.environ.get("FACTWISE_CACHE", "1"),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scales", nargs="+", choices=list(SCALES), default=["1k"])
+    parser.add_argument("--backend", choices=["json", "sqlite"], default="json")
+    parser.add_argument("--iterations", type=int, default=100, help="timed calls per controller operation")
+    parser.add_argument("--requests", type=int, default=500, help="http requests per endpoint")
+    parser.add_argument("--concurrency", type=int, default=8, help="concurrent http clients")
+    parser.add_argument("--output", help="json file to write the results to (default: stdout)")
+    parser.add_argument("--scale-only", choices=list(SCALES), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.scale_only:
+        result = run_scale(args.scale_only, args.backend, args.iterations, args.requests, args.concurrency)
+        print(json.dumps(result))
+        return
+
+    results = []
+    for scale in args.scales:
+        completed = subprocess.run(
+            [sys.executable, "-m", "benchmarks.suite", "--scale-only", scale, "--backend", args.backend,
+             "--iterations", str(args.iterations), "--requests", str(args.requests),
+             "--concurrency", str(args.concurrency)],
+            capture_output=True, text=True, check=True, cwd=REPO_DIR,
+        )
+        results.append(json.loads(completed.stdout.strip().splitlines()[-1]))
+        print(f"{scale}: done", file=sys.stderr)
+
+    report = json.dumps({"environment": environment(), "results": results}, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(report + "\n")
+    else:
+        print(report)
+
+
+if __name__ == "__main__":
+    main()
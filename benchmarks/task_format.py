@@ -0,0 +1,111 @@
+"""
+Task store formats compared: the json rows behind the entity cache against the
+memory-mapped columnar store (FACTWISE_TASK_FORMAT=columnar).
+
+For each format a fresh process reports the size on disk, the time and memory
+taken to open the store, listing the tasks of one board and counting tasks per
+status with and without a board filter.
+
+    python -m benchmarks.task_format --tasks 1000000
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from benchmarks.seeding import synthetic_rows
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def disk_size(path: str) -> int:
+    if os.path.isfile(path):
+        return os.path.getsize(path)
+    return sum(os.path.getsize(os.path.join(path, name)) for name in os.listdir(path))
+
+
+def timed(function, repeat: int = 5) -> float:
+    timings = []
+    for _ in range(repeat):
+        began = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - began)
+    return round(min(timings) * 1000, 3)
+
+
+def measure(task_format: str, db_dir: str) -> dict:
+    os.environ["FACTWISE_DB_DIR"] = db_dir
+    os.environ["FACTWISE_TASK_FORMAT"] = task_format
+    from board.controller import ProjectBoardBase
+    from common.cache import EntityCache
+    from common.storage import INDEXES, create_storage
+
+    # the conversion from task.json is a one-off, not part of opening the store
+    create_storage("tasks")
+
+    def open_store():
+        storage = create_storage("tasks")
+        if storage.cacheable:
+            storage = EntityCache(storage)
+        for name, fields, unique in INDEXES["tasks"]:
+            storage.add_index(name, fields, unique)
+        storage.get(1)
+        return storage
+
+    began = time.perf_counter()
+    storage = open_store()
+    open_ms = round((time.perf_counter() - began) * 1000, 3)
+
+    tracemalloc.start()
+    traced = open_store()
+    memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del traced
+
+    controller = ProjectBoardBase()
+    controller.task_storage = storage
+    path = os.path.join(db_dir, "task.columns" if task_format == "columnar" else "task.json")
+    return {
+        "format": task_format,
+        "disk_bytes": disk_size(path),
+        "open_ms": open_ms,
+        "open_memory_bytes": memory,
+        "list_tasks_in_board_ms": timed(lambda: controller.list_tasks_in_board(1)),
+        "count_by_status_ms": timed(lambda: storage.count_by("task_status")),
+        "count_board_by_status_ms": timed(lambda: storage.count_by("task_status", ("board_id", 1))),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tasks", type=int, default=1000000)
+    parser.add_argument("--boards", type=int, default=1000)
+    parser.add_argument("--format", choices=["rows", "columnar"], help=argparse.SUPPRESS)
+    parser.add_argument("--db-dir", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.format:
+        print(json.dumps(measure(args.format, args.db_dir)))
+        return
+
+    db_dir = tempfile.mkdtemp(prefix="factwise-bench-")
+    with open(os.path.join(db_dir, "task.json"), 'w') as f:
+        json.dump(synthetic_rows(1000, 10, args.boards, args.tasks)["tasks"], f)
+
+    results = []
+    for task_format in ("rows", "columnar"):
+        completed = subprocess.run(
+            [sys.executable, "-m", "benchmarks.task_format", "--format", task_format, "--db-dir", db_dir],
+            capture_output=True, text=True, check=True, cwd=REPO_DIR,
+        )
+        results.append(json.loads(completed.stdout.strip().splitlines()[-1]))
+
+    print(json.dumps({"tasks": args.tasks, "boards": args.boards, "results": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+"""
+Latency of the task queries (GET /board/tasks) at scale, against the client side
+filtering they replace: listing the tasks of every board involved and filtering
+them in the client.
+
+Tasks get creation times spread over a year and a random status. The benchmark
+reports the time and memory taken by the task indexes when the store is loaded,
+and the latency of each query.
+
+    python -m benchmarks.task_query --tasks 1000000
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+from benchmarks.seeding import synthetic_rows
+
+STATUSES = ["Open", "In Progress", "Closed"]
+START = datetime(2023, 1, 1)
+
+
+def timings(run, repeat: int) -> dict:
+    latencies = []
+    found = 0
+    for _ in range(repeat):
+        began = time.perf_counter()
+        found = len(run())
+        latencies.append(time.perf_counter() - began)
+    latencies.sort()
+    return {
+        "p50_ms": round(latencies[len(latencies) // 2] * 1000, 3),
+        "max_ms": round(latencies[-1] * 1000, 3),
+        "mean_ms": round(statistics.mean(latencies) * 1000, 3),
+        "results": found,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tasks", type=int, default=1000000)
+    parser.add_argument("--boards", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    rng = random.Random(7)
+    rows = synthetic_rows(1000, 10, args.boards, args.tasks)
+    seconds = 365 * 86400
+    for task in rows["tasks"]:
+        task["creation_time"] = str(START + timedelta(seconds=seconds * task["id"] // args.tasks))
+        task["task_status"] = rng.choice(STATUSES)
+
+    db_dir = tempfile.mkdtemp(prefix="factwise-bench-")
+    for name, file_name in [("users", "users.json"), ("teams", "team.json"), ("boards", "board.json"),
+                            ("tasks", "task.json"), ("user_team_linking", "user_team_linking.json")]:
+        with open(os.path.join(db_dir, file_name), 'w') as f:
+            json.dump(rows[name], f)
+    os.environ["FACTWISE_DB_DIR"] = db_dir
+
+    from board.controller import ProjectBoardBase
+    from board.schema import TaskQuery
+
+    controller = ProjectBoardBase()
+    storage = controller.task_storage
+    storage.get(1)
+
+    # time and memory of the indexes added for the queries, rebuilt from the loaded rows
+    loaded = list(storage._rows.items())
+    index_stats = {}
+    for name in ("task_status", "creation_time"):
+        index = storage.indexes[name]
+        began = time.perf_counter()
+        index.rebuild(loaded)
+        build_s = time.perf_counter() - began
+        index.rebuild(())
+        tracemalloc.start()
+        index.rebuild(loaded)
+        memory = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        index_stats[name] = {"build_ms": round(build_s * 1000, 1), "memory_bytes": memory}
+
+    user_id = 7
+    team_id = 3
+    after = START + timedelta(days=360)
+    team_boards = [board["id"] for board in rows["boards"] if board["team_id"] == team_id]
+
+    def client_user_in_progress():
+        tasks = [task for board_id in range(1, args.boards + 1) for task in controller.list_tasks_in_board(board_id)]
+        return [task for task in tasks if task.user_id == user_id and task.task_status == "In Progress"]
+
+    def client_team_open():
+        tasks = [task for board_id in team_boards for task in controller.list_tasks_in_board(board_id)]
+        return [task for task in tasks if task.task_status == "Open"][:100]
+
+    cases = {
+        "user_in_progress": TaskQuery(user_id=user_id, statuses=["In Progress"], limit=1000),
+        "created_after_newest_first": TaskQuery(created_after=after, sort="-creation_time", limit=100),
+        "team_open": TaskQuery(team_id=team_id, statuses=["Open"], limit=100),
+        "team_open_newest_first": TaskQuery(team_id=team_id, statuses=["Open"], sort="-creation_time", limit=100),
+        "open_by_id": TaskQuery(statuses=["Open"], limit=100),
+    }
+    results = {name: timings(lambda: controller.query_tasks(query), args.repeat) for name, query in cases.items()}
+    # the client side filtering only runs a few times, it lists every task of the boards involved
+    results["client_user_in_progress"] = timings(client_user_in_progress, 2)
+    results["client_team_open"] = timings(client_team_open, 2)
+
+    print(json.dumps({
+        "tasks": args.tasks,
+        "boards": args.boards,
+        "indexes": index_stats,
+        "queries": results,
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
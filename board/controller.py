@@ -1,13 +1,51 @@
-import json
+import itertools
 import os
+import uuid
 from datetime import datetime
-from typing import List
-
+from typing import Iterator, List
+
+from common import config
+from common.change_feed import change_feed
+from common.instrumentation import span
+from common.pagination import paginate, paginate_index
+from common.schema import new_bulk_results, trusted_model
+from common.storage import get_storage
 from common.user_team_linking import UserTeamLinkingBase
 from teams.controller import TeamBase
-from users.controller import UserController
 
-from .schema import BoardBase, BoardList, TaskBase, TaskStatusUpdate, TaskList
+from .query import TaskQueryPlan
+from .export import FILE_EXTENSIONS, build_board_export, export_cache, render_board, render_header
+from .schema import (
+    BoardBase,
+    BoardList,
+    ExportFormat,
+    TaskBase,
+    TaskDetail,
+    TaskQuery,
+    TaskStatusBulkUpdate,
+    TaskStatusUpdate,
+    TaskList,
+)
+from .summary import board_summaries, build_board_summary
+from .versioning import bump_board_versions
+
+
+def _is_open_board(board: dict) -> bool:
+    return board["board_status"] != 'Closed'
+
+
+def _is_open_task(task: dict) -> bool:
+    return task["task_status"] != 'Closed'
+
+
+def _board_event(board: dict) -> dict:
+    return {"board_id": board["id"], "team_id": board["team_id"], "name": board["name"],
+            "board_status": board["board_status"], "version": board.get("version")}
+
+
+def _task_event(task: dict, versions: dict) -> dict:
+    return {"task_id": task["id"], "board_id": task["board_id"], "user_id": task["user_id"],
+            "title": task["title"], "task_status": task["task_status"], "version": versions.get(task["board_id"])}
 
 
 class ProjectBoardBase:
@@ -17,26 +55,10 @@ class ProjectBoardBase:
         """
 
     def __init__(self):
-        self.board_file_path = os.path.join("db", 'board.json')
-        self.task_file_path = os.path.join("db", 'task.json')
-
-    def _load_board_data(self):
-        self.boards = []
-        for line in open(self.board_file_path, 'r'):
-            self.boards.extend(json.loads(line))
-
-    def _save_board_data(self):
-        with open(self.board_file_path, "w") as f:
-            json.dump(self.boards, f)
-
-    def _load_task_data(self):
-        self.tasks = []
-        for line in open(self.task_file_path, 'r'):
-            self.tasks.extend(json.loads(line))
-
-    def _save_task_data(self):
-        with open(self.task_file_path, "w") as f:
-            json.dump(self.tasks, f)
+        self.board_storage = get_storage("boards")
+        self.task_storage = get_storage("tasks")
+        self.team_storage = get_storage("teams")
+        self.user_storage = get_storage("users")
 
     def create_board(self, board_request: BoardBase) -> int:
         """
@@ -58,21 +80,23 @@ class ProjectBoardBase:
         # validate that a team with that id exists
         team = TeamBase().get_team_by_id(board_request.team_id)
 
-        self._load_board_data()
+        with self.board_storage.transaction():
+            # Check if the board title name already exists for the team
+            if self.board_storage.find("team_name", (board_request.team_id, board_request.name)):
+                raise ValueError("Board already exists for this team")
 
-        # Check if the board title name already exists for the team
-        if any(t['name'] == board_request.name and t['team_id'] == board_request.team_id for t in self.boards):
-            raise ValueError("Board already exists for this team")
+            # Generate new board id
+            new_id = self.board_storage.next_id()
 
-        # Generate new team id
-        new_id = len(self.boards) + 1
+            new_board = {"id": new_id,
+                         'creation_time': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+                         "board_status": 'Open',
+                         "version": 1,
+                         **board_request.dict()}
+            self.board_storage.insert(new_board)
+            # published under the store lock, so the sequence follows the order of the writes
+            change_feed.publish([("board.created", _board_event(new_board))])
 
-        new_board = {"id": new_id,
-                     'creation_time': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
-                     "board_status": 'Open',
-                     **board_request.dict()}
-        self.boards.append(new_board)
-        self._save_board_data()
         return new_board["id"]
 
     def close_board(self, board_id: int):
@@ -89,9 +113,14 @@ class ProjectBoardBase:
           * You can only close boards with all tasks marked as COMPLETE
         """
 
-        board = self.get_board(board_id)
-        board["board_status"] = 'Closed'
-        self._save_board_data()
+        with self.board_storage.transaction():
+            board = self.get_board(board_id)
+            changes = {"board_status": 'Closed', "version": board.get("version", 0) + 1}
+            self.board_storage.update(board_id, changes)
+            board = {**board, **changes}
+            change_feed.publish([("board.closed", _board_event(board))])
+
+        board_summaries.apply_board(board)
 
     def add_task(self, task: TaskBase) -> int:
         """
@@ -125,19 +154,21 @@ class ProjectBoardBase:
         if not user_team_linking.check_if_user_and_team_linking_exists(board["team_id"], task.user_id):
             raise ValueError("The user the task is assigned to does not belong to the team that the board is for")
 
-        self._load_task_data()
+        with self.task_storage.transaction():
+            # Check if the task title name already exists
+            if self.task_storage.find("board_title", (task.board_id, task.title)):
+                raise ValueError("Task title already exists in this board")
 
-        # Check if the task title name already exists
-        if any(t['title'] == task.title and t['board_id'] == task.board_id for t in self.tasks):
-            raise ValueError("Task title already exists in this board")
+            new_task = {"id": self.task_storage.next_id(),
+                        'creation_time': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+                        'task_status': "Open",
+                        **task.dict()}
 
-        new_task = {"id": len(self.tasks) + 1,
-                    'creation_time': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
-                    'task_status': "Open",
-                    **task.dict()}
+            self.task_storage.insert(new_task)
+            versions = bump_board_versions([task.board_id])
+            change_feed.publish([("task.created", _task_event(new_task, versions))])
 
-        self.tasks.append(new_task)
-        self._save_task_data()
+        board_summaries.apply_tasks(versions, [new_task], self.user_storage.get)
         return new_task["id"]
 
     def update_task_status(self, task_id, update: TaskStatusUpdate):
@@ -148,14 +179,141 @@ class ProjectBoardBase:
             "status" : "OPEN | IN_PROGRESS | COMPLETE"
         }
         """
-        task = self.get_task_by_id(task_id)
+        with self.task_storage.transaction():
+            task = self.get_task_by_id(task_id)
+            self.task_storage.update(task_id, {"task_status": update.status.value})
+            versions = bump_board_versions([task["board_id"]])
+            task = {**task, "task_status": update.status.value}
+            change_feed.publish([("task.status_changed", _task_event(task, versions))])
+
+        board_summaries.apply_tasks(versions, [task], self.user_storage.get)
+
+    def create_boards_bulk(self, boards: List[BoardBase]) -> List[dict]:
+        """
+        Create many boards, validated in one pass and persisted in one write.
 
-        task["task_status"] = update.status
-        self._save_task_data()
+        :param boards: A list of board details, as for create_board
+        :return: One result per board, in request order
+        [
+          {"index" : <position in the request>, "id" : "<board_id>", "error" : "<reason it was not created>"}
+        ]
+        """
+        results = new_bulk_results(len(boards))
+
+        with self.board_storage.transaction():
+            valid = []
+            names = set()
+            for index, board in enumerate(boards):
+                key = (board.team_id, board.name)
+                if self.team_storage.get(board.team_id) is None:
+                    results[index]["error"] = "Team not found"
+                elif key in names or self.board_storage.find("team_name", key):
+                    results[index]["error"] = "Board already exists for this team"
+                else:
+                    names.add(key)
+                    valid.append(index)
+
+            creation_time = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+            rows = []
+            for index, board_id in zip(valid, self.board_storage.next_ids(len(valid)) if valid else []):
+                rows.append({"id": board_id,
+                             'creation_time': creation_time,
+                             "board_status": 'Open',
+                             "version": 1,
+                             **boards[index].dict()})
+                results[index]["id"] = board_id
+
+            if rows:
+                self.board_storage.insert_many(rows)
+            change_feed.publish(("board.created", _board_event(row)) for row in rows)
+
+        return results
+
+    def add_tasks_bulk(self, tasks: List[TaskBase]) -> List[dict]:
+        """
+        Add many tasks, validated in one pass and persisted in one write.
 
-    def list_boards(self) -> List[BoardList]:
+        :param tasks: A list of task details, as for add_task
+        :return: One result per task, in request order
+        [
+          {"index" : <position in the request>, "id" : "<task_id>", "error" : "<reason it was not added>"}
+        ]
         """
-        :param
+        results = new_bulk_results(len(tasks))
+        user_team_linking = UserTeamLinkingBase()
+
+        with self.task_storage.transaction():
+            valid = []
+            titles = set()
+            for index, task in enumerate(tasks):
+                board = self.board_storage.get(task.board_id)
+                key = (task.board_id, task.title)
+                if board is None:
+                    results[index]["error"] = "Board not found"
+                elif board["board_status"] == 'Closed':
+                    results[index]["error"] = "Board is closed"
+                elif not user_team_linking.check_if_user_and_team_linking_exists(board["team_id"], task.user_id):
+                    results[index]["error"] = ("The user the task is assigned to does not belong "
+                                               "to the team that the board is for")
+                elif key in titles or self.task_storage.find("board_title", key):
+                    results[index]["error"] = "Task title already exists in this board"
+                else:
+                    titles.add(key)
+                    valid.append(index)
+
+            creation_time = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+            rows = []
+            for index, task_id in zip(valid, self.task_storage.next_ids(len(valid)) if valid else []):
+                rows.append({"id": task_id,
+                             'creation_time': creation_time,
+                             'task_status': "Open",
+                             **tasks[index].dict()})
+                results[index]["id"] = task_id
+
+            if rows:
+                self.task_storage.insert_many(rows)
+            versions = bump_board_versions(row["board_id"] for row in rows)
+            change_feed.publish(("task.created", _task_event(row, versions)) for row in rows)
+
+        board_summaries.apply_tasks(versions, rows, self.user_storage.get)
+        return results
+
+    def update_task_status_bulk(self, updates: List[TaskStatusBulkUpdate]) -> List[dict]:
+        """
+        Update the status of many tasks in one write.
+
+        :param updates: A list of {"id" : "<task_id>", "status" : "<status>"}
+        :return: One result per update, in request order
+        [
+          {"index" : <position in the request>, "id" : "<task_id>", "error" : "<reason it was not updated>"}
+        ]
+        """
+        results = new_bulk_results(len(updates))
+        updated = []
+
+        with self.task_storage.transaction():
+            changes = []
+            for index, update in enumerate(updates):
+                task = self.task_storage.get(update.id)
+                if task is None:
+                    results[index]["error"] = "Task not found"
+                    continue
+                changes.append((update.id, {"task_status": update.status.value}))
+                updated.append({**task, "task_status": update.status.value})
+                results[index]["id"] = update.id
+
+            if changes:
+                self.task_storage.update_many(changes)
+            versions = bump_board_versions(task["board_id"] for task in updated)
+            change_feed.publish(("task.status_changed", _task_event(task, versions)) for task in updated)
+
+        board_summaries.apply_tasks(versions, updated, self.user_storage.get)
+        return results
+
+    def list_boards(self, after_id: int = None, limit: int = None) -> List[BoardList]:
+        """
+        :param after_id: return only boards with a larger id (keyset pagination)
+        :param limit: max number of boards to return
 
         :return:
         [
@@ -165,19 +323,21 @@ class ProjectBoardBase:
           }
         ]
         """
-        self._load_board_data()
-        return [
-            BoardList(**board)
-            for board in self.boards
-            if board["board_status"] != 'Closed'
-        ]
+        with span("model.list_boards"):
+            return list(self.iter_boards(after_id, limit))
 
-    def list_boards_of_a_team(self, team_id: int) -> List[BoardList]:
+    def iter_boards(self, after_id: int = None, limit: int = None) -> Iterator[BoardList]:
+        for board in paginate(self.board_storage.scan_after(after_id), limit=limit, predicate=_is_open_board):
+            yield trusted_model(BoardList, board)
+
+    def list_boards_of_a_team(self, team_id: int, after_id: int = None, limit: int = None) -> List[BoardList]:
         """
         :param request: A json string with the team identifier
         {
           "id" : "<team_id>"
         }
+        :param after_id: return only boards with a larger id (keyset pagination)
+        :param limit: max number of boards to return
 
         :return:
         [
@@ -187,119 +347,185 @@ class ProjectBoardBase:
           }
         ]
         """
-        self._load_board_data()
-        return [
-            BoardList(**board)
-            for board in self.boards
-            if board["board_status"] != 'Closed' and board["team_id"] == team_id
-        ]
+        with span("model.list_boards_of_a_team"):
+            return list(self.iter_boards_of_a_team(team_id, after_id, limit))
 
-    def list_tasks_in_board(self, board_id: int) -> List[TaskList]:
+    def iter_boards_of_a_team(self, team_id: int, after_id: int = None, limit: int = None) -> Iterator[BoardList]:
+        boards = paginate_index(self.board_storage, "team_id", team_id, after_id, limit, predicate=_is_open_board)
+        for board in boards:
+            yield trusted_model(BoardList, board)
+
+    def list_tasks_in_board(self, board_id: int, after_id: int = None, limit: int = None) -> List[TaskList]:
         """
         :param request: A json string with the team identifier
         {
           "id" : "<team_id>"
         }
+        :param after_id: return only tasks with a larger id (keyset pagination)
+        :param limit: max number of tasks to return
 
         :return:
 
         """
-        self._load_task_data()
-        return [
-            TaskList(**task)
-            for task in self.tasks
-            if task["task_status"] != 'Closed' and task["board_id"] == board_id
-        ]
-
-    def get_board(self, board_id: int) -> dict:
-        self._load_board_data()
+        with span("model.list_tasks_in_board"):
+            return list(self.iter_tasks_in_board(board_id, after_id, limit))
 
-        for board in self.boards:
-            if board["id"] == board_id:
-                return board
-        raise ValueError("Board not found")
+    def iter_tasks_in_board(self, board_id: int, after_id: int = None, limit: int = None) -> Iterator[TaskList]:
+        tasks = paginate_index(self.task_storage, "board_id", board_id, after_id, limit, predicate=_is_open_task)
+        for task in tasks:
+            yield trusted_model(TaskList, task)
 
-    def get_task_by_id(self, task_id: int) -> dict:
-        self._load_task_data()
+    def query_tasks(self, query: TaskQuery) -> List[TaskDetail]:
+        """
+        :param query: the filters, order and page of the tasks
+        {
+          "board_id" : "<board id>",
+          "team_id" : "<team id, the tasks of every board of the team>",
+          "user_id" : "<user id>",
+          "statuses" : ["<task status>"],
+          "created_after" : "<date:time>",
+          "created_before" : "<date:time>",
+          "sort" : "id | creation_time | -creation_time",
+          "after_id" : "<id of the last task of the previous page>",
+          "limit" : "<max number of tasks>"
+        }
+        :return: the matching tasks with their creation time, in the requested order
 
-        for task in self.tasks:
-            if task["id"] == task_id:
-                return task
-        raise ValueError("Task not found")
+        Constraint:
+         * every filter given must match, the query is answered from the task indexes
+        """
+        with span("model.query_tasks"):
+            return list(self.iter_query_tasks(query))
 
-    def get_board_by_task_id(self, task_id: int) -> dict:
-        for board in self.boards:
-            for task in board["tasks"]:
-                if task["id"] == task_id:
-                    return board
-        raise ValueError("Task not found")
+    def iter_query_tasks(self, query: TaskQuery) -> Iterator[TaskDetail]:
+        # planned before iterating, so a bad query fails before a response is streamed
+        rows = TaskQueryPlan(query, self.task_storage, self.board_storage).rows()
+        return (trusted_model(TaskDetail, task) for task in rows)
 
-    def export_board(self) -> str:
+    def describe_board(self, board_id: int) -> dict:
         """
-        Export a board in the out folder. The output will be a txt file.
-        We want you to be creative. Output a presentable view of the board and its tasks with the available data.
-        :param request:
+        :param board_id: id of the board
+        :return: A json string with the board, its team name, the task counts by status and the assignees
         {
-          "id" : "<board_id>"
-        }
-        :return:
-        {
-          "out_file" : "<name of the file created>"
+          "id" : "<board_id>",
+          "name" : "<board_name>",
+          "description" : "<description>",
+          "team_id" : "<team id>",
+          "team_name" : "<team name>",
+          "board_status" : "<status>",
+          "creation_time" : "<date:time when board was created>",
+          "version" : <board version>,
+          "total_tasks" : <number of tasks>,
+          "task_counts" : {"<status>" : <number of tasks>},
+          "assignees" : [
+            {"user_id" : "<user id>", "user_name" : "<user name>", "display_name" : "<display name>",
+             "task_count" : <number of tasks>}
+          ]
         }
+
+        Served from the materialized board summaries, rebuilt only when the board version changed.
         """
-        # Open the JSON file
-        self._load_board_data()
-        self._load_task_data()
+        return board_summaries.get(self.get_board(board_id), self._build_summary)
 
-        team_data = TeamBase().get_all_team_data()
-        user_data = UserController().get_all_user_data()
+    def _build_summary(self, board: dict) -> dict:
+        return build_board_summary(
+            board,
+            self.team_storage.get(board["team_id"]),
+            self.task_storage.find_all("board_id", board["id"]),
+            self.user_storage.get,
+        )
 
-        user_list = {
-            item["id"]: {"user_id": item["id"], "user_name": item["name"], "display_name": item["display_name"]}
-            for item in user_data
-        }
+    def get_board(self, board_id: int) -> dict:
+        board = self.board_storage.get(board_id)
+        if board is None:
+            raise ValueError("Board not found")
+        return board
 
-        team_list = {
-            item["id"]: {"name": item["name"], "description": item["description"],
-                         "creation_time": datetime.fromisoformat(item["creation_time"])}
-            for item in team_data
-        }
+    def get_task_by_id(self, task_id: int) -> dict:
+        task = self.task_storage.get(task_id)
+        if task is None:
+            raise ValueError("Task not found")
+        return task
+
+    def export_board(self, export_format: ExportFormat = ExportFormat.TEXT,
+                     board_id: int = None, team_id: int = None) -> str:
+        """
+        Export boards in the output folder, one board at a time, so memory stays bounded
+        by the size of a single board. Every export goes to a new file.
+
+        :param export_format: text (a readable view), ndjson (one board per line) or csv (one task per line)
+        :param board_id: export only this board
+        :param team_id: export only the boards of this team
+        :return: the path of the file created
+        """
+        file_name = "board_export_{}_{}.{}".format(
+            datetime.now().strftime('%Y%m%d-%H%M%S'), uuid.uuid4().hex[:8], FILE_EXTENSIONS[export_format]
+        )
+        export_file_path = os.path.join(config.OUTPUT_DIR, file_name)
+
+        chunks = self.iter_export(export_format, board_id, team_id)
+        # the board or team is checked by the first chunk, before any file is created
+        first = next(chunks, "")
+
+        # written under a temporary name, so a failed export leaves no partial file behind
+        temp_path = export_file_path + ".tmp"
+        try:
+            with open(temp_path, "w", newline="") as f:
+                f.write(first)
+                for chunk in chunks:
+                    f.write(chunk)
+            os.replace(temp_path, export_file_path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
 
-        task_list_by_board = {}
-        for task in self.tasks:
-            board = task_list_by_board.get(task["board_id"], [])
-            board.append({
-                "task_id": task["id"],
-                "task_title": task["title"],
-                "description": task["description"],
-                "user_id": task["user_id"],
-                "user_name": user_list[task["user_id"]]["user_name"],
-                "user_display_name": user_list[task["user_id"]]["user_name"],
-                "task_status": task["task_status"],
-                "creation_time": task["creation_time"],
-            })
-            task_list_by_board[task["board_id"]] = board
-
-        response = []
-
-        for board in self.boards:
-            response.append({
-                "board_id": board["id"],
-                "board_name": board["name"],
-                "description": board["description"],
-                "team_id": board["team_id"],
-                "team_name": team_list[board["team_id"]]["name"],
-                "team_description": team_list[board["team_id"]]["description"],
-                "tasks": task_list_by_board.get(board["id"], []),
-                "board_creation_time": board["creation_time"],
-                "board_status": board["board_status"],
-            })
-
-        export_file_path = os.path.join("output", 'output.txt')
-
-        # Export the data to a TXT file
-        with open(export_file_path, "w") as f:
-            f.write(str(response))
-
-        # Return a success message
         return export_file_path
+
+    def iter_export(self, export_format: ExportFormat = ExportFormat.TEXT,
+                    board_id: int = None, team_id: int = None) -> Iterator[str]:
+        """
+        Lazily render the export, board by board.
+        """
+        boards = self._iter_export_boards(board_id, team_id)
+        # fail before anything is written when the board or team does not exist
+        first = next(boards, None)
+
+        header = render_header(export_format)
+        if header:
+            yield header
+        if first is None:
+            return
+
+        for board in itertools.chain([first], boards):
+            yield self._render_board(board, export_format)
+
+    def _render_board(self, board: dict, export_format: ExportFormat) -> str:
+        # read the version before the tasks, a concurrent change then at worst
+        # caches newer content under the older version
+        version = board.get("version", 0)
+
+        rendered = export_cache.get(board["id"], export_format, version)
+        if rendered is None:
+            rendered = render_board(build_board_export(
+                board,
+                self.team_storage.get(board["team_id"]),
+                self.task_storage.find_all("board_id", board["id"]),
+                self.user_storage.get,
+            ), export_format)
+            export_cache.put(board["id"], export_format, version, rendered)
+
+        return rendered
+
+    def _iter_export_boards(self, board_id: int = None, team_id: int = None) -> Iterator[dict]:
+        if board_id is not None:
+            boards = [self.get_board(board_id)]
+            if team_id is not None and boards[0]["team_id"] != team_id:
+                boards = []
+        elif team_id is not None:
+            TeamBase().get_team_by_id(team_id)
+            boards = self.board_storage.find_all("team_id", team_id)
+        else:
+            boards = self.board_storage.scan_after()
+
+        yield from boards
@@ -0,0 +1,166 @@
+import csv
+import io
+import threading
+from collections import OrderedDict
+from typing import Dict, Iterator, Optional
+
+from common import codec, config
+
+from .schema import ExportFormat
+
+FILE_EXTENSIONS = {
+    ExportFormat.TEXT: "txt",
+    ExportFormat.NDJSON: "ndjson",
+    ExportFormat.CSV: "csv",
+}
+
+MEDIA_TYPES = {
+    ExportFormat.TEXT: "text/plain",
+    ExportFormat.NDJSON: "application/x-ndjson",
+    ExportFormat.CSV: "text/csv",
+}
+
+CSV_COLUMNS = [
+    "board_id", "board_name", "board_status", "board_creation_time", "team_id", "team_name",
+    "task_id", "task_title", "description", "task_status", "creation_time",
+    "user_id", "user_name", "user_display_name",
+]
+
+
+class ExportCache:
+    """
+    Rendered export fragments per (board id, format), tagged with the version of
+    the board they were rendered from. A fragment is reused only while the board
+    version is unchanged. The least recently used fragments are dropped once the
+    cached text exceeds max_chars.
+    """
+
+    def __init__(self, max_chars: int):
+        self.max_chars = max_chars
+        self._fragments = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, board_id: int, export_format: ExportFormat, version: int) -> Optional[str]:
+        with self._lock:
+            entry = self._fragments.get((board_id, export_format))
+            if entry is None or entry[0] != version:
+                self.misses += 1
+                return None
+
+            self._fragments.move_to_end((board_id, export_format))
+            self.hits += 1
+            return entry[1]
+
+    def put(self, board_id: int, export_format: ExportFormat, version: int, rendered: str):
+        with self._lock:
+            previous = self._fragments.pop((board_id, export_format), None)
+            if previous is not None:
+                self._size -= len(previous[1])
+
+            if len(rendered) > self.max_chars:
+                return
+            self._fragments[(board_id, export_format)] = (version, rendered)
+            self._size += len(rendered)
+
+            while self._size > self.max_chars:
+                _, (_, evicted) = self._fragments.popitem(last=False)
+                self._size -= len(evicted)
+
+    def stats(self) -> Dict:
+        return {"hits": self.hits, "misses": self.misses, "fragments": len(self._fragments), "chars": self._size}
+
+
+export_cache = ExportCache(config.EXPORT_CACHE_CHARS)
+
+
+def build_board_export(board: Dict, team: Dict, tasks: Iterator[Dict], users) -> Dict:
+    """
+    The exported view of one board: the board, its team and its tasks with their assignees.
+
+    :param users: a callable returning the user row for a user id
+    """
+    task_list = []
+    for task in tasks:
+        user = users(task["user_id"]) or {}
+        task_list.append({
+            "task_id": task["id"],
+            "task_title": task["title"],
+            "description": task["description"],
+            "user_id": task["user_id"],
+            "user_name": user.get("name"),
+            "user_display_name": user.get("display_name"),
+            "task_status": task["task_status"],
+            "creation_time": task["creation_time"],
+        })
+
+    return {
+        "board_id": board["id"],
+        "board_name": board["name"],
+        "description": board["description"],
+        "team_id": board["team_id"],
+        "team_name": team["name"] if team else None,
+        "team_description": team["description"] if team else None,
+        "tasks": task_list,
+        "board_creation_time": board["creation_time"],
+        "board_status": board["board_status"],
+    }
+
+
+def render_header(export_format: ExportFormat) -> str:
+    if export_format == ExportFormat.CSV:
+        return _csv_line(CSV_COLUMNS)
+    return ""
+
+
+def render_board(board: Dict, export_format: ExportFormat) -> str:
+    """
+    Render the export of one board in the given format.
+    """
+    if export_format == ExportFormat.NDJSON:
+        return codec.dumps_str(board) + "\n"
+    if export_format == ExportFormat.CSV:
+        return _render_csv(board)
+    return _render_text(board)
+
+
+def _csv_line(values) -> str:
+    buffer = io.StringIO()
+    csv.writer(buffer).writerow(values)
+    return buffer.getvalue()
+
+
+def _render_csv(board: Dict) -> str:
+    board_columns = [board["board_id"], board["board_name"], board["board_status"], board["board_creation_time"],
+                     board["team_id"], board["team_name"]]
+
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if not board["tasks"]:
+        writer.writerow(board_columns + [""] * (len(CSV_COLUMNS) - len(board_columns)))
+    for task in board["tasks"]:
+        writer.writerow(board_columns + [
+            task["task_id"], task["task_title"], task["description"], task["task_status"], task["creation_time"],
+            task["user_id"], task["user_name"], task["user_display_name"],
+        ])
+    return buffer.getvalue()
+
+
+def _render_text(board: Dict) -> str:
+    lines = [
+        f"Board #{board['board_id']}: {board['board_name']} [{board['board_status']}]",
+        f"  Team: {board['team_name']} (#{board['team_id']}) - {board['team_description']}",
+        f"  Description: {board['description']}",
+        f"  Created: {board['board_creation_time']}",
+        f"  Tasks ({len(board['tasks'])}):",
+    ]
+    for task in board["tasks"]:
+        lines.append(f"    #{task['task_id']} [{task['task_status']}] {task['task_title']} - {task['description']}")
+        lines.append(f"        assigned to {task['user_display_name']} ({task['user_name']}), "
+                     f"created {task['creation_time']}")
+    if not board["tasks"]:
+        lines.append("    (no tasks)")
+    lines.append("=" * 80)
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,160 @@
+import heapq
+import itertools
+from collections import namedtuple
+from datetime import datetime
+from typing import Callable, Dict, Iterable, Iterator, Optional
+
+from common.instrumentation import span
+from common.records import encode_time, time_value
+from common.storage import StorageEngine
+
+from .schema import TaskQuery, TaskSort
+
+# a way of reading the candidate rows of a query: the number of rows it reads, at most (None
+# for every row of the store), whether they come in the requested order, and the callable returning them
+Source = namedtuple("Source", ["name", "count", "ordered", "rows"])
+
+
+def time_bound(value: Optional[datetime]) -> Optional[int]:
+    """
+    A query time as the integer kept by the creation_time index. The stored times
+    are local and naive, so an aware time is converted to local time first.
+    """
+    if value is None:
+        return None
+    if value.tzinfo is not None:
+        value = value.astimezone().replace(tzinfo=None)
+    return encode_time(value.isoformat(sep=" "))
+
+
+class TaskQueryPlan:
+    """
+    How a task query is answered from the indexes of the task store.
+
+    Every filter with an index is a possible source of candidate rows: the
+    board_id index for the board (or for each board of the team), the user_id and
+    task_status indexes, and the creation_time sorted index for a time range. The
+    number of rows behind each is read from the index without loading any row.
+
+    Sources in the requested order (the creation_time index for the time sorts,
+    the id order of the store for the id sort) stop after `limit` matches, so they
+    are expected to read limit / selectivity rows, the selectivity being estimated
+    from the counts of the other filters and the size of the store, which is only
+    counted for that estimate. The other sources read all their rows
+    and keep the first `limit` matches. The source expected to read the fewest rows
+    is used and every other filter is checked on each row it returns.
+    """
+
+    def __init__(self, query: TaskQuery, task_storage: StorageEngine, board_storage: StorageEngine):
+        self.query = query
+        self.task_storage = task_storage
+        self.low = time_bound(query.created_after)
+        self.high = time_bound(query.created_before)
+        self.statuses = frozenset(status.value for status in query.statuses)
+        self.by_time = query.sort != TaskSort.ID
+        self.reverse = query.sort == TaskSort.CREATION_TIME_DESC
+
+        self.boards = None
+        if query.team_id is not None:
+            self.boards = {board["id"] for board in board_storage.find_all("team_id", query.team_id)}
+            if query.board_id is not None:
+                self.boards &= {query.board_id}
+        elif query.board_id is not None:
+            self.boards = {query.board_id}
+
+        # position of the after_id task in the requested order
+        self.cursor = query.after_id
+        if query.after_id is not None and self.by_time:
+            task = task_storage.get(query.after_id)
+            if task is None:
+                raise ValueError("Task not found")
+            self.cursor = (time_value(task), query.after_id)
+
+        self.source = self._choose(self._sources())
+
+    def _sources(self):
+        storage = self.task_storage
+        query = self.query
+        timed = self.low is not None or self.high is not None
+        # (source, whether it is one of the filters of the query)
+        filters = []
+
+        if self.boards is not None:
+            boards = sorted(self.boards)
+            filters.append((Source(
+                "board_id", sum(storage.count_all("board_id", board_id) for board_id in boards), False,
+                lambda: itertools.chain.from_iterable(storage.find_all("board_id", board_id) for board_id in boards),
+            ), True))
+        if query.user_id is not None:
+            filters.append((Source(
+                "user_id", storage.count_all("user_id", query.user_id), False,
+                lambda: storage.find_all("user_id", query.user_id),
+            ), True))
+        if self.statuses:
+            statuses = sorted(self.statuses)
+            filters.append((Source(
+                "task_status", sum(storage.count_all("task_status", status) for status in statuses), False,
+                lambda: itertools.chain.from_iterable(storage.find_all("task_status", status) for status in statuses),
+            ), True))
+        if timed or self.by_time:
+            after = self.cursor if self.by_time else None
+            filters.append((Source(
+                "creation_time", storage.count_range("creation_time", self.low, self.high), self.by_time,
+                lambda: storage.find_range("creation_time", self.low, self.high, self.reverse, after),
+            ), timed))
+
+        if not self.by_time:
+            filters.append((Source("id", None, True, lambda: storage.scan_after(self.cursor)), False))
+        return filters
+
+    def _choose(self, filters) -> Source:
+        total = None
+        best, best_cost = None, None
+        for source, _ in filters:
+            others = [other for other, filtering in filters if other is not source and filtering]
+            if source.ordered and others and total is None:
+                total = self.task_storage.count_range("creation_time")
+            count = source.count if source.count is not None else total
+            cost = float("inf") if count is None else count
+            if source.ordered:
+                # share of the rows that match the other filters
+                selectivity = 1.0
+                for other in others:
+                    selectivity *= other.count / total if total else 0.0
+                if selectivity > 0:
+                    cost = min(cost, self.query.limit / selectivity)
+            if best is None or cost < best_cost or (cost == best_cost and source.ordered):
+                best, best_cost = source, cost
+        return best
+
+    def accept(self, row: Dict) -> bool:
+        if self.boards is not None and row["board_id"] not in self.boards:
+            return False
+        if self.query.user_id is not None and row["user_id"] != self.query.user_id:
+            return False
+        if self.statuses and row["task_status"] not in self.statuses:
+            return False
+        if self.by_time or self.low is not None or self.high is not None:
+            created = time_value(row)
+            if created is None or (self.low is not None and created <= self.low) or (
+                    self.high is not None and created >= self.high):
+                return False
+        if self.cursor is not None:
+            position = self.sort_key(row)
+            if position >= self.cursor if self.reverse else position <= self.cursor:
+                return False
+        return True
+
+    def sort_key(self, row: Dict):
+        return (time_value(row), row["id"]) if self.by_time else row["id"]
+
+    def rows(self) -> Iterator[Dict]:
+        """
+        The matching rows in the requested order, at most `limit` of them.
+        """
+        with span(f"query.tasks.{self.source.name}"):
+            rows: Iterable[Dict] = filter(self.accept, self.source.rows())
+            if self.source.ordered:
+                return iter(list(itertools.islice(rows, self.query.limit)))
+            select: Callable = heapq.nlargest if self.reverse else heapq.nsmallest
+            return iter(select(self.query.limit, rows, key=self.sort_key))
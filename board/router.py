@@ -1,17 +1,36 @@
-from typing import List
+import itertools
+import os
+from datetime import datetime
+from typing import List, Optional
 
-from fastapi import APIRouter, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, status
 from pydantic import PositiveInt
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, StreamingResponse
+from starlette.concurrency import run_in_threadpool
+
+from common.concurrency import AsyncProxy
+from common.conditional import Conditional, StoreVersion, board_conditional
+from common.pagination import ListFormat, PageParams, ndjson_response
+from common.schema import BulkResponse
 
 from .controller import ProjectBoardBase
+from .export import FILE_EXTENSIONS, MEDIA_TYPES
 from .schema import (
     BoardBase,
+    BoardBulkCreateRequest,
+    BoardDetail,
     BoardResponse,
     TaskBase,
+    TaskBulkCreateRequest,
     TaskStatusUpdate,
+    TaskStatusBulkUpdateRequest,
     BoardList,
     TaskList,
+    TaskDetail,
+    TaskQuery,
+    TaskSort,
+    TaskStatus,
+    ExportFormat,
 
 )
 
@@ -20,22 +39,47 @@ router = APIRouter(
     tags=["board"]
 )
 
-board_base = ProjectBoardBase()
+board_base = AsyncProxy.lazy(ProjectBoardBase)
+
+# max number of tasks returned by one task query
+QUERY_MAX_LIMIT = 1000
+
+
+def task_query(
+        board_id: Optional[PositiveInt] = None,
+        team_id: Optional[PositiveInt] = None,
+        user_id: Optional[PositiveInt] = None,
+        task_status: List[TaskStatus] = Query([], alias="status"),
+        created_after: Optional[datetime] = None,
+        created_before: Optional[datetime] = None,
+        sort: TaskSort = TaskSort.ID,
+        after_id: Optional[PositiveInt] = None,
+        limit: int = Query(100, gt=0, le=QUERY_MAX_LIMIT),
+) -> TaskQuery:
+    return TaskQuery(board_id=board_id, team_id=team_id, user_id=user_id, statuses=task_status,
+                     created_after=created_after, created_before=created_before, sort=sort, after_id=after_id,
+                     limit=limit)
 
 
 @router.post("/create", response_model=BoardResponse, status_code=status.HTTP_201_CREATED)
 async def create_board(request: BoardBase):
     try:
-        board_id = board_base.create_board(request)
+        board_id = await board_base.create_board(request)
         return BoardResponse(id=board_id)
     except Exception as e:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
 
 
+@router.post("/create/bulk", response_model=BulkResponse)
+async def create_boards_bulk(request: BoardBulkCreateRequest):
+    results = await board_base.create_boards_bulk(request.boards)
+    return BulkResponse.from_results(results)
+
+
 @router.put("/close/{board_id}", status_code=status.HTTP_204_NO_CONTENT)
 async def close_board(board_id: PositiveInt):
     try:
-        response = board_base.close_board(board_id)
+        response = await board_base.close_board(board_id)
     except Exception as e:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
 
@@ -43,40 +87,91 @@ async def close_board(board_id: PositiveInt):
 @router.post("/add_task", response_model=BoardResponse, status_code=status.HTTP_201_CREATED)
 async def add_task(request: TaskBase):
     try:
-        task_id = board_base.add_task(request)
+        task_id = await board_base.add_task(request)
         return BoardResponse(id=task_id)
     except Exception as e:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
 
 
+@router.post("/add_task/bulk", response_model=BulkResponse)
+async def add_tasks_bulk(request: TaskBulkCreateRequest):
+    results = await board_base.add_tasks_bulk(request.tasks)
+    return BulkResponse.from_results(results)
+
+
+@router.put("/update_task_status/bulk", response_model=BulkResponse)
+async def update_task_status_bulk(request: TaskStatusBulkUpdateRequest):
+    results = await board_base.update_task_status_bulk(request.updates)
+    return BulkResponse.from_results(results)
+
+
 @router.put("/update_task_status/{task_id}", status_code=status.HTTP_204_NO_CONTENT)
 async def update_task_status(task_id: PositiveInt, request: TaskStatusUpdate):
     try:
-        board_base.update_task_status(task_id, request)
+        await board_base.update_task_status(task_id, request)
     except Exception as e:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
 
 
 @router.get("/team/{team_id}", response_model=List[BoardList])
-async def list_boards_of_a_team(team_id: PositiveInt):
+async def list_boards_of_a_team(team_id: PositiveInt, page: PageParams = Depends(),
+                                version: Conditional = Depends(StoreVersion("boards"))):
+    if version.not_modified:
+        return version.not_modified_response()
     try:
-        return board_base.list_boards_of_a_team(team_id)
+        if page.format == ListFormat.NDJSON:
+            return version.tag(ndjson_response(board_base.target.iter_boards_of_a_team(team_id, page.after_id,
+                                                                                      page.limit)))
+        return version.tag(await board_base.as_response.list_boards_of_a_team(team_id, page.after_id, page.limit))
     except Exception as e:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
 
 
 @router.get("/tasks/{board_id}", response_model=List[TaskList])
-async def list_tasks_in_board(board_id: PositiveInt):
+async def list_tasks_in_board(board_id: PositiveInt, page: PageParams = Depends(),
+                              version: Conditional = Depends(board_conditional)):
+    if version.not_modified:
+        return version.not_modified_response()
+    try:
+        if page.format == ListFormat.NDJSON:
+            return version.tag(ndjson_response(board_base.target.iter_tasks_in_board(board_id, page.after_id,
+                                                                                    page.limit)))
+        return version.tag(await board_base.as_response.list_tasks_in_board(board_id, page.after_id, page.limit))
+    except Exception as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+
+@router.get("/tasks", response_model=List[TaskDetail])
+async def query_tasks(query: TaskQuery = Depends(task_query), format: ListFormat = Query(ListFormat.JSON),
+                      version: Conditional = Depends(StoreVersion("tasks", "boards"))):
+    if version.not_modified:
+        return version.not_modified_response()
+    try:
+        if format == ListFormat.NDJSON:
+            return version.tag(ndjson_response(await board_base.iter_query_tasks(query)))
+        return version.tag(await board_base.as_response.query_tasks(query))
+    except Exception as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+
+@router.get("/detail/{board_id}", response_model=BoardDetail)
+async def describe_board(board_id: PositiveInt, version: Conditional = Depends(board_conditional)):
+    if version.not_modified:
+        return version.not_modified_response()
     try:
-        return board_base.list_tasks_in_board(board_id)
+        return version.tag(await board_base.as_response.describe_board(board_id))
     except Exception as e:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
 
 
 @router.get("/", response_model=List[BoardList])
-async def list_boards():
+async def list_boards(page: PageParams = Depends(), version: Conditional = Depends(StoreVersion("boards"))):
+    if version.not_modified:
+        return version.not_modified_response()
     try:
-        return board_base.list_boards()
+        if page.format == ListFormat.NDJSON:
+            return version.tag(ndjson_response(board_base.target.iter_boards(page.after_id, page.limit)))
+        return version.tag(await board_base.as_response.list_boards(page.after_id, page.limit))
     except Exception as e:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
 
@@ -86,9 +181,25 @@ async def list_boards():
         filename="",
         media_type="text/plain"
     ) )
-async def export_board():
+async def export_board(
+        export_format: ExportFormat = Query(ExportFormat.TEXT, alias="format"),
+        board_id: Optional[PositiveInt] = None,
+        team_id: Optional[PositiveInt] = None,
+        stream: bool = False,
+):
     try:
-        export_file_path = board_base.export_board()
-        return FileResponse(export_file_path)
+        if stream:
+            chunks = board_base.target.iter_export(export_format, board_id, team_id)
+            # render the first chunk here so a missing board or team is still reported as 400
+            first = await run_in_threadpool(next, chunks, "")
+            return StreamingResponse(
+                itertools.chain([first], chunks),
+                media_type=MEDIA_TYPES[export_format],
+                headers={"Content-Disposition": f'attachment; filename="board_export.{FILE_EXTENSIONS[export_format]}"'},
+            )
+
+        export_file_path = await board_base.export_board(export_format, board_id, team_id)
+        return FileResponse(export_file_path, filename=os.path.basename(export_file_path),
+                            media_type=MEDIA_TYPES[export_format])
     except Exception as e:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
@@ -1,6 +1,10 @@
+from datetime import datetime
 from enum import Enum
+from typing import Dict, List, Optional
 
-from pydantic import BaseModel, constr, PositiveInt
+from pydantic import BaseModel, Field, constr, PositiveInt
+
+from common.schema import BULK_MAX_ITEMS
 
 
 class TaskStatus(str, Enum):
@@ -9,6 +13,18 @@ class TaskStatus(str, Enum):
     CLOSED = 'Closed'
 
 
+class TaskSort(str, Enum):
+    ID = 'id'
+    CREATION_TIME = 'creation_time'
+    CREATION_TIME_DESC = '-creation_time'
+
+
+class ExportFormat(str, Enum):
+    TEXT = 'text'
+    NDJSON = 'ndjson'
+    CSV = 'csv'
+
+
 class BoardBase(BaseModel):
     name: constr(max_length=64)
     description: constr(max_length=128)
@@ -30,11 +46,62 @@ class TaskStatusUpdate(BaseModel):
     status: TaskStatus
 
 
+class BoardBulkCreateRequest(BaseModel):
+    boards: List[BoardBase] = Field(..., max_items=BULK_MAX_ITEMS)
+
+
+class TaskBulkCreateRequest(BaseModel):
+    tasks: List[TaskBase] = Field(..., max_items=BULK_MAX_ITEMS)
+
+
+class TaskStatusBulkUpdate(TaskStatusUpdate):
+    id: PositiveInt
+
+
+class TaskStatusBulkUpdateRequest(BaseModel):
+    updates: List[TaskStatusBulkUpdate] = Field(..., max_items=BULK_MAX_ITEMS)
+
+
 class BoardList(BoardBase):
     id: PositiveInt
     board_status: str
 
 
+class BoardAssignee(BaseModel):
+    user_id: PositiveInt
+    user_name: Optional[str]
+    display_name: Optional[str]
+    task_count: int
+
+
+class BoardDetail(BoardList):
+    team_name: Optional[str]
+    creation_time: str
+    version: int
+    total_tasks: int
+    task_counts: Dict[str, int]
+    assignees: List[BoardAssignee]
+
+
 class TaskList(TaskBase):
     id: PositiveInt
     task_status: TaskStatus
+
+
+class TaskDetail(TaskList):
+    creation_time: str
+
+
+class TaskQuery(BaseModel):
+    """
+    Filters, order and page of a task query, see board/query.py.
+    """
+    board_id: Optional[PositiveInt]
+    team_id: Optional[PositiveInt]
+    user_id: Optional[PositiveInt]
+    statuses: List[TaskStatus] = []
+    created_after: Optional[datetime]
+    created_before: Optional[datetime]
+    sort: TaskSort = TaskSort.ID
+    after_id: Optional[PositiveInt]
+    limit: PositiveInt = 100
@@ -0,0 +1,151 @@
+import threading
+from typing import Callable, Dict, Iterable, Optional
+
+from .schema import TaskStatus
+
+
+class BoardSummaries:
+    """
+    Materialized dashboard view of each board: the board, its team name, the task
+    counts by status and the assignees with their names.
+
+    A summary is tagged with the version of the board it was built from and is
+    served as is while the board version is unchanged. The mutations of this
+    process patch the summaries in place (see apply_tasks and apply_board), any
+    other change (a rename, a write from another worker) bumps the board version
+    and the summary is rebuilt from the board_id index on the next read.
+
+    Tasks are kept per id, so applying the same task twice is harmless.
+    """
+
+    def __init__(self):
+        self._summaries = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, board: Dict, build: Callable[[Dict], Dict]) -> Dict:
+        """
+        The summary of the board, built with build(board) when missing or stale.
+        """
+        version = board.get("version", 0)
+        with self._lock:
+            summary = self._summaries.get(board["id"])
+            if summary is not None and summary["version"] == version:
+                self.hits += 1
+                return _view(summary)
+            self.misses += 1
+
+        # built outside the lock, a concurrent change then at worst stores newer
+        # content under the older version
+        summary = build(board)
+        with self._lock:
+            current = self._summaries.get(board["id"])
+            if current is None or current["version"] <= summary["version"]:
+                self._summaries[board["id"]] = summary
+            return _view(summary)
+
+    def apply_tasks(self, versions: Dict[int, int], tasks: Iterable[Dict], users: Callable[[int], Optional[Dict]]):
+        """
+        Patch the summaries with tasks added or updated by this process.
+
+        :param versions: the new version of each board touched, as returned by bump_board_versions
+        :param users: a callable returning the user row for a user id
+        """
+        with self._lock:
+            for task in tasks:
+                summary = self._current(task["board_id"], versions)
+                if summary is not None:
+                    _set_task(summary, task, users)
+
+            for board_id, version in versions.items():
+                summary = self._summaries.get(board_id)
+                if summary is not None and summary["version"] == version - 1:
+                    summary["version"] = version
+
+    def apply_board(self, board: Dict):
+        """
+        Patch the summary with the new fields of a board updated by this process.
+        """
+        with self._lock:
+            summary = self._current(board["id"], {board["id"]: board.get("version", 0)})
+            if summary is not None:
+                summary["board"] = _board_fields(board)
+                summary["version"] = board.get("version", 0)
+
+    def stats(self) -> Dict:
+        return {"hits": self.hits, "misses": self.misses, "boards": len(self._summaries)}
+
+    def _current(self, board_id: int, versions: Dict[int, int]) -> Optional[Dict]:
+        # only a summary of the version just before the change can be patched
+        summary = self._summaries.get(board_id)
+        if summary is None or board_id not in versions:
+            return None
+        if summary["version"] not in (versions[board_id] - 1, versions[board_id]):
+            return None
+        return summary
+
+
+board_summaries = BoardSummaries()
+
+
+def build_board_summary(board: Dict, team: Optional[Dict], tasks: Iterable[Dict],
+                        users: Callable[[int], Optional[Dict]]) -> Dict:
+    """
+    Summary of one board from its rows.
+
+    :param users: a callable returning the user row for a user id
+    """
+    summary = {
+        # read the version before the tasks, see BoardSummaries.get
+        "version": board.get("version", 0),
+        "board": _board_fields(board),
+        "team_name": team["name"] if team else None,
+        "tasks": {},
+        "task_counts": {status.value: 0 for status in TaskStatus},
+        "assignees": {},
+    }
+    for task in tasks:
+        _set_task(summary, task, users)
+    return summary
+
+
+def _board_fields(board: Dict) -> Dict:
+    return {key: board[key] for key in ("id", "name", "description", "team_id", "board_status", "creation_time")}
+
+
+def _set_task(summary: Dict, task: Dict, users: Callable[[int], Optional[Dict]]):
+    previous = summary["tasks"].get(task["id"])
+    if previous is not None:
+        status, user_id = previous
+        summary["task_counts"][status] -= 1
+        summary["assignees"][user_id]["task_count"] -= 1
+        if summary["assignees"][user_id]["task_count"] == 0:
+            del summary["assignees"][user_id]
+
+    status, user_id = task["task_status"], task["user_id"]
+    summary["tasks"][task["id"]] = (status, user_id)
+    summary["task_counts"][status] = summary["task_counts"].get(status, 0) + 1
+
+    assignee = summary["assignees"].get(user_id)
+    if assignee is None:
+        user = users(user_id) or {}
+        assignee = summary["assignees"][user_id] = {
+            "user_id": user_id,
+            "user_name": user.get("name"),
+            "display_name": user.get("display_name"),
+            "task_count": 0,
+        }
+    assignee["task_count"] += 1
+
+
+def _view(summary: Dict) -> Dict:
+    return {
+        **summary["board"],
+        "version": summary["version"],
+        "team_name": summary["team_name"],
+        "total_tasks": len(summary["tasks"]),
+        "task_counts": dict(summary["task_counts"]),
+        "assignees": sorted((dict(assignee) for assignee in summary["assignees"].values()),
+                            key=lambda assignee: assignee["user_id"]),
+    }
@@ -0,0 +1,37 @@
+from typing import Dict, Iterable
+
+from common.storage import get_storage
+
+
+def bump_board_versions(board_ids: Iterable[int]) -> Dict[int, int]:
+    """
+    Increment the version counter of the given boards.
+
+    A board's version changes whenever anything shown in its export changes: its
+    tasks, its status, its team or the users its tasks are assigned to. Derived
+    views such as the cached export fragments compare versions to know what to
+    re-render.
+
+    :return: the new version of each board bumped
+    """
+    board_storage = get_storage("boards")
+
+    with board_storage.transaction():
+        versions = {}
+        for board_id in dict.fromkeys(board_ids):
+            board = board_storage.get(board_id)
+            if board is not None:
+                versions[board_id] = board.get("version", 0) + 1
+
+        if versions:
+            board_storage.update_many([(board_id, {"version": version}) for board_id, version in versions.items()])
+
+    return versions
+
+
+def boards_of_team(team_id: int) -> Iterable[int]:
+    return [board["id"] for board in get_storage("boards").find_all("team_id", team_id)]
+
+
+def boards_with_tasks_of_user(user_id: int) -> Iterable[int]:
+    return [task["board_id"] for task in get_storage("tasks").find_all("user_id", user_id)]
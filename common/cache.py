@@ -0,0 +1,419 @@
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+from common import config
+from common.instrumentation import span
+from common.records import RECORD_TYPES, from_columns, paused_gc, to_columns
+from common.indexes import CountIndex
+from common.search import TextIndex
+from common.snapshot import decode_state, encode_state, read_snapshot, snapshot_path, snapshotter, \
+    write_snapshot
+from common.storage import StorageEngine
+
+
+class EntityCache(StorageEngine):
+    """
+    In-memory, write-through cache in front of a storage engine.
+
+    All rows of the store are loaded once and every read is served from memory.
+    Mutations are written to the wrapped engine and applied to the cached rows.
+    The rows are reloaded only when the engine signature (file mtime/inode/size or
+    table version) changes behind the cache's back, e.g. because another process
+    wrote to the store.
+
+    Mutations run inside transaction(): the store's cross-process lock is held and
+    the cached rows are refreshed first, so checks made inside the transaction see
+    every write of every other process.
+
+    Rows returned by the cache are shared and must be treated as read only. With
+    FACTWISE_COMPACT_ROWS (the default) they are compact records (see
+    common/records.py), read only mappings with the same keys and values as the rows.
+
+    With FACTWISE_SNAPSHOTS (the default) the rows and indexes are loaded from the
+    store's snapshot (see common/snapshot.py) when it was taken at the current
+    engine signature, and a snapshot is written in the background after they
+    change. Indexes are built, or restored from the snapshot, on first use.
+    """
+
+    # rows handed out per lock acquisition by scan_after
+    SCAN_CHUNK = 1024
+
+    def __init__(self, storage: StorageEngine):
+        super().__init__(storage.name, storage.key_fields)
+        self.storage = storage
+        self.lock = storage.lock
+        self._rows: Dict = {}
+        # how a row is held in memory: a record class or dict
+        self._record = RECORD_TYPES.get(storage.name, dict) if config.COMPACT_ROWS else dict
+        # primary keys in sorted order, for keyset pagination
+        self._order: List = []
+        self._signature = None
+        self._loaded = False
+        self._lock = threading.RLock()
+        # held while a text index is built outside the lock, so concurrent searches build it once
+        self._text_build = threading.Lock()
+        # indexes not built since the rows were loaded -> their snapshot state, or None to build them from the rows
+        self._pending: Dict[str, Optional[bytes]] = {}
+        # engine signature of the data in the last snapshot written or read
+        self._snapshot_signature = None
+        self.hits = 0
+        self.misses = 0
+        # where the rows were last loaded from, "engine" or "snapshot", and how long it took
+        self.loaded_from = None
+        self.load_ms = None
+
+    def signature(self):
+        return self.storage.signature()
+
+    @contextmanager
+    def _current(self):
+        # holds the cache lock with the rows up to date. A reload reads the engine under its store lock
+        # (the append log does), which is taken before the cache lock like in transaction(): taking it
+        # while holding the cache lock would deadlock with a transaction of another thread
+        with self._lock:
+            if self._is_current(self.storage.signature()):
+                self.hits += 1
+                yield
+                return
+        with self.storage.transaction(), self._lock:
+            self._refresh()
+            yield
+
+    def _is_current(self, signature) -> bool:
+        return self._loaded and signature is not None and signature == self._signature
+
+    def _refresh(self):
+        signature = self.storage.signature()
+        if self._is_current(signature):
+            self.hits += 1
+            return
+
+        self.misses += 1
+        began = time.perf_counter()
+        with span(f"cache.reload.{self.name}"), paused_gc():
+            if not self._load_snapshot(signature):
+                record = self._record
+                self._rows = {self.key_of(row): record(row) for row in self.storage.load()}
+                self._pending = dict.fromkeys(self.indexes)
+                self.loaded_from = "engine"
+            self._order = sorted(self._rows)
+        self.load_ms = round((time.perf_counter() - began) * 1000, 1)
+        self._signature = signature
+        self._loaded = True
+        if config.SNAPSHOT_ENABLED:
+            snapshotter.watch(self)
+
+    def _snapshot_header(self, signature) -> Dict:
+        # what the snapshot content depends on, a snapshot with another header is not used
+        return {
+            "store": self.name,
+            "signature": signature,
+            "key_fields": self.key_fields,
+            "record": None if self._record is dict else self._record._fields,
+            "indexes": sorted((name, type(index).__name__, index.fields) for name, index in self.indexes.items()),
+        }
+
+    def _load_snapshot(self, signature) -> bool:
+        if not config.SNAPSHOT_ENABLED or signature is None:
+            return False
+        body = read_snapshot(snapshot_path(self.name), self._snapshot_header(signature))
+        if body is None:
+            return False
+
+        if self._record is dict:
+            rows = body["rows"]
+        else:
+            rows = from_columns(self._record, body["columns"], body["partial"])
+        self._rows = dict(zip(body["keys"], rows))
+        self._pending = {name: body["indexes"].get(name) for name in self.indexes}
+        self._snapshot_signature = signature
+        self.loaded_from = "snapshot"
+        return True
+
+    def save_snapshot(self) -> bool:
+        """
+        Write the snapshot of the cached rows and of the indexes built so far,
+        unless it would hold the same data as the last snapshot.
+
+        :return: whether a snapshot was written
+        """
+        with self._lock:
+            signature = self._signature
+            if not self._loaded or signature is None or signature == self._snapshot_signature:
+                return False
+            # rows are updated in place, so they are copied while the lock is held
+            # and only the copy is written
+            header = self._snapshot_header(signature)
+            body = {"keys": list(self._rows)}
+            if self._record is dict:
+                body["rows"] = [dict(row) for row in self._rows.values()]
+            else:
+                body["columns"], body["partial"] = to_columns(self._record, list(self._rows.values()))
+            states = {name: index.state() for name, index in self.indexes.items() if name not in self._pending}
+            # states still pending in the snapshot read are kept as they are
+            blobs = {name: state for name, state in self._pending.items() if state is not None}
+
+        blobs.update((name, encode_state(state)) for name, state in states.items())
+        body["indexes"] = blobs
+        write_snapshot(snapshot_path(self.name), header, body)
+        with self._lock:
+            self._snapshot_signature = signature
+        return True
+
+    def build_indexes(self):
+        """
+        Build every index that was not used since the rows were loaded.
+        """
+        with self._current():
+            for name in list(self._pending):
+                self._index(name)
+
+    def preload(self) -> Dict:
+        with self._current():
+            return {"source": self.loaded_from, "load_ms": self.load_ms, "rows": len(self._rows)}
+
+    def _index(self, name: str):
+        # the index, built from the rows or restored from the snapshot the first time it is used after a load
+        index = self.indexes[name]
+        if name in self._pending:
+            state = self._pending.pop(name)
+            with span(f"index.build.{self.name}"), paused_gc():
+                if state is None:
+                    index.rebuild(self._rows.items())
+                else:
+                    index.restore(decode_state(state))
+        return index
+
+    def _built_indexes(self) -> List:
+        # indexes maintained by a mutation; the snapshot states of the others no longer match the rows
+        for name in self._pending:
+            self._pending[name] = None
+        return [index for name, index in self.indexes.items() if name not in self._pending]
+
+    def _written(self):
+        # our own write changed the signature, remember it so it does not trigger a reload
+        self._signature = self.storage.signature()
+
+    def stats(self) -> Dict:
+        return {"hits": self.hits, "misses": self.misses, "rows": len(self._rows),
+                "loaded_from": self.loaded_from, "load_ms": self.load_ms,
+                "indexes_built": len(self.indexes) - len(self._pending),
+                "text_indexes": {name: index.stats() for name, index in self.indexes.items()
+                                 if isinstance(index, TextIndex) and name not in self._pending}}
+
+    def add_index(self, name: str, fields, unique: bool = True):
+        with self._lock:
+            super().add_index(name, fields, unique)
+            self._pending[name] = None
+
+    def add_sorted_index(self, name: str, fields, key):
+        with self._lock:
+            super().add_sorted_index(name, fields, key)
+            self._pending[name] = None
+
+    def add_text_index(self, name: str, fields):
+        with self._lock:
+            super().add_text_index(name, fields)
+            self._pending[name] = None
+
+    def add_count_index(self, name: str, fields, counted: str, through=None):
+        with self._lock:
+            super().add_count_index(name, fields, counted, through)
+            self._pending[name] = None
+
+    @contextmanager
+    def transaction(self):
+        with self.storage.transaction(), self._lock:
+            self._refresh()
+            yield self
+
+    def next_ids(self, count: int) -> List[int]:
+        with self.transaction():
+            return self.storage.next_ids(count)
+
+    def invalidate(self):
+        with self._lock:
+            self._loaded = False
+
+    def load(self) -> List[Dict]:
+        with self._current():
+            return list(self._rows.values())
+
+    def get(self, key) -> Optional[Dict]:
+        with self._current():
+            return self._rows.get(key)
+
+    def insert(self, row: Dict):
+        self.insert_many([row])
+
+    def insert_many(self, rows: List[Dict]):
+        with self.transaction():
+            self.storage.insert_many(rows)
+            self._add_rows(rows)
+            self._written()
+
+    def _add_rows(self, rows: List[Dict]):
+        indexes = self._built_indexes()
+        for row in rows:
+            row = self._record(row)
+            key = self.key_of(row)
+            if key not in self._rows:
+                if not self._order or key > self._order[-1]:
+                    self._order.append(key)
+                else:
+                    bisect.insort(self._order, key)
+            self._rows[key] = row
+            for index in indexes:
+                index.add(key, row)
+
+    def update(self, key, changes: Dict) -> Dict:
+        with self.transaction():
+            self.update_many([(key, changes)])
+            return self._rows[key]
+
+    def update_many(self, updates: List[Tuple]):
+        with self.transaction():
+            for key, _ in updates:
+                if key not in self._rows:
+                    raise ValueError(f"{self.name} row {key} not found")
+            self.storage.update_many(updates)
+
+            indexes = self._built_indexes()
+            for key, changes in updates:
+                row = self._rows[key]
+                affected = [index for index in indexes if index.covers(changes)]
+                for index in affected:
+                    index.remove(key, row)
+                row.update(changes)
+                for index in affected:
+                    index.add(key, row)
+            self._written()
+
+    def delete(self, key):
+        self.delete_many([key])
+
+    def delete_many(self, keys: List):
+        with self.transaction():
+            self.storage.delete_many(keys)
+            self._remove_rows(keys)
+            self._written()
+
+    def _remove_rows(self, keys: List):
+        indexes = self._built_indexes()
+        for key in keys:
+            row = self._rows.pop(key, None)
+            if row is not None:
+                del self._order[bisect.bisect_left(self._order, key)]
+                for index in indexes:
+                    index.remove(key, row)
+                    if isinstance(index, TextIndex):
+                        # the row is not added back, unlike in an update
+                        index.forget(key)
+
+    def write_many(self, inserts: List[Dict], deletes: List):
+        with self.transaction():
+            self.storage.write_many(inserts, deletes)
+            self._remove_rows(deletes)
+            self._add_rows(inserts)
+            self._written()
+
+    def scan(self, predicate: Callable[[Dict], bool] = None) -> Iterator[Dict]:
+        for row in self.load():
+            if predicate is None or predicate(row):
+                yield row
+
+    def scan_after(self, after=None) -> Iterator[Dict]:
+        position = after
+        while True:
+            with self._current():
+                start = 0 if position is None else bisect.bisect_right(self._order, position)
+                keys = self._order[start:start + self.SCAN_CHUNK]
+                rows = [self._rows[key] for key in keys]
+
+            if not rows:
+                return
+            yield from rows
+            position = keys[-1]
+
+    def find_all(self, index_name: str, value) -> List[Dict]:
+        with self._current():
+            with span(f"index.lookup.{self.name}"):
+                return [self._rows[pk] for pk in self._index(index_name).lookup(value)]
+
+    def find_after(self, index_name: str, value, after=None, limit: int = None) -> List[Dict]:
+        with self._current():
+            with span(f"index.lookup.{self.name}"):
+                return [self._rows[pk] for pk in self._index(index_name).lookup_after(value, after, limit)]
+
+    def count_all(self, index_name: str, value) -> int:
+        with self._current():
+            return self._index(index_name).count(value)
+
+    def find_range(self, index_name: str, low=None, high=None, reverse: bool = False,
+                   after: Tuple = None) -> Iterator[Dict]:
+        while True:
+            with self._current():
+                index = self._index(index_name)
+                start, end = index.bounds(low, high, after, reverse)
+                if reverse:
+                    start = max(start, end - self.SCAN_CHUNK)
+                else:
+                    end = min(end, start + self.SCAN_CHUNK)
+                if start == end:
+                    return
+                keys = index.pks[start:end]
+                last = end - 1 if not reverse else start
+                after = (index.keys[last], index.pks[last])
+                rows = [self._rows[key] for key in keys]
+
+            yield from (reversed(rows) if reverse else rows)
+
+    def count_range(self, index_name: str, low=None, high=None) -> int:
+        with self._current():
+            start, end = self._index(index_name).bounds(low, high)
+            return end - start
+
+    def count_by(self, field: str, where: Tuple[str, object] = None) -> Dict:
+        with self._current():
+            for name, index in self.indexes.items():
+                if isinstance(index, CountIndex) and index.counted == field and (
+                        where is None or index.fields == (where[0],)):
+                    return self._index(name).counts(None if where is None else where[1])
+        return super().count_by(field, where)
+
+    def verify_counts(self) -> List[Dict]:
+        differences = []
+        with self.transaction():
+            rows = [(self.key_of(row), row) for row in self.storage.load()]
+            for name, index in self.indexes.items():
+                if isinstance(index, CountIndex):
+                    index = self._index(name)
+                    recount = CountIndex(name, index.fields, index.counted, index.through)
+                    recount.rebuild(rows)
+                    differences.extend(index.differences(recount))
+                    index.entries, index.totals = recount.entries, recount.totals
+        return differences
+
+    def search(self, index_name: str, terms: List[str], limit: int,
+               accept: Callable[[Dict], bool] = None) -> List[Dict]:
+        self._build_text_index(index_name)
+        with self._current():
+            with span(f"index.search.{self.name}"):
+                return self._index(index_name).search(self._rows, terms, limit, accept)
+
+    def _build_text_index(self, name: str):
+        # the first search after a load collects the postings from a copy of the rows without holding
+        # the lock, so reads and writes of the store go on meanwhile
+        with self._text_build:
+            with self._current():
+                index = self._index(name)
+                if index.built:
+                    return
+                token = index.begin_build()
+                rows = list(self._rows.items())
+            postings = index.collect(rows)
+            with self._lock:
+                index.finish_build(token, postings, self._rows)
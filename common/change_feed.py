@@ -0,0 +1,170 @@
+import os
+import threading
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from common import codec, config
+from common.instrumentation import record_bytes, span
+from common.locking import FileLock
+
+
+class ChangeFeed:
+    """
+    Ordered feed of the mutations of tasks, boards and team memberships.
+
+    Every event gets the next sequence number and is appended as one json line to
+    the feed file (db/events.log), under a lock file shared by every process, so
+    all workers see the same sequence. Each process keeps the latest events in
+    memory and reads only the lines appended since its last read.
+
+    An event is {"seq": <n>, "time": "<date:time>", "type": "<type>", "data": {...}}.
+    The last `retention` events are kept; when the file holds twice as many it is
+    rewritten with the kept ones.
+    """
+
+    def __init__(self, path: str, retention: int):
+        self.path = path
+        self.retention = retention
+        self.lock = FileLock(path + ".lock")
+        self._events: List[Dict] = []
+        self._last_seq = 0
+        # position in the file read so far, identity of the file and the first seq it holds
+        self._offset = 0
+        self._inode = None
+        self._first_in_file = None
+        self._lock = threading.RLock()
+
+    def last_seq(self) -> int:
+        """
+        Sequence number of the latest event, 0 when there is none.
+        """
+        with self._lock:
+            self._refresh()
+            return self._last_seq
+
+    def _refresh(self):
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return
+
+        if stat.st_ino != self._inode or stat.st_size < self._offset:
+            # first read, or the file was rewritten by another process
+            self._inode = stat.st_ino
+            self._offset = 0
+            self._events = []
+            self._first_in_file = None
+        if stat.st_size == self._offset:
+            return
+
+        with open(self.path, 'rb') as f:
+            f.seek(self._offset)
+            data = f.read(stat.st_size - self._offset)
+        # a line being written by another process is read once it is complete
+        end = data.rfind(b"\n") + 1
+        for line in data[:end].splitlines():
+            if line:
+                event = codec.loads(line)
+                self._events.append(event)
+                self._last_seq = event["seq"]
+                if self._first_in_file is None:
+                    self._first_in_file = event["seq"]
+        self._offset += end
+        self._trim()
+        record_bytes("events", read=end)
+
+    def _trim(self):
+        if len(self._events) > 2 * self.retention:
+            del self._events[:-self.retention]
+
+    def publish(self, events: Iterable[Tuple[str, Dict]]) -> List[Dict]:
+        """
+        Append events given as (type, data) pairs, in order, with consecutive sequence numbers.
+        """
+        events = list(events)
+        if not events or not config.CHANGE_FEED_ENABLED:
+            return []
+
+        with span("feed.publish"), self.lock, self._lock:
+            self._refresh()
+            if os.path.exists(self.path) and os.path.getsize(self.path) > self._offset:
+                # the torn last line of a writer that crashed
+                os.truncate(self.path, self._offset)
+
+            now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+            records = []
+            for event_type, data in events:
+                self._last_seq += 1
+                records.append({"seq": self._last_seq, "time": now, "type": event_type, "data": data})
+
+            payload = b"".join(codec.dumps(record) + b"\n" for record in records)
+            with open(self.path, 'ab') as f:
+                f.write(payload)
+            record_bytes("events", written=len(payload))
+
+            self._inode = os.stat(self.path).st_ino
+            self._offset += len(payload)
+            if self._first_in_file is None:
+                self._first_in_file = records[0]["seq"]
+            self._events.extend(records)
+            self._trim()
+
+            if self._last_seq - self._first_in_file + 1 > 2 * self.retention:
+                self._compact()
+        return records
+
+    def _compact(self):
+        kept = self._events[-self.retention:]
+        payload = b"".join(codec.dumps(event) + b"\n" for event in kept)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(payload)
+        os.replace(tmp_path, self.path)
+        self._inode = os.stat(self.path).st_ino
+        self._offset = len(payload)
+        self._first_in_file = kept[0]["seq"]
+
+    def since(self, seq: int, limit: int = None, board_id: int = None, team_id: int = None) -> Dict:
+        """
+        Events after the given sequence number, oldest first.
+
+        :param seq: the last sequence number seen by the client, 0 for the start of the feed
+        :param limit: max number of events to return
+        :param board_id: only return events of this board
+        :param team_id: only return events of this team
+        :return: {"next_seq" : <seq to ask for next time>, "events" : [...]}
+        """
+        with self._lock:
+            self._refresh()
+            if seq >= self._last_seq or not self._events:
+                return {"next_seq": max(seq, self._last_seq), "events": []}
+
+            first = self._events[0]["seq"]
+            if seq < first - 1:
+                raise ValueError(f"Events up to seq {first - 1} are no longer kept, "
+                                 f"reload the data and follow the feed from seq {self._last_seq}")
+
+            # sequence numbers are consecutive, so the position of the next event is known
+            candidates = self._events[seq - first + 1:]
+
+        events = []
+        next_seq = seq
+        for event in candidates:
+            if limit is not None and len(events) >= limit:
+                break
+            next_seq = event["seq"]
+            if _matches(event, board_id, team_id):
+                events.append(event)
+        return {"next_seq": next_seq, "events": events}
+
+
+def _matches(event: Dict, board_id: Optional[int], team_id: Optional[int]) -> bool:
+    data = event["data"]
+    if board_id is not None and data.get("board_id") != board_id:
+        return False
+    if team_id is not None and data.get("team_id") != team_id:
+        return False
+    return True
+
+
+change_feed = ChangeFeed(os.path.join(config.DB_DIR, "events.log"), config.CHANGE_FEED_RETENTION)
@@ -0,0 +1,68 @@
+import json
+from collections.abc import Mapping
+from typing import Any, Union
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+
+from common import config
+
+try:
+    import orjson
+except ImportError:  # the stdlib json module is used instead
+    orjson = None
+
+# orjson is used when it is installed, unless FACTWISE_JSON_CODEC=json
+FAST = orjson is not None and config.JSON_CODEC != "json"
+
+
+def _default(obj):
+    if isinstance(obj, BaseModel):
+        # the field values, nested models are passed back to this hook by orjson
+        return obj.__dict__ if not obj.__private_attributes__ else obj.dict()
+    if isinstance(obj, Mapping):
+        # the compact records of the entity cache
+        return dict(obj)
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def loads(data: Union[str, bytes]) -> Any:
+    if FAST:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def dumps(obj) -> bytes:
+    """
+    Compact utf-8 json of plain data (dicts, lists, strings, numbers).
+    """
+    if FAST:
+        return orjson.dumps(obj, default=_default)
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":"), default=_default).encode("utf-8")
+
+
+def dumps_str(obj) -> str:
+    if FAST:
+        return orjson.dumps(obj, default=_default).decode("utf-8")
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":"), default=_default)
+
+
+def encode(content) -> bytes:
+    """
+    Json of a response: plain data, pydantic models, datetimes and enums.
+    orjson serializes models without the intermediate copy made by jsonable_encoder.
+    """
+    if FAST:
+        return orjson.dumps(content, default=_default)
+    return json.dumps(jsonable_encoder(content), ensure_ascii=False, allow_nan=False,
+                      separators=(",", ":")).encode("utf-8")
+
+
+class FastJSONResponse(JSONResponse):
+    """
+    Default response class of the app, rendered with orjson when it is installed.
+    """
+
+    def render(self, content: Any) -> bytes:
+        return encode(content)
@@ -0,0 +1,621 @@
+import array
+import bisect
+import heapq
+import mmap
+import os
+import threading
+import time
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+from common import codec, config
+from common.indexes import SortedIndex
+from common.instrumentation import record_bytes, span
+from common.records import decode_time, encode_time
+from common.storage import StorageEngine
+
+# fixed-width columns of a task: name -> array typecode
+COLUMNS = {
+    "id": "q",
+    "board_id": "q",
+    "user_id": "q",
+    "status": "B",
+    "created": "q",
+    "deleted": "B",
+    "title_offset": "Q",
+    "title_length": "I",
+    "description_offset": "Q",
+    "description_length": "I",
+}
+
+# task status values stored as one byte, in TaskStatus order
+STATUSES = ["Open", "In Progress", "Closed"]
+STATUS_CODES = {status: code for code, status in enumerate(STATUSES)}
+
+# fields of a task row and the columns they are stored in
+INT_FIELDS = {"id": "id", "board_id": "board_id", "user_id": "user_id"}
+TEXT_FIELDS = ("title", "description")
+FIELDS = ("id", "creation_time", "task_status", "board_id", "title", "description", "user_id")
+
+# columns with an in-memory posting list: value -> row positions
+POSTINGS = ("board_id", "user_id")
+
+
+class ColumnarTaskStorage(StorageEngine):
+    """
+    Compact store for tasks: one file per fixed-width column (ids, board, user,
+    status, creation time, text offsets) plus a heap file holding the utf-8 title
+    and description strings, all under one folder (task.columns).
+
+    Columns are memory-mapped on read. Scans and lookups by board, user or status
+    only touch the columns they need (the board_id and user_id posting lists, the
+    positions of each status and a sorted index of the creation times are kept in
+    memory) and build dicts for the matching rows alone. count_by aggregates a
+    column without building any row.
+
+    Inserts append to the columns and the heap. Updates overwrite the fixed-width
+    values in place, changed strings are appended to the heap. Deletes set a
+    tombstone. A meta file written last (atomically) records the committed row
+    count and heap size, so a torn append is cut off on the next write, and
+    carries the version other processes use to notice changes.
+
+    Updates and deletes overwrite the fixed width values in place. The values
+    they overwrite are saved first (undo), and a batch cut short by a crash is
+    rolled back by the next writer. With the interval fsync policy the data files
+    written since the last fsync are forced to disk before the meta file, on the
+    commit due or by a background thread, so meta never counts data that is not.
+
+    Deletes and board or user changes bump the generation in meta, and every
+    process then rebuilds its positions. Status and creation time changes only
+    append the row positions they overwrote to a journal (changes), so the other
+    processes update their status positions and time index for those rows alone.
+    """
+
+    # rows are cheap to rebuild from the mapped columns, an entity cache on top would only add memory
+    cacheable = False
+
+    def __init__(self, name: str, dir_path: str, key_fields: Tuple[str, ...] = ("id",), fsync: str = "interval"):
+        if key_fields != ("id",):
+            raise ValueError("The columnar store is keyed by id")
+        super().__init__(name, key_fields, lock_path=dir_path + ".lock")
+        self.dir_path = dir_path
+        self.meta_path = os.path.join(dir_path, "meta.json")
+        self.heap_path = os.path.join(dir_path, "heap")
+        self.sequence_path = os.path.join(dir_path, "sequence")
+        self.changes_path = os.path.join(dir_path, "changes")
+        self.undo_path = os.path.join(dir_path, "undo")
+        self.fsync = fsync
+        self._last_fsync = 0.0
+        # files written since the last fsync
+        self._unsynced = set()
+        self._flusher = None
+        self._lock = threading.RLock()
+        self._signature = None
+        self._meta = {"rows": 0, "heap": 0, "generation": 0, "version": 0, "changes": 0}
+        self._columns = {name: memoryview(b"").cast(code) for name, code in COLUMNS.items()}
+        self._heap = memoryview(b"")
+        # id -> row position of every live row, ids in sorted order
+        self._positions: Dict[int, int] = {}
+        self._order: List[int] = []
+        self._postings: Dict[str, Dict[int, List[int]]] = {column: {} for column in POSTINGS}
+        # status code -> positions of the live rows in that status
+        self._statuses: Dict[int, set] = {}
+        # (creation time, id) of the live rows, and the creation time indexed for each position
+        self._created = SortedIndex("creation_time", ("creation_time",), _created_key)
+        self._indexed_created = array.array("q")
+        self._indexed_rows = 0
+        self._indexed_changes = 0
+        self._generation = None
+        os.makedirs(dir_path, exist_ok=True)
+        with self.transaction(), self._lock:
+            self._roll_back()
+
+    def _column_path(self, column: str) -> str:
+        return os.path.join(self.dir_path, column)
+
+    def signature(self):
+        try:
+            stat = os.stat(self.meta_path)
+        except FileNotFoundError:
+            return None
+        return stat.st_ino, stat.st_mtime_ns, stat.st_size
+
+    def _refresh(self):
+        signature = self.signature()
+        if signature == self._signature and signature is not None:
+            return
+
+        with span(f"storage.read.{self.name}"):
+            if signature is None:
+                meta = {"rows": 0, "heap": 0, "generation": 0, "version": 0, "changes": 0}
+            else:
+                with open(self.meta_path, 'rb') as f:
+                    meta = codec.loads(f.read())
+
+            rows = meta["rows"]
+            self._columns = {column: self._map(self._column_path(column), rows * array.array(code).itemsize)
+                             .cast(code) for column, code in COLUMNS.items()}
+            self._heap = self._map(self.heap_path, meta["heap"])
+
+            changes = meta.get("changes", 0)
+            if meta["generation"] != self._generation or rows < self._indexed_rows:
+                # rows were deleted or re-assigned, rebuild the positions
+                self._positions = {}
+                self._postings = {column: {} for column in POSTINGS}
+                self._statuses = {}
+                self._indexed_created = array.array("q")
+                self._indexed_rows = 0
+                self._indexed_changes = changes
+            self._index_rows(self._indexed_rows, rows)
+            if changes > self._indexed_changes:
+                self._apply_changes(self._indexed_changes, changes)
+
+            self._meta = meta
+            self._generation = meta["generation"]
+            self._signature = signature
+
+    @staticmethod
+    def _map(path: str, size: int) -> memoryview:
+        # mappings are never closed explicitly: rows being built from an older
+        # mapping keep it alive until they are done
+        if size == 0:
+            return memoryview(b"")
+        with open(path, 'rb') as f:
+            return memoryview(mmap.mmap(f.fileno(), size, access=mmap.ACCESS_READ))
+
+    def _index_rows(self, start: int, end: int):
+        ids, deleted = self._columns["id"], self._columns["deleted"]
+        status, created = self._columns["status"], self._columns["created"]
+        self._indexed_created.extend(created[start:end])
+        new_ids = []
+        new_created = []
+        for position in range(start, end):
+            if deleted[position]:
+                continue
+            new_ids.append(ids[position])
+            new_created.append(created[position])
+            self._positions[ids[position]] = position
+            for column in POSTINGS:
+                self._postings[column].setdefault(self._columns[column][position], []).append(position)
+            self._statuses.setdefault(status[position], set()).add(position)
+
+        if start == 0:
+            self._created.rebuild(zip(new_ids, new_created))
+        else:
+            for task_id, value in zip(new_ids, new_created):
+                self._created.add(task_id, value)
+
+        in_order = all(a < b for a, b in zip(new_ids, new_ids[1:]))
+        if start == 0 or not in_order or (new_ids and self._order and new_ids[0] < self._order[-1]):
+            # ids from concurrent writers can land out of order
+            self._order = sorted(self._positions)
+        else:
+            self._order.extend(new_ids)
+        self._indexed_rows = end
+
+    def _apply_changes(self, start: int, end: int):
+        # rows whose status or creation time were overwritten since the last refresh
+        journal = self._map(self.changes_path, end * 8).cast("q")
+        ids, deleted = self._columns["id"], self._columns["deleted"]
+        status, created = self._columns["status"], self._columns["created"]
+        for position in set(journal[start:end]):
+            if deleted[position]:
+                continue
+            for positions in self._statuses.values():
+                positions.discard(position)
+            self._statuses.setdefault(status[position], set()).add(position)
+            if created[position] != self._indexed_created[position]:
+                self._created.remove(ids[position], self._indexed_created[position])
+                self._created.add(ids[position], created[position])
+                self._indexed_created[position] = created[position]
+        self._indexed_changes = end
+
+    def _text(self, offset: int, length: int) -> str:
+        return str(self._heap[offset:offset + length], "utf-8")
+
+    def _row(self, position: int) -> Dict:
+        columns = self._columns
+        return {
+            "id": columns["id"][position],
+            "creation_time": decode_time(columns["created"][position]),
+            "task_status": STATUSES[columns["status"][position]],
+            "board_id": columns["board_id"][position],
+            "title": self._text(columns["title_offset"][position], columns["title_length"][position]),
+            "description": self._text(columns["description_offset"][position],
+                                      columns["description_length"][position]),
+            "user_id": columns["user_id"][position],
+        }
+
+    def next_ids(self, count: int) -> List[int]:
+        with self.transaction():
+            if os.path.exists(self.sequence_path):
+                with open(self.sequence_path, 'r') as f:
+                    last_id = int(f.read() or 0)
+            else:
+                with self._lock:
+                    self._refresh()
+                    last_id = self._order[-1] if self._order else 0
+
+            self._replace_file(self.sequence_path, str(last_id + count).encode(), sync=self.fsync != "never")
+            return list(range(last_id + 1, last_id + count + 1))
+
+    def preload(self) -> Dict:
+        with self._lock:
+            self._refresh()
+            return {"rows": len(self._order)}
+
+    def load(self) -> List[Dict]:
+        with self._lock:
+            self._refresh()
+            return [self._row(self._positions[key]) for key in self._order]
+
+    def get(self, key) -> Optional[Dict]:
+        with self._lock:
+            self._refresh()
+            position = self._positions.get(key)
+            return self._row(position) if position is not None else None
+
+    def scan(self, predicate: Callable[[Dict], bool] = None) -> Iterator[Dict]:
+        for row in self.scan_after():
+            if predicate is None or predicate(row):
+                yield row
+
+    def scan_after(self, after=None) -> Iterator[Dict]:
+        position = after
+        while True:
+            with self._lock:
+                self._refresh()
+                start = 0 if position is None else bisect.bisect_right(self._order, position)
+                keys = self._order[start:start + 1024]
+                rows = [self._row(self._positions[key]) for key in keys]
+
+            if not rows:
+                return
+            yield from rows
+            position = keys[-1]
+
+    def _indexed_positions(self, fields: Tuple[str, ...], value):
+        # positions of the rows whose first indexed field has the value, None without an index on it
+        column_value = value if len(fields) == 1 else value[0]
+        if fields[0] in POSTINGS:
+            return self._postings[fields[0]].get(column_value, ())
+        if fields[0] == "task_status":
+            return self._statuses.get(STATUS_CODES.get(getattr(column_value, "value", column_value)), ())
+        return None
+
+    def find_all(self, index_name: str, value) -> List[Dict]:
+        fields = self.indexes[index_name].fields
+        with self._lock:
+            self._refresh()
+            positions = self._indexed_positions(fields, value)
+            if positions is None:
+                return super().find_all(index_name, value)
+
+            positions = sorted(positions)
+            with span(f"index.lookup.{self.name}"):
+                rows = [self._row(position) for position in positions if not self._columns["deleted"][position]]
+            if len(fields) > 1:
+                index = self.indexes[index_name]
+                rows = [row for row in rows if index.value_of(row) == value]
+            return rows
+
+    def find_after(self, index_name: str, value, after=None, limit: int = None) -> List[Dict]:
+        fields = self.indexes[index_name].fields
+        with self._lock:
+            self._refresh()
+            positions = self._indexed_positions(fields, value)
+            if positions is None:
+                return super().find_after(index_name, value, after, limit)
+
+            # only the id column is read to pick the page, the rows of the page alone are built
+            ids = self._columns["id"]
+            if after is not None:
+                positions = [position for position in positions if ids[position] > after]
+            if limit is None:
+                page = sorted(positions, key=ids.__getitem__)
+            else:
+                page = heapq.nsmallest(limit, positions, key=ids.__getitem__)
+            return [self._row(position) for position in page]
+
+    def count_all(self, index_name: str, value) -> int:
+        fields = self.indexes[index_name].fields
+        if len(fields) == 1:
+            with self._lock:
+                self._refresh()
+                positions = self._indexed_positions(fields, value)
+                if positions is not None:
+                    # postings only hold live rows: deletes rebuild them
+                    return len(positions)
+        return super().count_all(index_name, value)
+
+    def find_range(self, index_name: str, low=None, high=None, reverse: bool = False,
+                   after: Tuple = None) -> Iterator[Dict]:
+        if self.indexes[index_name].fields != ("creation_time",):
+            yield from super().find_range(index_name, low, high, reverse, after)
+            return
+
+        index = self._created
+        while True:
+            with self._lock:
+                self._refresh()
+                start, end = index.bounds(low, high, after, reverse)
+                if reverse:
+                    start = max(start, end - 1024)
+                else:
+                    end = min(end, start + 1024)
+                if start == end:
+                    return
+                last = end - 1 if not reverse else start
+                after = (index.keys[last], index.pks[last])
+                rows = [self._row(self._positions[key]) for key in index.pks[start:end]]
+
+            yield from (reversed(rows) if reverse else rows)
+
+    def count_range(self, index_name: str, low=None, high=None) -> int:
+        if self.indexes[index_name].fields != ("creation_time",):
+            return super().count_range(index_name, low, high)
+        with self._lock:
+            self._refresh()
+            start, end = self._created.bounds(low, high)
+            return end - start
+
+    def count_by(self, field: str, where: Tuple[str, object] = None) -> Dict:
+        with self._lock:
+            self._refresh()
+            if where is not None and where[0] in POSTINGS:
+                positions = self._postings[where[0]].get(where[1], ())
+            elif where is not None:
+                return super().count_by(field, where)
+            else:
+                positions = self._positions.values()
+
+            if field == "task_status":
+                column, decode = self._columns["status"], STATUSES.__getitem__
+            elif field in INT_FIELDS:
+                column, decode = self._columns[INT_FIELDS[field]], None
+            else:
+                return super().count_by(field, where)
+
+            deleted = self._columns["deleted"]
+            counts = {}
+            for position in positions:
+                if not deleted[position]:
+                    value = column[position]
+                    counts[value] = counts.get(value, 0) + 1
+            return {decode(value): count for value, count in counts.items()} if decode else counts
+
+    def insert(self, row: Dict):
+        self.insert_many([row])
+
+    def insert_many(self, rows: List[Dict]):
+        with self.transaction(), self._lock:
+            self._roll_back()
+            self._refresh()
+            heap_size = self._meta["heap"]
+            heap = bytearray()
+            columns = {column: array.array(code) for column, code in COLUMNS.items()}
+
+            for row in rows:
+                unknown = set(row) - set(FIELDS)
+                if unknown:
+                    raise ValueError(f"{self.name} rows cannot store {', '.join(sorted(unknown))}")
+                if row["id"] in self._positions:
+                    raise ValueError(f"{self.name} row already exists")
+
+                for field, column in INT_FIELDS.items():
+                    columns[column].append(row[field])
+                columns["status"].append(_status_code(row["task_status"]))
+                columns["created"].append(encode_time(row["creation_time"]))
+                columns["deleted"].append(0)
+                for field in TEXT_FIELDS:
+                    text = row[field].encode("utf-8")
+                    columns[f"{field}_offset"].append(heap_size + len(heap))
+                    columns[f"{field}_length"].append(len(text))
+                    heap += text
+
+            rows_before = self._meta["rows"]
+            with span(f"storage.write.{self.name}"):
+                paths = []
+                for column, values in columns.items():
+                    path = self._column_path(column)
+                    self._append_file(path, rows_before * values.itemsize, values.tobytes())
+                    paths.append(path)
+                self._append_file(self.heap_path, heap_size, bytes(heap))
+                paths.append(self.heap_path)
+                self._commit(paths, rows=rows_before + len(rows), heap=heap_size + len(heap))
+            record_bytes(self.name, written=len(heap) + sum(len(values) * values.itemsize
+                                                            for values in columns.values()))
+
+    def update(self, key, changes: Dict) -> Dict:
+        self.update_many([(key, changes)])
+        return self.get(key)
+
+    def update_many(self, updates: List[Tuple]):
+        with self.transaction(), self._lock:
+            self._roll_back()
+            self._refresh()
+            heap_size = self._meta["heap"]
+            heap = bytearray()
+            writes = []
+            reassigned = False
+            # positions whose status or creation time are overwritten, for the journal
+            changed = []
+
+            for key, changes in updates:
+                position = self._positions.get(key)
+                if position is None:
+                    raise ValueError(f"{self.name} row {key} not found")
+
+                for field, value in changes.items():
+                    if field == "task_status":
+                        writes.append(("status", position, _status_code(value)))
+                        changed.append(position)
+                    elif field == "creation_time":
+                        writes.append(("created", position, encode_time(value)))
+                        changed.append(position)
+                    elif field in ("board_id", "user_id"):
+                        writes.append((field, position, value))
+                        reassigned = True
+                    elif field in TEXT_FIELDS:
+                        text = value.encode("utf-8")
+                        writes.append((f"{field}_offset", position, heap_size + len(heap)))
+                        writes.append((f"{field}_length", position, len(text)))
+                        heap += text
+                    elif field != "id" or value != key:
+                        raise ValueError(f"{self.name} rows cannot change {field}")
+
+            with span(f"storage.write.{self.name}"):
+                paths = [self.heap_path] if heap else []
+                if heap:
+                    self._append_file(self.heap_path, heap_size, bytes(heap))
+                paths += self._write_in_place(writes)
+                journaled = None
+                if changed and not reassigned:
+                    committed = self._meta.get("changes", 0)
+                    self._append_file(self.changes_path, committed * 8, array.array("q", changed).tobytes())
+                    paths.append(self.changes_path)
+                    journaled = committed + len(changed)
+                self._commit(paths, heap=heap_size + len(heap), reassigned=reassigned, changes=journaled)
+            record_bytes(self.name, written=len(heap) + 8 * len(writes))
+
+    def delete(self, key):
+        self.delete_many([key])
+
+    def delete_many(self, keys: List):
+        with self.transaction(), self._lock:
+            self._roll_back()
+            self._refresh()
+            writes = [("deleted", self._positions[key], 1) for key in keys if key in self._positions]
+            if writes:
+                self._commit(self._write_in_place(writes), reassigned=True)
+
+    def _write_in_place(self, writes: List[Tuple[str, int, int]]) -> List[str]:
+        # the committed values are saved before any is overwritten, so a crash in the middle of the
+        # batch does not leave it partly applied: the next writer puts them back (_roll_back)
+        undo = [[column, position, self._columns[column][position]] for column, position, _ in writes]
+        self._replace_file(self.undo_path, codec.dumps({"version": self._meta["version"], "writes": undo}),
+                           sync=self.fsync == "always")
+        return self._overwrite(writes)
+
+    def _roll_back(self):
+        try:
+            with open(self.undo_path, 'rb') as f:
+                undo = codec.loads(f.read())
+        except FileNotFoundError:
+            return
+
+        self._refresh()
+        if undo["version"] != self._meta["version"]:
+            # the batch was committed before its undo was removed
+            os.remove(self.undo_path)
+            return
+        # every process may have read some of the overwritten values, a new generation rebuilds them all
+        self._commit(self._overwrite([tuple(write) for write in undo["writes"]]), reassigned=True)
+
+    def _overwrite(self, writes: List[Tuple[str, int, int]]) -> List[str]:
+        by_column = {}
+        for column, position, value in writes:
+            by_column.setdefault(column, []).append((position, value))
+
+        paths = []
+        for column, values in by_column.items():
+            path = self._column_path(column)
+            item = array.array(COLUMNS[column])
+            with open(path, 'r+b') as f:
+                for position, value in values:
+                    f.seek(position * item.itemsize)
+                    f.write(array.array(COLUMNS[column], [value]).tobytes())
+            paths.append(path)
+        return paths
+
+    @staticmethod
+    def _append_file(path: str, committed_size: int, content: bytes):
+        # drop whatever a crashed write left after the committed data
+        with open(path, 'ab') as f:
+            if f.tell() != committed_size:
+                f.truncate(committed_size)
+            f.write(content)
+
+    def _commit(self, paths: List[str], rows: int = None, heap: int = None, reassigned: bool = False,
+                changes: int = None):
+        if self.fsync != "never":
+            self._unsynced.update(paths)
+        sync = self.fsync == "always" or (
+                self.fsync == "interval" and time.monotonic() - self._last_fsync >= config.FSYNC_INTERVAL)
+        if sync:
+            # the data files reach the disk before the meta file counting them
+            self._unsynced.discard(self.meta_path)
+            self._flush()
+
+        meta = dict(self._meta)
+        meta["rows"] = rows if rows is not None else meta["rows"]
+        meta["heap"] = heap if heap is not None else meta["heap"]
+        meta["generation"] += 1 if reassigned else 0
+        # a new generation is rebuilt from the columns, its journal starts empty
+        meta["changes"] = 0 if reassigned else changes if changes is not None else meta.get("changes", 0)
+        meta["version"] += 1
+        self._replace_file(self.meta_path, codec.dumps(meta), sync=sync)
+        if not sync and self.fsync == "interval":
+            self._unsynced.add(self.meta_path)
+            self._start_flusher()
+        try:
+            os.remove(self.undo_path)
+        except FileNotFoundError:
+            pass
+        self._refresh()
+
+    def _flush(self):
+        # the meta file goes last, after the data it counts
+        for path in sorted(self._unsynced, key=lambda path: path == self.meta_path):
+            with open(path, 'rb') as f:
+                os.fsync(f.fileno())
+        self._unsynced.clear()
+        self._last_fsync = time.monotonic()
+
+    def _start_flusher(self):
+        if self._flusher is not None:
+            return
+
+        self._flusher = threading.Thread(target=self._flush_periodically, name=f"fsync-{self.name}", daemon=True)
+        self._flusher.start()
+
+    def _flush_periodically(self):
+        # commits made since the last fsync are forced to disk at most FSYNC_INTERVAL seconds later
+        while True:
+            time.sleep(config.FSYNC_INTERVAL)
+            try:
+                with self._lock:
+                    if self._unsynced:
+                        self._flush()
+            except OSError:
+                # try again on the next round
+                pass
+
+    @staticmethod
+    def _replace_file(path: str, content: bytes, sync: bool):
+        temp_path = path + ".tmp"
+        with open(temp_path, 'wb') as f:
+            f.write(content)
+            if sync:
+                f.flush()
+                os.fsync(f.fileno())
+        os.replace(temp_path, path)
+
+    def import_rows(self, rows: List[Dict]):
+        """
+        Fill an empty store with the rows of another task store.
+        """
+        rows = sorted(rows, key=lambda row: row["id"])
+        for start in range(0, len(rows), 10000):
+            self.insert_many(rows[start:start + 10000])
+
+
+def _created_key(created: int) -> int:
+    # the time index is fed the creation time column values themselves
+    return created
+
+
+def _status_code(status) -> int:
+    status = getattr(status, "value", status)
+    if status not in STATUS_CODES:
+        raise ValueError(f"Unknown task status {status}")
+    return STATUS_CODES[status]
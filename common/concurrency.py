@@ -0,0 +1,84 @@
+import functools
+import threading
+
+from typing import Callable
+
+from starlette.concurrency import run_in_threadpool
+
+from common.codec import FastJSONResponse
+from common.instrumentation import span
+
+
+class AsyncProxy:
+    """
+    Async view of a synchronous controller or storage engine.
+
+    Every method call is run in the threadpool and returns an awaitable, so the
+    blocking file I/O and json parsing behind it never stalls the event loop.
+
+        user_controller = AsyncProxy(UserController())
+        user_id = await user_controller.create_user(request)
+
+    FastAPI encodes returned models on the event loop, which stalls it for large
+    lists. Calls made through `as_response` also encode the result in the
+    threadpool and return a ready JSONResponse:
+
+        return await user_controller.as_response.list_users()
+
+    `lazy` builds the target on first use instead, so that importing a router
+    does not open the stores of its controller:
+
+        user_controller = AsyncProxy.lazy(UserController)
+    """
+
+    def __init__(self, target, as_response: bool = False):
+        self._target = target
+        self._as_response = as_response
+        self._factory = None
+        self._lock = None
+
+    @classmethod
+    def lazy(cls, factory: Callable[[], object]) -> "AsyncProxy":
+        proxy = cls(None)
+        proxy._factory = factory
+        proxy._lock = threading.Lock()
+        return proxy
+
+    @property
+    def target(self):
+        if self._factory is not None:
+            with self._lock:
+                if self._factory is not None:
+                    self._target = self._factory()
+                    self._factory = None
+        return self._target
+
+    @property
+    def as_response(self) -> "AsyncProxy":
+        if self._factory is None:
+            return AsyncProxy(self._target, as_response=True)
+        # shares this proxy's target, built once by whichever proxy is used first
+        proxy = AsyncProxy.lazy(lambda: self.target)
+        proxy._as_response = True
+        return proxy
+
+    def __getattr__(self, name):
+        attr = getattr(self.target, name)
+        if not callable(attr):
+            return attr
+
+        if self._as_response:
+            def respond(*args, **kwargs):
+                result = attr(*args, **kwargs)
+                with span("response.encode"):
+                    return FastJSONResponse(result)
+
+            target = respond
+        else:
+            target = attr
+
+        @functools.wraps(attr)
+        async def call(*args, **kwargs):
+            return await run_in_threadpool(target, *args, **kwargs)
+
+        return call
@@ -0,0 +1,139 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from email.utils import formatdate
+from typing import Callable, Optional
+
+from fastapi import Request, Response, status
+from pydantic import PositiveInt
+from starlette.concurrency import run_in_threadpool
+
+from common.instrumentation import span
+from common.storage import get_storage
+
+
+class VersionTags:
+    """
+    ETags of the read endpoints and the time each one was first served.
+
+    A tag is a digest of the path, the query string and the version of the data
+    behind the endpoint: the signature of the stores it reads (file identity and
+    size, sqlite table version) or the version counter of a board. The version is
+    known without loading or encoding any rows.
+
+    The first time a tag is seen is served as Last-Modified. It is approximate
+    (per process, one second resolution), so only If-None-Match is answered with
+    304 Not Modified.
+    """
+
+    def __init__(self, max_tags: int = 4096):
+        self.max_tags = max_tags
+        self._first_seen: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+        self.not_modified = 0
+
+    def etag(self, request: Request, version) -> str:
+        digest = hashlib.blake2b(repr((request.url.path, request.url.query, version)).encode("utf-8"),
+                                 digest_size=12).hexdigest()
+        return f'"{digest}"'
+
+    def last_modified(self, tag: str) -> float:
+        with self._lock:
+            seen = self._first_seen.get(tag)
+            if seen is None:
+                seen = self._first_seen[tag] = time.time()
+                if len(self._first_seen) > self.max_tags:
+                    self._first_seen.popitem(last=False)
+            else:
+                self._first_seen.move_to_end(tag)
+            return seen
+
+    def stats(self) -> dict:
+        return {"tags": len(self._first_seen), "not_modified": self.not_modified}
+
+
+version_tags = VersionTags()
+
+
+class Conditional:
+    """
+    ETag of one request to a read endpoint.
+
+        async def list_users(version: Conditional = Depends(StoreVersion("users"))):
+            if version.not_modified:
+                return version.not_modified_response()
+            return version.tag(await user_controller.as_response.list_users())
+    """
+
+    def __init__(self, request: Request, response: Response, tag: Optional[str]):
+        self._response = response
+        self.headers = {}
+        if tag is not None:
+            self.headers = {
+                "ETag": tag,
+                "Last-Modified": formatdate(version_tags.last_modified(tag), usegmt=True),
+                # the client may keep the response, but must revalidate it
+                "Cache-Control": "no-cache",
+            }
+        self.not_modified = tag is not None and _matches(request.headers.get("if-none-match"), tag)
+
+    def not_modified_response(self) -> Response:
+        version_tags.not_modified += 1
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=self.headers)
+
+    def tag(self, result):
+        """
+        Add the ETag headers to the result of the endpoint, a response or a model.
+        """
+        target = result if isinstance(result, Response) else self._response
+        target.headers.update(self.headers)
+        return result
+
+
+def _matches(if_none_match: Optional[str], tag: str) -> bool:
+    if not if_none_match:
+        return False
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == "*" or candidate == tag:
+            return True
+    return False
+
+
+async def _conditional(request: Request, response: Response, version: Callable[[], object]) -> Conditional:
+    with span("conditional.version"):
+        value = await run_in_threadpool(version)
+    tag = version_tags.etag(request, value) if value is not None else None
+    return Conditional(request, response, tag)
+
+
+class StoreVersion:
+    """
+    Dependency tagging an endpoint with the signatures of the stores it reads.
+    """
+
+    def __init__(self, *stores: str):
+        self.stores = stores
+
+    def version(self):
+        signatures = tuple(get_storage(name).signature() for name in self.stores)
+        return signatures if any(signature is not None for signature in signatures) else None
+
+    async def __call__(self, request: Request, response: Response) -> Conditional:
+        return await _conditional(request, response, self.version)
+
+
+def board_version(board_id: int) -> Optional[int]:
+    board = get_storage("boards").get(board_id)
+    return board.get("version", 0) if board is not None else None
+
+
+async def board_conditional(request: Request, response: Response, board_id: PositiveInt) -> Conditional:
+    """
+    Dependency tagging an endpoint of one board with the board version, which changes
+    with its tasks, its status, its team and the users its tasks are assigned to.
+    """
+    return await _conditional(request, response, lambda: board_version(board_id))
@@ -0,0 +1,58 @@
+import os
+
+# Folder holding the persisted application data
+DB_DIR = os.environ.get("FACTWISE_DB_DIR", "db")
+
+# Storage backend used by all controllers: "json" or "sqlite"
+STORAGE_BACKEND = os.environ.get("FACTWISE_STORAGE_BACKEND", "json")
+
+# Folder the board exports are written to
+OUTPUT_DIR = os.environ.get("FACTWISE_OUTPUT_DIR", "output")
+
+# Size of the cache of rendered board export fragments, in characters
+EXPORT_CACHE_CHARS = int(os.environ.get("FACTWISE_EXPORT_CACHE_CHARS", str(64 * 1024 * 1024)))
+
+# Database file used by the sqlite backend
+SQLITE_PATH = os.environ.get("FACTWISE_SQLITE_PATH", os.path.join(DB_DIR, "factwise.sqlite3"))
+
+# Serve reads from the shared in-memory entity cache
+CACHE_ENABLED = os.environ.get("FACTWISE_CACHE", "1") == "1"
+
+# Hold the cached rows as compact slotted records (common/records.py) instead of dicts
+COMPACT_ROWS = os.environ.get("FACTWISE_COMPACT_ROWS", "1") == "1"
+
+# Json backend persistence: "rewrite" the whole file or "append" mutations to a log
+JSON_MODE = os.environ.get("FACTWISE_JSON_MODE", "rewrite")
+
+# Codec of the store files and responses: "auto" uses orjson when it is installed, "json" the stdlib module
+JSON_CODEC = os.environ.get("FACTWISE_JSON_CODEC", "auto")
+
+# When appended records are forced to disk: "always", "interval" or "never"
+FSYNC_POLICY = os.environ.get("FACTWISE_FSYNC", "interval")
+FSYNC_INTERVAL = float(os.environ.get("FACTWISE_FSYNC_INTERVAL", "1.0"))
+
+# Seconds between background compactions of the append log (0 disables the compactor)
+COMPACT_INTERVAL = float(os.environ.get("FACTWISE_COMPACT_INTERVAL", "60"))
+# Smallest log size in bytes worth compacting
+COMPACT_MIN_BYTES = int(os.environ.get("FACTWISE_COMPACT_MIN_BYTES", str(1024 * 1024)))
+
+# Time storage, index and encoding spans, add Server-Timing headers and fill the /metrics histograms
+INSTRUMENTATION_ENABLED = os.environ.get("FACTWISE_INSTRUMENTATION", "0") == "1"
+
+# On-disk format of the tasks: "rows" (the storage backend) or "columnar" (memory-mapped columns in db/task.columns)
+TASK_FORMAT = os.environ.get("FACTWISE_TASK_FORMAT", "rows")
+
+# Change feed of task, board and membership mutations (db/events.log): enabled, events kept, and how often
+# the event stream checks the feed for new events, in seconds
+CHANGE_FEED_ENABLED = os.environ.get("FACTWISE_CHANGE_FEED", "1") == "1"
+CHANGE_FEED_RETENTION = int(os.environ.get("FACTWISE_CHANGE_FEED_RETENTION", "10000"))
+CHANGE_FEED_POLL_INTERVAL = float(os.environ.get("FACTWISE_CHANGE_FEED_POLL_INTERVAL", "0.5"))
+
+# Snapshots of the cached stores (db/snapshots), loaded at startup instead of the store when they are current,
+# and seconds between background snapshots of the stores that changed (0 disables them)
+SNAPSHOT_ENABLED = os.environ.get("FACTWISE_SNAPSHOTS", "1") == "1"
+SNAPSHOT_DIR = os.environ.get("FACTWISE_SNAPSHOT_DIR", os.path.join(DB_DIR, "snapshots"))
+SNAPSHOT_INTERVAL = float(os.environ.get("FACTWISE_SNAPSHOT_INTERVAL", "60"))
+
+# Stores loaded in the background when a worker starts, before it reports ready: "all" or comma separated names
+PRELOAD = [name for name in os.environ.get("FACTWISE_PRELOAD", "").split(",") if name]
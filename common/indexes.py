@@ -0,0 +1,335 @@
+import bisect
+import itertools
+import operator
+from collections import Counter
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from common.records import field_getter
+
+
+class HashIndex:
+    """
+    Hash index over one or more fields of the rows of a store.
+
+    A unique index maps the indexed value to the primary key of the row.
+    A non unique index maps the indexed value to the primary keys of all matching
+    rows, kept sorted, so a page of them after a primary key is found by bisection.
+    Rows are usually added with the largest primary key so far, which is an append.
+    For a single field the indexed value is the field value, otherwise a tuple of
+    the field values.
+    """
+
+    def __init__(self, name: str, fields: Tuple[str, ...], unique: bool = True):
+        self.name = name
+        self.fields = fields
+        self.unique = unique
+        self.entries: Dict = {}
+        # the field value, or the tuple of the field values
+        self.value_of = operator.itemgetter(*fields)
+
+    def covers(self, changes: Dict) -> bool:
+        return any(field in changes for field in self.fields)
+
+    def rebuild(self, rows: Iterable[Tuple]):
+        self.entries = {}
+        for pk, row in rows:
+            self.add(pk, row)
+
+    def add(self, pk, row: Dict):
+        value = self.value_of(row)
+        if self.unique:
+            self.entries[value] = pk
+            return
+
+        bucket = self.entries.setdefault(value, [])
+        if not bucket or pk > bucket[-1]:
+            bucket.append(pk)
+            return
+        position = bisect.bisect_left(bucket, pk)
+        if position == len(bucket) or bucket[position] != pk:
+            bucket.insert(position, pk)
+
+    def remove(self, pk, row: Dict):
+        value = self.value_of(row)
+        if self.unique:
+            if self.entries.get(value) == pk:
+                del self.entries[value]
+            return
+
+        bucket = self.entries.get(value)
+        if bucket is not None:
+            position = bisect.bisect_left(bucket, pk)
+            if position < len(bucket) and bucket[position] == pk:
+                del bucket[position]
+            if not bucket:
+                del self.entries[value]
+
+    def state(self):
+        """
+        A copy of the index content, for a snapshot of the store.
+        """
+        if self.unique:
+            return dict(self.entries)
+        return {value: list(bucket) for value, bucket in self.entries.items()}
+
+    def restore(self, state):
+        self.entries = state
+
+    def lookup(self, value) -> List:
+        """
+        Primary keys of the rows with the given indexed value.
+        """
+        if self.unique:
+            return [self.entries[value]] if value in self.entries else []
+        return list(self.entries.get(value, ()))
+
+    def lookup_after(self, value, after=None, limit: int = None) -> List:
+        """
+        Primary keys of the rows with the given indexed value in primary key order,
+        starting after the given key, at most limit of them.
+        """
+        bucket = self.lookup(value) if self.unique else self.entries.get(value, [])
+        start = 0 if after is None else bisect.bisect_right(bucket, after)
+        return bucket[start:None if limit is None else start + limit]
+
+    def count(self, value) -> int:
+        """
+        Number of rows with the given indexed value.
+        """
+        if self.unique:
+            return int(value in self.entries)
+        return len(self.entries.get(value, ()))
+
+
+class SortedIndex:
+    """
+    Ordered index over the sort key of the rows of a store, for range queries.
+
+    The key of a row is computed by the key function (e.g. the creation time as
+    an integer); rows without a key are not indexed. Two parallel lists hold the
+    keys and the primary keys, sorted by (key, primary key), so a range of keys is
+    a slice found by bisection and rows with equal keys come in primary key order.
+
+    Rows are usually added with the largest key so far, which is an append.
+    """
+
+    unique = False
+
+    def __init__(self, name: str, fields: Tuple[str, ...], key: Callable[[Dict], object]):
+        self.name = name
+        self.fields = fields
+        self.value_of = key
+        self.keys: List = []
+        self.pks: List = []
+
+    def covers(self, changes: Dict) -> bool:
+        return any(field in changes for field in self.fields)
+
+    def rebuild(self, rows: Iterable[Tuple]):
+        key = self.value_of
+        keys, pks = [], []
+        for pk, row in rows:
+            value = key(row)
+            if value is not None:
+                keys.append(value)
+                pks.append(pk)
+        # rows are usually loaded in primary key order, which is also the order of their creation times
+        if any(map(operator.gt, keys, itertools.islice(keys, 1, None))) or any(
+                map(operator.gt, pks, itertools.islice(pks, 1, None))):
+            entries = sorted(zip(keys, pks))
+            keys = [value for value, _ in entries]
+            pks = [pk for _, pk in entries]
+        self.keys = keys
+        self.pks = pks
+
+    def state(self):
+        return list(self.keys), list(self.pks)
+
+    def restore(self, state):
+        self.keys, self.pks = state
+
+    def add(self, pk, row: Dict):
+        value = self.value_of(row)
+        if value is None:
+            return
+        if not self.keys or (value, pk) > (self.keys[-1], self.pks[-1]):
+            self.keys.append(value)
+            self.pks.append(pk)
+            return
+        position = self.position(value, pk)
+        self.keys.insert(position, value)
+        self.pks.insert(position, pk)
+
+    def remove(self, pk, row: Dict):
+        value = self.value_of(row)
+        if value is None:
+            return
+        position = self.position(value, pk)
+        if position < len(self.pks) and self.pks[position] == pk and self.keys[position] == value:
+            del self.keys[position]
+            del self.pks[position]
+
+    def position(self, value, pk) -> int:
+        """
+        Position of the first entry not before (value, pk).
+        """
+        start = bisect.bisect_left(self.keys, value)
+        end = bisect.bisect_right(self.keys, value, start)
+        return bisect.bisect_left(self.pks, pk, start, end)
+
+    def bounds(self, low=None, high=None, after: Optional[Tuple] = None, reverse: bool = False) -> Tuple[int, int]:
+        """
+        Slice of the entries whose key is strictly between low and high, and past
+        the (key, pk) entry `after` in the scan direction.
+        """
+        start = 0 if low is None else bisect.bisect_right(self.keys, low)
+        end = len(self.keys) if high is None else bisect.bisect_left(self.keys, high)
+        if after is not None:
+            position = self.position(*after)
+            if reverse:
+                end = min(end, position)
+            else:
+                if position < len(self.pks) and self.pks[position] == after[1] and self.keys[position] == after[0]:
+                    position += 1
+                start = max(start, position)
+        return start, max(start, end)
+
+    def lookup(self, value) -> List:
+        start = bisect.bisect_left(self.keys, value)
+        return self.pks[start:bisect.bisect_right(self.keys, value, start)]
+
+    def lookup_after(self, value, after=None, limit: int = None) -> List:
+        start = bisect.bisect_left(self.keys, value)
+        end = bisect.bisect_right(self.keys, value, start)
+        if after is not None:
+            start = bisect.bisect_right(self.pks, after, start, end)
+        return self.pks[start:end if limit is None else min(end, start + limit)]
+
+    def count(self, value) -> int:
+        start = bisect.bisect_left(self.keys, value)
+        return bisect.bisect_right(self.keys, value, start) - start
+
+
+class CountIndex:
+    """
+    Running counts of the values of one field per value of the grouping fields,
+    e.g. the number of tasks in each status per board.
+
+    It is maintained by the entity cache like a HashIndex, so the counts follow
+    every insert, update and delete of the store and are recounted when the
+    store is reloaded. The counts over all rows are kept too.
+
+    With `through` (a field of the row and a mapping of its values) the rows are
+    grouped by a value the rows do not hold, e.g. the tasks per team through the
+    team of their board. The mapping of a value must not change while the index
+    lives, boards keep their team.
+    """
+
+    unique = False
+
+    def __init__(self, name: str, fields: Tuple[str, ...], counted: str,
+                 through: Optional[Tuple[str, Callable]] = None):
+        self.name = name
+        self.fields = fields
+        self.counted = counted
+        self.through = through
+        if through is None:
+            self.value_of = operator.itemgetter(*fields)
+        else:
+            source, mapping = through
+            self.value_of = lambda row: mapping(row[source])
+        # grouping value -> {counted value: number of rows}
+        self.entries: Dict = {}
+        self.totals: Dict = {}
+
+    def covers(self, changes: Dict) -> bool:
+        fields = self.fields if self.through is None else (self.through[0],)
+        return self.counted in changes or any(field in changes for field in fields)
+
+    def rebuild(self, rows: Iterable[Tuple]):
+        if self.through is not None:
+            self._rebuild_through(rows)
+            return
+
+        self.entries = {}
+        self.totals = {}
+        rows = [row for _, row in rows]
+        try:
+            # one pass counting (grouping fields..., counted field) tuples
+            pairs = Counter(map(field_getter(rows, self.fields + (self.counted,)), rows))
+        except (AttributeError, KeyError):
+            # a row without one of the fields
+            for row in rows:
+                self.add(None, row)
+            return
+        single = len(self.fields) == 1
+        for pair, count in pairs.items():
+            group = pair[0] if single else pair[:-1]
+            self.entries.setdefault(group, {})[pair[-1]] = count
+            self.totals[pair[-1]] = self.totals.get(pair[-1], 0) + count
+
+    def _rebuild_through(self, rows: Iterable[Tuple]):
+        # counted per value of the source field first, so each distinct value is mapped once
+        source, mapping = self.through
+        by_source = CountIndex(self.name, (source,), self.counted)
+        by_source.rebuild(rows)
+        self.entries = {}
+        self.totals = by_source.totals
+        for value, counts in by_source.entries.items():
+            group = self.entries.setdefault(mapping(value), {})
+            for counted, count in counts.items():
+                group[counted] = group.get(counted, 0) + count
+
+    def state(self):
+        return {group: dict(counts) for group, counts in self.entries.items()}, dict(self.totals)
+
+    def restore(self, state):
+        self.entries, self.totals = state
+
+    def add(self, pk, row: Dict):
+        value = row.get(self.counted)
+        group = self.value_of(row)
+        counts = self.entries.get(group)
+        if counts is None:
+            counts = self.entries[group] = {}
+        counts[value] = counts.get(value, 0) + 1
+        self.totals[value] = self.totals.get(value, 0) + 1
+
+    def remove(self, pk, row: Dict):
+        value = row.get(self.counted)
+        group = self.value_of(row)
+        counts = self.entries.get(group)
+        if counts is None or value not in counts:
+            return
+        _decrement(counts, value)
+        if not counts:
+            del self.entries[group]
+        _decrement(self.totals, value)
+
+    def counts(self, value=None) -> Dict:
+        """
+        Number of rows per counted value, among the rows with the given grouping value,
+        or among all rows when it is None.
+        """
+        return dict(self.totals if value is None else self.entries.get(value, ()))
+
+    def differences(self, other: "CountIndex") -> List[Dict]:
+        """
+        The counts that differ between this index and another one over the same fields.
+        """
+        differences = []
+        for group in self.entries.keys() | other.entries.keys():
+            counts = self.entries.get(group, {})
+            expected = other.entries.get(group, {})
+            for value in counts.keys() | expected.keys():
+                if counts.get(value, 0) != expected.get(value, 0):
+                    differences.append({"index": self.name, "group": group, "value": value,
+                                        "running": counts.get(value, 0), "recounted": expected.get(value, 0)})
+        return differences
+
+
+def _decrement(counts: Dict, value):
+    if counts[value] == 1:
+        del counts[value]
+    else:
+        counts[value] -= 1
@@ -0,0 +1,171 @@
+import bisect
+import threading
+import time
+from contextlib import nullcontext
+from contextvars import ContextVar
+from typing import Dict, List, Optional
+
+from common import config
+
+# upper bounds of the latency histogram buckets, in milliseconds
+BUCKETS_MS = [0.1, 0.5, 1, 5, 10, 50, 100, 500, 1000, 5000]
+
+_NO_SPAN = nullcontext()
+
+
+class Histogram:
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS_MS) + 1)
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+
+    def observe(self, ms: float):
+        self.counts[bisect.bisect_left(BUCKETS_MS, ms)] += 1
+        self.count += 1
+        self.total_ms += ms
+        self.max_ms = max(self.max_ms, ms)
+
+    def snapshot(self) -> Dict:
+        buckets = {f"le_{bound}": count for bound, count in zip(BUCKETS_MS, self.counts)}
+        buckets["le_inf"] = self.counts[-1]
+        return {
+            "count": self.count,
+            "sum_ms": round(self.total_ms, 3),
+            "max_ms": round(self.max_ms, 3),
+            "buckets": buckets,
+        }
+
+
+class Metrics:
+    """
+    Process wide latency histograms per span name and bytes read/written per store.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._spans: Dict[str, Histogram] = {}
+        self._stores: Dict[str, Dict[str, int]] = {}
+
+    def observe(self, name: str, ms: float):
+        with self._lock:
+            histogram = self._spans.get(name)
+            if histogram is None:
+                histogram = self._spans[name] = Histogram()
+            histogram.observe(ms)
+
+    def add_bytes(self, store: str, read: int = 0, written: int = 0):
+        with self._lock:
+            counters = self._stores.get(store)
+            if counters is None:
+                counters = self._stores[store] = {"bytes_read": 0, "bytes_written": 0}
+            counters["bytes_read"] += read
+            counters["bytes_written"] += written
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            return {
+                "spans": {name: histogram.snapshot() for name, histogram in sorted(self._spans.items())},
+                "stores": {store: dict(counters) for store, counters in sorted(self._stores.items())},
+            }
+
+    def reset(self):
+        with self._lock:
+            self._spans.clear()
+            self._stores.clear()
+
+
+class RequestTimings:
+    """
+    Time spent per span name while handling one request, for the Server-Timing header.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._timings: Dict[str, List] = {}
+
+    def add(self, name: str, ms: float):
+        with self._lock:
+            timing = self._timings.setdefault(name, [0.0, 0])
+            timing[0] += ms
+            timing[1] += 1
+
+    def header(self, total_ms: float) -> str:
+        with self._lock:
+            entries = [f'{name};dur={ms:.3f};desc="{count}x"' for name, (ms, count) in self._timings.items()]
+        entries.append(f"total;dur={total_ms:.3f}")
+        return ", ".join(entries)
+
+
+metrics = Metrics()
+
+# timings of the request being handled, copied into the threadpool with the context
+_request_timings: ContextVar[Optional[RequestTimings]] = ContextVar("request_timings", default=None)
+
+
+class _Span:
+    __slots__ = ("name", "_began")
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def __enter__(self):
+        self._began = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        ms = (time.perf_counter() - self._began) * 1000
+        metrics.observe(self.name, ms)
+        timings = _request_timings.get()
+        if timings is not None:
+            timings.add(self.name, ms)
+
+
+def span(name: str):
+    """
+    Time the enclosed block under the given name, when instrumentation is enabled.
+
+        with span("storage.read.users"):
+            ...
+    """
+    if not config.INSTRUMENTATION_ENABLED:
+        return _NO_SPAN
+    return _Span(name)
+
+
+def record_bytes(store: str, read: int = 0, written: int = 0):
+    if config.INSTRUMENTATION_ENABLED:
+        metrics.add_bytes(store, read, written)
+
+
+class ServerTimingMiddleware:
+    """
+    Times every request, records it in the "handler.<endpoint>" histogram and adds
+    a Server-Timing header with the spans run while handling it.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        timings = RequestTimings()
+        token = _request_timings.set(timings)
+        began = time.perf_counter()
+
+        async def send_with_timings(message):
+            if message["type"] == "http.response.start":
+                header = timings.header((time.perf_counter() - began) * 1000)
+                message = {**message, "headers": [*message.get("headers", []), (b"server-timing", header.encode())]}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timings)
+        finally:
+            _request_timings.reset(token)
+            endpoint = scope.get("endpoint")
+            name = f"handler.{endpoint.__name__}" if endpoint is not None else "handler.unmatched"
+            metrics.observe(name, (time.perf_counter() - began) * 1000)
@@ -0,0 +1,91 @@
+import itertools
+from enum import Enum
+from typing import Callable, Dict, Iterable, Iterator, Optional
+
+from fastapi import Query
+from fastapi.responses import StreamingResponse
+
+from common import codec
+from common.instrumentation import span
+
+# items encoded per chunk of a streamed response
+NDJSON_CHUNK = 500
+# rows read from an index per call by paginate_index
+INDEX_CHUNK = 1024
+
+
+class ListFormat(str, Enum):
+    JSON = 'json'
+    NDJSON = 'ndjson'
+
+
+class PageParams:
+    """
+    Query parameters shared by the list endpoints.
+
+    Pages are keyset based: pass the id of the last item received as after_id to
+    get the next page. Without a limit the whole list is returned. With
+    format=ndjson the items are streamed as newline delimited json.
+    """
+
+    def __init__(
+            self,
+            limit: Optional[int] = Query(None, gt=0),
+            after_id: Optional[int] = Query(None, ge=0),
+            format: ListFormat = Query(ListFormat.JSON),
+    ):
+        self.limit = limit
+        self.after_id = after_id
+        self.format = format
+
+
+def paginate(rows: Iterable[Dict], after_id: int = None, limit: int = None,
+             predicate: Callable[[Dict], bool] = None) -> Iterator[Dict]:
+    """
+    Lazily apply a keyset page to rows ordered by id.
+    """
+    if after_id is not None:
+        rows = itertools.dropwhile(lambda row: row["id"] <= after_id, rows)
+    if predicate is not None:
+        rows = filter(predicate, rows)
+    if limit is not None:
+        rows = itertools.islice(rows, limit)
+    return rows
+
+
+def paginate_index(storage, index_name: str, value, after_id: int = None, limit: int = None,
+                   predicate: Callable[[Dict], bool] = None) -> Iterator[Dict]:
+    """
+    Lazily apply a keyset page to the rows of a store with the given indexed value.
+    The rows are read in id order from the index a chunk at a time, starting after
+    after_id, instead of copying every matching row and skipping to after_id.
+    """
+    def rows():
+        after = after_id
+        size = INDEX_CHUNK if limit is None else min(limit, INDEX_CHUNK)
+        while True:
+            chunk = storage.find_after(index_name, value, after, size)
+            if not chunk:
+                return
+            yield from chunk
+            after = chunk[-1]["id"]
+
+    return paginate(rows(), limit=limit, predicate=predicate)
+
+
+def ndjson_response(items: Iterable) -> StreamingResponse:
+    """
+    Stream items as newline delimited json. The iterable is consumed lazily in
+    the threadpool, a chunk of items at a time.
+    """
+    def encode():
+        items_iter = iter(items)
+        while True:
+            chunk = list(itertools.islice(items_iter, NDJSON_CHUNK))
+            if not chunk:
+                return
+            with span("response.encode"):
+                encoded = b"".join(codec.encode(item) + b"\n" for item in chunk)
+            yield encoded
+
+    return StreamingResponse(encode(), media_type="application/x-ndjson")
@@ -0,0 +1,267 @@
+import contextlib
+import functools
+import gc
+import operator
+import sys
+from collections.abc import Mapping
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Iterator, List, Optional, Tuple, Type
+
+# name of the store -> fields kept in the slots of its records, in row order.
+# Fields that are not listed are kept in a small per record dict.
+RECORD_FIELDS = {
+    "users": ("id", "name", "display_name", "description", "creation_time"),
+    "teams": ("id", "name", "description", "creation_time", "admin", "users"),
+    "boards": ("id", "creation_time", "board_status", "version", "name", "description", "team_id"),
+    "tasks": ("id", "creation_time", "task_status", "board_id", "title", "description", "user_id"),
+    "user_team_linking": ("user_id", "team_id"),
+}
+
+# creation times are kept as integers
+TIME_FIELDS = frozenset(["creation_time"])
+# a handful of distinct values shared by every row, kept as one interned string each
+INTERNED_FIELDS = frozenset(["task_status", "board_status"])
+
+_EPOCH = datetime(1970, 1, 1)
+_MISSING = object()
+
+
+def encode_time(value: str) -> int:
+    """
+    Microseconds since the epoch of a stored "YYYY-MM-DD HH:MM:SS[.ffffff]" time.
+    """
+    delta = datetime.fromisoformat(value) - _EPOCH
+    return (delta.days * 86400 + delta.seconds) * 1000000 + delta.microseconds
+
+
+@functools.lru_cache(maxsize=1 << 18)
+def decode_time(value: int) -> str:
+    # rows created together share their creation time, like in parse_timestamp each
+    # distinct one is decoded once. str() leaves out the microseconds when there are none.
+    return str(_EPOCH + timedelta(microseconds=value))
+
+
+def _compact_time(value):
+    # only the two formats the controllers write are encoded, so decoding gives back the same string
+    if type(value) is str and value[10:11] == " " and (
+            len(value) == 19 or (len(value) == 26 and not value.endswith(".000000"))):
+        try:
+            return encode_time(value)
+        except ValueError:
+            pass
+    return value
+
+
+class Record(Mapping):
+    """
+    Read only mapping over a row of a store, the compact form of the rows held by
+    the entity cache.
+
+    The values live in __slots__ instead of a per row dict, the creation time is
+    an integer decoded on access and the status values are interned. Records
+    compare equal to the dict they were built from and support update(), so the
+    cache and the controllers use them like the dict rows.
+    """
+
+    __slots__ = ("_extra",)
+
+    _fields: Tuple[str, ...] = ()
+    _slotted: frozenset = frozenset()
+
+    def __init__(self, row: Dict):
+        self._extra = None
+        self.update(row)
+
+    def update(self, changes: Dict):
+        for key, value in changes.items():
+            if key in self._slotted:
+                if key in TIME_FIELDS:
+                    value = _compact_time(value)
+                elif key in INTERNED_FIELDS and type(value) is str:
+                    value = sys.intern(value)
+                setattr(self, key, value)
+            elif self._extra is None:
+                self._extra = {key: value}
+            else:
+                self._extra[key] = value
+
+    def __getitem__(self, key):
+        if key in self._slotted:
+            try:
+                value = getattr(self, key)
+            except AttributeError:
+                raise KeyError(key) from None
+            if key in TIME_FIELDS and type(value) is int:
+                return decode_time(value)
+            return value
+        if self._extra is not None and key in self._extra:
+            return self._extra[key]
+        raise KeyError(key)
+
+    def fields_of(self, names: Tuple[str, ...]) -> Dict:
+        """
+        Dict of the given fields that the record has, the fast path of trusted_model.
+        """
+        reader = _reader(type(self), names)
+        if reader is not None:
+            try:
+                return reader(self)
+            except AttributeError:
+                # a field is not set on this record
+                pass
+        return {name: self[name] for name in names if name in self}
+
+    def __contains__(self, key) -> bool:
+        if key in self._slotted:
+            return hasattr(self, key)
+        return self._extra is not None and key in self._extra
+
+    def __iter__(self) -> Iterator[str]:
+        for field in self._fields:
+            if hasattr(self, field):
+                yield field
+        if self._extra is not None:
+            yield from self._extra
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self)
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}({dict(self)!r})"
+
+
+def time_value(row: Mapping, field: str = "creation_time") -> Optional[int]:
+    """
+    Microseconds since the epoch of a time field of a row or record, None when the
+    row has no valid time. Records hand out the integer they keep.
+    """
+    value = getattr(row, field, None) if isinstance(row, Record) and field in row._slotted else row.get(field)
+    if type(value) is int:
+        return value
+    if type(value) is str:
+        try:
+            return encode_time(value)
+        except ValueError:
+            return None
+    return None
+
+
+def field_getter(rows: list, fields: Tuple[str, ...]) -> Callable:
+    """
+    Getter of the given fields of the rows, like operator.itemgetter. When the rows
+    are records keeping those fields as is in slots it reads the slots directly.
+    """
+    if rows and isinstance(rows[0], Record) and type(rows[0])._slotted.issuperset(fields) and \
+            not TIME_FIELDS.intersection(fields):
+        return operator.attrgetter(*fields)
+    return operator.itemgetter(*fields)
+
+
+def _time_value(value):
+    return decode_time(value) if type(value) is int else value
+
+
+@functools.lru_cache(maxsize=None)
+def _reader(record: Type[Record], names: Tuple[str, ...]) -> Optional[Callable[[Record], Dict]]:
+    # a function building the dict of the given fields in one expression, like the
+    # code generated by namedtuple, when they all live in slots
+    if not record._slotted.issuperset(names):
+        return None
+    items = ", ".join(f"{name!r}: _time_value(record.{name})" if name in TIME_FIELDS else f"{name!r}: record.{name}"
+                      for name in names)
+    return eval(f"lambda record: {{{items}}}", {"_time_value": _time_value})
+
+
+def _interned(value):
+    return sys.intern(value) if type(value) is str else value
+
+
+def _init_source(fields: Tuple[str, ...]) -> str:
+    # __init__ assigning every field of a complete row directly, the common case when a store is loaded
+    lines = ["def __init__(self, row):", f"    if len(row) == {len(fields)}:", "        try:"]
+    for field in fields:
+        value = f"row[{field!r}]"
+        if field in TIME_FIELDS:
+            value = f"_compact_time({value})"
+        elif field in INTERNED_FIELDS:
+            value = f"_interned({value})"
+        lines.append(f"            self.{field} = {value}")
+    lines += ["            self._extra = None", "            return", "        except KeyError:", "            pass",
+              "    self._extra = None", "    self.update(row)"]
+    return "\n".join(lines)
+
+
+def _builder_source(fields: Tuple[str, ...]) -> str:
+    # function building the records of a snapshot from the columns of their slot values, which are
+    # stored as kept (times as integers), so nothing is converted again
+    names = ", ".join(f"v_{index}" for index in range(len(fields)))
+    lines = ["def from_columns(cls, columns):", "    new = object.__new__", "    records = []",
+             "    append = records.append", f"    for {names}{',' if len(fields) == 1 else ''} in zip(*columns):",
+             "        record = new(cls)"]
+    lines += [f"        record.{field} = v_{index}" for index, field in enumerate(fields)]
+    lines += ["        record._extra = None", "        append(record)", "    return records"]
+    return "\n".join(lines)
+
+
+def record_type(fields: Tuple[str, ...], name: str = "Row") -> Type[Record]:
+    """
+    Record class with one slot per given field.
+    """
+    namespace = {"_compact_time": _compact_time, "_interned": _interned}
+    exec(_init_source(fields), namespace)
+    exec(_builder_source(fields), namespace)
+    return type(name, (Record,), {"__slots__": fields, "_fields": fields, "_slotted": frozenset(fields),
+                                  "__init__": namespace["__init__"],
+                                  "_from_columns": classmethod(namespace["from_columns"])})
+
+
+def to_columns(record: Type[Record], records: List[Record]) -> Tuple[List[list], Dict[int, Dict]]:
+    """
+    The slot values of records as one list per field, for a snapshot. Records
+    missing a field or holding extra fields are returned apart, as dicts by position.
+    """
+    extras = map(operator.attrgetter("_extra"), records)
+    partial = {position: dict(records[position]) for position, extra in enumerate(extras) if extra is not None}
+    complete = [row for position, row in enumerate(records) if position not in partial] if partial else records
+    try:
+        return [list(map(operator.attrgetter(field), complete)) for field in record._fields], partial
+    except AttributeError:
+        pass
+
+    # some records miss a field, they are rare and found one by one
+    for position, row in enumerate(records):
+        if position not in partial and not all(hasattr(row, field) for field in record._fields):
+            partial[position] = dict(row)
+    complete = [row for position, row in enumerate(records) if position not in partial]
+    return [list(map(operator.attrgetter(field), complete)) for field in record._fields], partial
+
+
+def from_columns(record: Type[Record], columns: List[list], partial: Dict[int, Dict]) -> List[Record]:
+    """
+    Records from the columns and partial rows returned by to_columns, in their original order.
+    """
+    records = record._from_columns(columns)
+    for position in sorted(partial):
+        records.insert(position, record(partial[position]))
+    return records
+
+
+@contextlib.contextmanager
+def paused_gc():
+    """
+    Pause the cyclic garbage collector while rows are loaded in bulk. Records and
+    rows hold no reference cycles, but every allocation counts towards the next
+    collection, and with a million new objects the collector would run over and
+    over, scanning all of them.
+    """
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if enabled:
+            gc.enable()
+
+
+RECORD_TYPES = {store: record_type(fields, store.title().replace("_", "") + "Record")
+                for store, fields in RECORD_FIELDS.items()}
@@ -1,4 +1,8 @@
 from board import router as board_router
+from events import router as events_router
+from metrics import router as metrics_router
+from search import router as search_router
+from stats import router as stats_router
 from teams import router as team_router
 from users import router as user_router
 
@@ -10,3 +14,7 @@ def add_routes(app):
     app.include_router(user_router.router)
     app.include_router(team_router.router)
     app.include_router(board_router.router)
+    app.include_router(events_router.router)
+    app.include_router(search_router.router)
+    app.include_router(stats_router.router)
+    app.include_router(metrics_router.router)
@@ -0,0 +1,80 @@
+import functools
+from datetime import datetime
+from typing import Dict, List, Optional, Type, TypeVar
+
+from pydantic import BaseModel
+
+from common.records import Record
+
+# max number of items accepted by one bulk request
+BULK_MAX_ITEMS = 10000
+
+# distinct creation timestamps kept in parsed form
+TIMESTAMP_CACHE_SIZE = 1 << 18
+
+Model = TypeVar("Model", bound=BaseModel)
+
+
+class BulkItemResult(BaseModel):
+    """
+    Outcome of one item of a bulk request: the id created or updated, or the error
+    """
+    index: int
+    id: Optional[int] = None
+    error: Optional[str] = None
+
+
+class BulkResponse(BaseModel):
+    """
+    Response format for the bulk methods, one result per item in request order
+    """
+    succeeded: int
+    failed: int
+    results: List[BulkItemResult]
+
+    @classmethod
+    def from_results(cls, results: List[Dict]) -> "BulkResponse":
+        failed = sum(1 for result in results if result["error"] is not None)
+        return cls(succeeded=len(results) - failed, failed=failed, results=results)
+
+
+def trusted_model(model: Type[Model], row: Dict, **values) -> Model:
+    """
+    Build a response model from a row of our own store without validating it again.
+    Only the fields of the model are copied from the row, values override them.
+    """
+    names = _field_names(model)
+    if type(row) is not dict and isinstance(row, Record):
+        # the fields given in values are not decoded from the record
+        fields = row.fields_of(names if not values else tuple(name for name in names if name not in values))
+    else:
+        fields = {name: row[name] for name in names if name in row}
+    fields.update(values)
+    if len(fields) != len(names):
+        # let pydantic fill in the defaults of the missing fields
+        return model.construct(**fields)
+
+    # what construct() does for a complete row, without its per field overhead
+    instance = model.__new__(model)
+    object.__setattr__(instance, "__dict__", fields)
+    object.__setattr__(instance, "__fields_set__", set(fields))
+    return instance
+
+
+@functools.lru_cache(maxsize=None)
+def _field_names(model: Type[BaseModel]) -> tuple:
+    return tuple(model.__fields__)
+
+
+@functools.lru_cache(maxsize=TIMESTAMP_CACHE_SIZE)
+def parse_timestamp(value: str) -> datetime:
+    """
+    Parse a stored creation time ("2023-01-01 10:00:00" or with microseconds).
+    Stored timestamps are shared by many rows and listed again and again, so each
+    distinct one is parsed once and kept.
+    """
+    return datetime.fromisoformat(value)
+
+
+def new_bulk_results(count: int) -> List[Dict]:
+    return [{"index": index, "id": None, "error": None} for index in range(count)]
@@ -0,0 +1,241 @@
+import bisect
+import re
+from collections import defaultdict
+from typing import Callable, Dict, Iterable, Iterator, List, Mapping, Optional, Set, Tuple
+
+from common.instrumentation import span
+
+_WORD = re.compile(r"\w+")
+
+# max number of words of a search query
+MAX_QUERY_TERMS = 8
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Lower case words of a text, the unit of the text indexes and of the search queries.
+    """
+    return _WORD.findall(text.casefold()) if text else []
+
+
+def query_terms(query: str) -> List[str]:
+    """
+    Distinct words of a search query, each matched as a prefix.
+    """
+    terms = list(dict.fromkeys(tokenize(query)))
+    if not terms:
+        raise ValueError("The search query has no words")
+    if len(terms) > MAX_QUERY_TERMS:
+        raise ValueError(f"The search query can have at most {MAX_QUERY_TERMS} words")
+    return terms
+
+
+def row_words(row: Mapping, fields: Tuple[str, ...]) -> Set[str]:
+    return set(tokenize(" ".join(value for value in map(row.get, fields) if isinstance(value, str))))
+
+
+def row_matches(row: Mapping, fields: Tuple[str, ...], terms: List[str]) -> bool:
+    """
+    Whether every query term is a prefix of a word of the row's text fields.
+    """
+    words = row_words(row, fields)
+    return all(term in words or any(word.startswith(term) for word in words) for term in terms)
+
+
+def _prefix_end(prefix: str) -> str:
+    # the smallest string after every string starting with prefix
+    return prefix[:-1] + chr(ord(prefix[-1]) + 1)
+
+
+class TextIndex:
+    """
+    Inverted index over the words of some text fields of a store, for prefix search.
+
+    Every word maps to the primary keys of the rows containing it, in an
+    append-only list, and the words are kept sorted, so the words starting with a
+    prefix are found by bisection.
+
+    The index is maintained by the entity cache like a HashIndex (rebuild, add,
+    remove), but it is only built on the first search after a reload, so stores
+    that are never searched do not pay for it. The entity cache builds it from a
+    copy of the rows without holding its lock (begin_build, collect, finish_build):
+    the rows changed meanwhile are indexed again when the postings are swapped in.
+    Postings are never removed: a row
+    whose words changed stays in the postings of its old words, and every
+    candidate is checked against the row itself before it is returned. The index
+    is rebuilt once the stale postings outnumber the live ones.
+    """
+
+    unique = False
+
+    # postings of a term collected into a set to filter the candidates of a multi word query
+    FILTER_MAX_POSTINGS = 100000
+
+    def __init__(self, name: str, fields: Tuple[str, ...]):
+        self.name = name
+        self.fields = fields
+        self.built = False
+        self.postings: Dict[str, List] = {}
+        self.words: List[str] = []
+        self.size = 0
+        self.stale = 0
+        # words of the rows being updated, between remove() and add()
+        self._previous: Dict = {}
+        # bumped by every rebuild, a build started before is not swapped in
+        self._epoch = 0
+        # keys of the rows changed since begin_build, None when no build is running
+        self._touched: Optional[Set] = None
+
+    def value_of(self, row: Mapping):
+        return tuple(row.get(field) for field in self.fields)
+
+    def covers(self, changes: Dict) -> bool:
+        return any(field in changes for field in self.fields)
+
+    def rebuild(self, rows: Iterable[Tuple]):
+        # built lazily by the next search
+        self.built = False
+        self.postings = {}
+        self.words = []
+        self._previous = {}
+        self._epoch += 1
+        self._touched = None
+
+    def state(self):
+        # not kept in snapshots, it is built by the first search anyway
+        return None
+
+    def restore(self, state):
+        self.rebuild(())
+
+    def build(self, rows: Iterable[Tuple]):
+        self._install(self.collect(rows))
+
+    def begin_build(self) -> int:
+        """
+        Start recording the rows changed until finish_build, for a build from a
+        copy of the rows made outside the lock of the store.
+
+        :return: the token to pass to finish_build
+        """
+        self._touched = set()
+        return self._epoch
+
+    def collect(self, rows: Iterable[Tuple]) -> Dict[str, List]:
+        """
+        Postings of the given rows, without changing the index.
+        """
+        postings = defaultdict(list)
+        fields = self.fields
+        with span(f"index.build.{self.name}"):
+            for pk, row in rows:
+                for word in row_words(row, fields):
+                    postings[word].append(pk)
+        return dict(postings)
+
+    def finish_build(self, token: int, postings: Dict[str, List], rows: Mapping) -> bool:
+        """
+        Swap in the postings collected since begin_build and index the rows changed
+        meanwhile again.
+
+        :return: whether the postings were used, they are not after a rebuild
+        """
+        if token != self._epoch or self._touched is None:
+            return False
+        touched, self._touched = self._touched, None
+        self._install(postings)
+        for pk in touched:
+            row = rows.get(pk)
+            if row is not None:
+                self.add(pk, row)
+        return True
+
+    def _install(self, postings: Dict[str, List]):
+        self.postings = postings
+        self.words = sorted(postings)
+        self.size = sum(map(len, postings.values()))
+        self.stale = 0
+        self._previous = {}
+        self.built = True
+
+    def add(self, pk, row: Mapping):
+        if not self.built:
+            if self._touched is not None:
+                self._touched.add(pk)
+            return
+        previous = self._previous.pop(pk, None)
+        words = row_words(row, self.fields)
+        if previous is not None:
+            self.stale += len(previous - words)
+            words -= previous
+        for word in words:
+            posting = self.postings.get(word)
+            if posting is None:
+                posting = self.postings[word] = []
+                bisect.insort(self.words, word)
+            posting.append(pk)
+            self.size += 1
+        if self.stale > self.size // 2:
+            self.built = False
+
+    def remove(self, pk, row: Mapping):
+        if self.built:
+            self._previous[pk] = row_words(row, self.fields)
+        elif self._touched is not None:
+            self._touched.add(pk)
+
+    def forget(self, pk):
+        """
+        Drop the words kept by remove() for a row that was deleted rather than updated.
+        """
+        self._previous.pop(pk, None)
+
+    def search(self, rows: Mapping, terms: List[str], limit: int,
+               accept: Optional[Callable[[Mapping], bool]] = None) -> List[Mapping]:
+        """
+        Rows matching every term, at most limit of them. The words matching the
+        rarest term are walked in order (the exact word first) and each candidate
+        row is checked against all the terms.
+
+        :param rows: the rows of the store by primary key
+        :param accept: optional extra filter of the rows
+        """
+        if not self.built:
+            self.build(rows.items())
+
+        ranges = []
+        for term in terms:
+            start = bisect.bisect_left(self.words, term)
+            end = bisect.bisect_left(self.words, _prefix_end(term), start)
+            count = sum(len(self.postings[word]) for word in self.words[start:end])
+            if count == 0:
+                return []
+            ranges.append((count, start, end))
+        ranges.sort()
+        _, start, end = ranges[0]
+        # the keys matching the other terms, when they are few enough to collect
+        filters = [set(self._candidates(other_start, other_end))
+                   for count, other_start, other_end in ranges[1:] if count <= self.FILTER_MAX_POSTINGS]
+
+        results = []
+        seen = set()
+        for pk in self._candidates(start, end):
+            if pk in seen or not all(pk in keys for keys in filters):
+                continue
+            seen.add(pk)
+            row = rows.get(pk)
+            if row is None or not row_matches(row, self.fields, terms):
+                continue
+            if accept is not None and not accept(row):
+                continue
+            results.append(row)
+            if len(results) >= limit:
+                break
+        return results
+
+    def _candidates(self, start: int, end: int) -> Iterator[int]:
+        for word in self.words[start:end]:
+            yield from self.postings[word]
+
+    def stats(self) -> Dict:
+        return {"built": self.built, "words": len(self.words), "postings": self.size, "stale": self.stale}
@@ -0,0 +1,127 @@
+import argparse
+import os
+import pickle
+import threading
+import time
+from typing import Dict, Optional
+
+from common import config
+from common.instrumentation import record_bytes, span
+
+# bumped whenever the content of the snapshot files changes
+SNAPSHOT_FORMAT = 2
+
+
+def snapshot_path(name: str) -> str:
+    return os.path.join(config.SNAPSHOT_DIR, f"{name}.snapshot")
+
+
+def write_snapshot(path: str, header: Dict, body: Dict):
+    """
+    Write a snapshot file: a small pickled header describing the data (store,
+    engine signature, record layout, indexes), followed by the pickled body.
+    """
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    with span(f"snapshot.write.{header['store']}"):
+        with open(temp_path, 'wb') as f:
+            pickle.dump({**header, "format": SNAPSHOT_FORMAT}, f, protocol=pickle.HIGHEST_PROTOCOL)
+            pickle.dump(body, f, protocol=pickle.HIGHEST_PROTOCOL)
+            size = f.tell()
+        os.replace(temp_path, path)
+    record_bytes(header["store"], written=size)
+
+
+def read_snapshot(path: str, header: Dict) -> Optional[Dict]:
+    """
+    The body of the snapshot file when its header matches the given one, None
+    when there is no snapshot or it was taken from other data.
+    """
+    try:
+        f = open(path, 'rb')
+    except FileNotFoundError:
+        return None
+
+    with f, span(f"snapshot.read.{header['store']}"):
+        try:
+            if pickle.load(f) != {**header, "format": SNAPSHOT_FORMAT}:
+                return None
+            body = pickle.load(f)
+        except Exception:
+            # a damaged snapshot is ignored, the store is loaded from the engine
+            return None
+        record_bytes(header["store"], read=f.tell())
+    return body
+
+
+def encode_state(state) -> Optional[bytes]:
+    # index states are unpickled when the index is first used
+    return None if state is None else pickle.dumps(state, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def decode_state(blob: bytes):
+    return pickle.loads(blob)
+
+
+class Snapshotter:
+    """
+    Background thread writing the snapshot of every loaded entity cache whose
+    data changed since its last snapshot, every `interval` seconds.
+    """
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self._caches = []
+        self._lock = threading.Lock()
+        self._thread = None
+        self.written = 0
+
+    def watch(self, cache):
+        if self.interval <= 0:
+            return
+        with self._lock:
+            if cache not in self._caches:
+                self._caches.append(cache)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="snapshots", daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            with self._lock:
+                caches = list(self._caches)
+            for cache in caches:
+                try:
+                    if cache.save_snapshot():
+                        self.written += 1
+                except OSError:
+                    # try again on the next round
+                    pass
+
+
+snapshotter = Snapshotter(config.SNAPSHOT_INTERVAL)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Load every store, build its indexes and write its snapshot, so that the next workers "
+                    "started on this data load it from the snapshot.")
+    parser.add_argument("stores", nargs="*", help="stores to snapshot (default: all)")
+    args = parser.parse_args()
+
+    from common.storage import STORES, get_storage
+
+    for name in args.stores or STORES:
+        storage = get_storage(name)
+        if not hasattr(storage, "save_snapshot"):
+            print(f"{name}: not cached, no snapshot")
+            continue
+        began = time.perf_counter()
+        storage.build_indexes()
+        storage.save_snapshot()
+        print(f"{name}: {snapshot_path(name)} written in {time.perf_counter() - began:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
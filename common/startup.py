@@ -0,0 +1,61 @@
+import gc
+import threading
+import time
+from typing import Dict, List
+
+from common import config
+from common.storage import STORES, get_storage
+
+
+class Startup:
+    """
+    Time to ready of the worker, measured from the import of the app.
+
+    With FACTWISE_PRELOAD the listed stores ("all" for every store) are loaded in
+    a background thread once the app starts, from their snapshot when it is
+    current, and the worker is ready when they are loaded. Without it the worker
+    is ready as soon as it starts and each store is loaded by the first request
+    using it. Indexes are built by their first use either way.
+    """
+
+    def __init__(self, preload: List[str]):
+        self.began = time.perf_counter()
+        self.preload = list(STORES) if "all" in preload else preload
+        self.ready_s = None
+        self.stores: Dict[str, Dict] = {}
+        self.error = None
+
+    @property
+    def ready(self) -> bool:
+        return self.ready_s is not None
+
+    def start(self):
+        if not self.preload:
+            self._ready()
+            return
+        threading.Thread(target=self._warm_up, name="preload", daemon=True).start()
+
+    def _warm_up(self):
+        try:
+            for name in self.preload:
+                began = time.perf_counter()
+                loaded = get_storage(name).preload()
+                self.stores[name] = {**loaded, "ms": round((time.perf_counter() - began) * 1000, 1)}
+        except Exception as e:
+            # the stores are loaded by the requests instead
+            self.error = f"{type(e).__name__}: {e}"
+        # the preloaded rows live as long as the worker: after one last collection they are moved out
+        # of the collector's generations, so the following full collections do not scan them again
+        gc.collect()
+        gc.freeze()
+        self._ready()
+
+    def _ready(self):
+        self.ready_s = round(time.perf_counter() - self.began, 3)
+
+    def stats(self) -> Dict:
+        return {"ready": self.ready, "time_to_ready_s": self.ready_s, "preload": self.preload,
+                "stores": self.stores, "error": self.error}
+
+
+startup = Startup(config.PRELOAD)
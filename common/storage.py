@@ -0,0 +1,816 @@
+import json
+import operator
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Callable, Dict, Iterator, List, Optional, Tuple, Union
+
+from common import codec, config
+from common.indexes import CountIndex, HashIndex, SortedIndex
+from common.search import TextIndex, row_matches
+from common.instrumentation import record_bytes, span
+from common.locking import FileLock
+from common.records import time_value
+
+# name of the store -> (json file name, primary key fields)
+STORES = {
+    "users": ("users.json", ("id",)),
+    "teams": ("team.json", ("id",)),
+    "boards": ("board.json", ("id",)),
+    "tasks": ("task.json", ("id",)),
+    "user_team_linking": ("user_team_linking.json", ("user_id", "team_id")),
+}
+
+# name of the store -> [(index name, indexed fields, unique)]
+INDEXES = {
+    "users": [("name", ("name",), True)],
+    "teams": [("name", ("name",), True)],
+    "boards": [("team_name", ("team_id", "name"), True), ("team_id", ("team_id",), False)],
+    "tasks": [
+        ("board_title", ("board_id", "title"), True),
+        ("board_id", ("board_id",), False),
+        ("user_id", ("user_id",), False),
+        ("task_status", ("task_status",), False),
+    ],
+    # adjacency in both directions: team -> linked users, user -> linked teams
+    "user_team_linking": [("team_id", ("team_id",), False), ("user_id", ("user_id",), False)],
+}
+
+# name of the store -> [(sorted index name, indexed fields, sort key of a row)], see SortedIndex
+SORTED_INDEXES = {
+    "tasks": [("creation_time", ("creation_time",), time_value)],
+}
+
+def _team_of_board(board_id: int) -> Optional[int]:
+    board = get_storage("boards").get(board_id)
+    return None if board is None else board["team_id"]
+
+
+# name of the store -> [(count index name, grouping fields, counted field[, (row field, mapping to the grouping
+# value)])], the running counts behind count_by, see CountIndex
+COUNT_INDEXES = {
+    "tasks": [
+        ("status_by_board", ("board_id",), "task_status"),
+        ("status_by_user", ("user_id",), "task_status"),
+        ("user_by_board", ("board_id",), "user_id"),
+        ("status_by_team", ("team_id",), "task_status", ("board_id", _team_of_board)),
+        ("user_by_team", ("team_id",), "user_id", ("board_id", _team_of_board)),
+    ],
+    "boards": [("status_by_team", ("team_id",), "board_status")],
+}
+
+# name of the store -> [(text index name, indexed text fields)], see common/search.py
+TEXT_INDEXES = {
+    "users": [("text", ("name", "display_name"))],
+    "teams": [("text", ("name",))],
+    "tasks": [("text", ("title", "description"))],
+}
+
+
+class StorageEngine:
+    """
+    Interface implemented by every persistence backend.
+
+    Rows are plain dicts addressed by their primary key. The key is the value of
+    the single key field (e.g. the id) or a tuple of values for composite keys.
+
+    Read-check-write sequences must run inside transaction(), which holds an
+    exclusive lock shared with every other process using the same store.
+    """
+
+    # whether get_storage puts the shared entity cache in front of the engine
+    cacheable = True
+
+    def __init__(self, name: str, key_fields: Tuple[str, ...] = ("id",), lock_path: str = None):
+        self.name = name
+        self.key_fields = key_fields
+        self.indexes: Dict[str, HashIndex] = {}
+        self.lock = FileLock(lock_path)
+
+    def key_of(self, row: Dict):
+        if len(self.key_fields) == 1:
+            return row[self.key_fields[0]]
+        return tuple(row[field] for field in self.key_fields)
+
+    def signature(self):
+        """
+        A value that changes whenever the stored data changes, None when unknown.
+        """
+        return None
+
+    def transaction(self):
+        """
+        Context manager holding the exclusive lock of the store.
+        """
+        return self.lock
+
+    def next_id(self) -> int:
+        """
+        Allocate a new id, larger than any id handed out before.
+        """
+        return self.next_ids(1)[0]
+
+    def next_ids(self, count: int) -> List[int]:
+        """
+        Allocate a block of consecutive new ids in one step.
+        """
+        raise NotImplementedError
+
+    def load(self) -> List[Dict]:
+        raise NotImplementedError
+
+    def get(self, key) -> Optional[Dict]:
+        raise NotImplementedError
+
+    def insert(self, row: Dict):
+        raise NotImplementedError
+
+    def update(self, key, changes: Dict) -> Dict:
+        raise NotImplementedError
+
+    def delete(self, key):
+        raise NotImplementedError
+
+    def insert_many(self, rows: List[Dict]):
+        for row in rows:
+            self.insert(row)
+
+    def update_many(self, updates: List[Tuple]):
+        """
+        Apply several (key, changes) updates in one write.
+        """
+        for key, changes in updates:
+            self.update(key, changes)
+
+    def delete_many(self, keys: List):
+        for key in keys:
+            self.delete(key)
+
+    def write_many(self, inserts: List[Dict], deletes: List):
+        """
+        Delete rows by key and insert new rows in one write.
+        """
+        if deletes:
+            self.delete_many(deletes)
+        if inserts:
+            self.insert_many(inserts)
+
+    def scan(self, predicate: Callable[[Dict], bool] = None) -> Iterator[Dict]:
+        for row in self.load():
+            if predicate is None or predicate(row):
+                yield row
+
+    def scan_after(self, after=None) -> Iterator[Dict]:
+        """
+        Rows in primary key order, starting after the given key (keyset pagination).
+        """
+        for row in sorted(self.load(), key=self.key_of):
+            if after is None or self.key_of(row) > after:
+                yield row
+
+    def add_index(self, name: str, fields: Tuple[str, ...], unique: bool = True):
+        self.indexes[name] = HashIndex(name, fields, unique)
+
+    def add_sorted_index(self, name: str, fields: Tuple[str, ...], key: Callable[[Dict], object]):
+        self.indexes[name] = SortedIndex(name, fields, key)
+
+    def add_text_index(self, name: str, fields: Tuple[str, ...]):
+        self.indexes[name] = TextIndex(name, fields)
+
+    def add_count_index(self, name: str, fields: Tuple[str, ...], counted: str,
+                        through: Optional[Tuple[str, Callable]] = None):
+        self.indexes[name] = CountIndex(name, fields, counted, through)
+
+    def search(self, index_name: str, terms: List[str], limit: int,
+               accept: Callable[[Dict], bool] = None) -> List[Dict]:
+        """
+        Rows whose text fields have a word starting with each of the terms, at most limit of them.
+        Engines without in-memory indexes answer this with a scan.
+        """
+        fields = self.indexes[index_name].fields
+        results = []
+        for row in self.scan(lambda row: row_matches(row, fields, terms) and (accept is None or accept(row))):
+            results.append(row)
+            if len(results) >= limit:
+                break
+        return results
+
+    def count_by(self, field: str, where: Tuple[str, object] = None) -> Dict:
+        """
+        Number of rows per value of a field, only counting the rows whose where[0]
+        field equals where[1] when given. A field the rows do not hold is read
+        through the count index grouping by it (e.g. the team of a task).
+        """
+        predicate = None
+        if where is not None:
+            value_of = operator.itemgetter(where[0])
+            for index in self.indexes.values():
+                if isinstance(index, CountIndex) and index.fields == (where[0],):
+                    value_of = index.value_of
+            predicate = lambda row: value_of(row) == where[1]
+
+        counts = {}
+        for row in self.scan(predicate):
+            counts[row[field]] = counts.get(row[field], 0) + 1
+        return counts
+
+    def verify_counts(self) -> List[Dict]:
+        """
+        Recount the running counts kept for count_by from the stored rows, replace
+        them with the recount and return the counts that differed.
+        Engines without running counts count with a scan, there is nothing to verify.
+        """
+        return []
+
+    def preload(self) -> Dict:
+        """
+        Load what the engine keeps in memory before the first request needs it.
+        Engines reading the store on every call have nothing to load.
+
+        :return: what was loaded, for the readiness report
+        """
+        return {}
+
+    def find(self, index_name: str, value) -> Optional[Dict]:
+        """
+        The first row whose indexed fields match the value, None if there is none.
+        """
+        rows = self.find_all(index_name, value)
+        return rows[0] if rows else None
+
+    def find_all(self, index_name: str, value) -> List[Dict]:
+        """
+        All rows whose indexed fields match the value.
+        Engines without in-memory indexes answer this with a scan.
+        """
+        index = self.indexes[index_name]
+        return list(self.scan(lambda row: index.value_of(row) == value))
+
+    def find_after(self, index_name: str, value, after=None, limit: int = None) -> List[Dict]:
+        """
+        Rows whose indexed fields match the value in primary key order, starting after
+        the given key (keyset pagination), at most limit of them.
+        Engines without in-memory indexes answer this with a scan and a sort.
+        """
+        rows = sorted(self.find_all(index_name, value), key=self.key_of)
+        if after is not None:
+            rows = [row for row in rows if self.key_of(row) > after]
+        return rows if limit is None else rows[:limit]
+
+    def count_all(self, index_name: str, value) -> int:
+        """
+        Number of rows whose indexed fields match the value.
+        """
+        return len(self.find_all(index_name, value))
+
+    def find_range(self, index_name: str, low=None, high=None, reverse: bool = False,
+                   after: Tuple = None) -> Iterator[Dict]:
+        """
+        Rows of a sorted index whose key is strictly between low and high, ordered by
+        (key, primary key), descending when reverse is set.
+        Engines without in-memory indexes answer this with a scan and a sort.
+
+        :param after: (key, primary key) of the last row received, to continue from it
+        """
+        sort_key = self.indexes[index_name].value_of
+        entries = []
+        for row in self.scan():
+            value = sort_key(row)
+            if value is None or (low is not None and value <= low) or (high is not None and value >= high):
+                continue
+            entries.append(((value, self.key_of(row)), row))
+        entries.sort(key=lambda entry: entry[0], reverse=reverse)
+        for position, row in entries:
+            if after is None or (position < after if reverse else position > after):
+                yield row
+
+    def count_range(self, index_name: str, low=None, high=None) -> int:
+        """
+        Number of rows of a sorted index whose key is strictly between low and high.
+        """
+        return sum(1 for _ in self.find_range(index_name, low, high))
+
+
+class JsonFileStorage(StorageEngine):
+    """
+    Stores all rows of an entity as one json list in a file under the db folder.
+
+    In "rewrite" mode every mutation rewrites the whole file.
+    In "append" mode the file is a snapshot and every mutation is appended as one
+    json line to a log file next to it (<file>.log). Loading replays the log on top
+    of the snapshot and a background compactor periodically folds the log back into
+    the snapshot. The fsync policy ("always", "interval" or "never") decides when
+    appended records are forced to disk.
+
+    Snapshots are always written to a temporary file and atomically renamed, so a
+    crash never leaves a truncated data file behind.
+    """
+
+    def __init__(self, name: str, file_path: str, key_fields: Tuple[str, ...] = ("id",),
+                 mode: str = "rewrite", fsync: str = "interval"):
+        super().__init__(name, key_fields, lock_path=file_path + ".lock")
+        self.file_path = file_path
+        self.log_path = file_path + ".log"
+        self.sequence_path = file_path + ".seq"
+        self.mode = mode
+        self.fsync = fsync
+        self._log_file = None
+        self._last_fsync = 0.0
+        self._pending_fsync = False
+        self._lock = threading.RLock()
+        self._compactor = None
+        self._flusher = None
+
+    def signature(self):
+        paths = [self.file_path, self.log_path] if self.mode == "append" else [self.file_path]
+        signature = []
+        for path in paths:
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                signature.append(None)
+                continue
+            signature.append((stat.st_ino, stat.st_mtime_ns, stat.st_size))
+        if signature[0] is None and len(signature) == 1:
+            return None
+        return tuple(signature)
+
+    def _read(self) -> List[Dict]:
+        data = []
+        if not os.path.exists(self.file_path):
+            return data
+
+        size = 0
+        with span(f"storage.read.{self.name}"), open(self.file_path, 'rb') as f:
+            for line in f:
+                size += len(line)
+                if line.strip():
+                    data.extend(codec.loads(line))
+        record_bytes(self.name, read=size)
+        return data
+
+    def _write(self, data: List[Dict]):
+        self._replace_file(self.file_path, codec.dumps(data))
+
+    def _replace_file(self, path: str, content: Union[str, bytes]):
+        temp_path = path + ".tmp"
+        with span(f"storage.write.{self.name}"):
+            with open(temp_path, 'wb' if isinstance(content, bytes) else 'w') as f:
+                f.write(content)
+                if self.fsync != "never":
+                    f.flush()
+                    os.fsync(f.fileno())
+            os.replace(temp_path, path)
+        record_bytes(self.name, written=len(content))
+
+    def next_ids(self, count: int) -> List[int]:
+        with self.transaction():
+            if os.path.exists(self.sequence_path):
+                with open(self.sequence_path, 'r') as f:
+                    last_id = int(f.read() or 0)
+            else:
+                # first allocation, continue after the ids already stored
+                last_id = max((row["id"] for row in self.load()), default=0)
+
+            self._replace_file(self.sequence_path, str(last_id + count))
+            return list(range(last_id + 1, last_id + count + 1))
+
+    def _decode_key(self, key):
+        return tuple(key) if isinstance(key, list) else key
+
+    def _replay(self, data: List[Dict]) -> List[Dict]:
+        if not os.path.exists(self.log_path):
+            return data
+
+        rows = {self.key_of(row): row for row in data}
+        size = 0
+        with span(f"storage.replay.{self.name}"), open(self.log_path, 'rb') as f:
+            for line in f:
+                size += len(line)
+                if not line.endswith(b"\n"):
+                    # a torn last record from a crash mid-append, cut by the next append
+                    break
+                try:
+                    self._apply(rows, codec.loads(line))
+                except (ValueError, KeyError, TypeError, AttributeError):
+                    # a damaged record, the records after it are still applied
+                    continue
+        record_bytes(self.name, read=size)
+        return list(rows.values())
+
+    def _apply(self, rows: Dict, record: Dict):
+        if record["op"] == "insert":
+            rows[self.key_of(record["row"])] = record["row"]
+        elif record["op"] == "update":
+            row = rows.get(self._decode_key(record["key"]))
+            if row is not None:
+                row.update(record["changes"])
+        elif record["op"] == "delete":
+            rows.pop(self._decode_key(record["key"]), None)
+
+    def _append(self, records: List[Dict]):
+        content = b"".join(codec.dumps(record) + b"\n" for record in records)
+        with self.transaction(), self._lock, span(f"storage.append.{self.name}"):
+            if self._log_file is None:
+                # also opened for reading, to find the end of the last complete record
+                self._log_file = open(self.log_path, 'a+b')
+                self._start_compactor()
+                self._start_flusher()
+
+            self._cut_torn_record()
+            self._log_file.write(content)
+            self._log_file.flush()
+            record_bytes(self.name, written=len(content))
+
+            now = time.monotonic()
+            if self.fsync == "always" or (self.fsync == "interval" and now - self._last_fsync >= config.FSYNC_INTERVAL):
+                os.fsync(self._log_file.fileno())
+                self._last_fsync = now
+                self._pending_fsync = False
+            else:
+                self._pending_fsync = self.fsync == "interval"
+
+    def _cut_torn_record(self):
+        # a writer that crashed mid-append leaves a torn last line, the next record
+        # would be appended to it and lost: cut the log back to its last newline
+        f = self._log_file
+        size = os.fstat(f.fileno()).st_size
+        if size == 0:
+            return
+        f.seek(size - 1)
+        if f.read(1) == b"\n":
+            return
+
+        end = size
+        while end > 0:
+            start = max(end - 65536, 0)
+            f.seek(start)
+            newline = f.read(end - start).rfind(b"\n")
+            if newline >= 0:
+                end = start + newline + 1
+                break
+            end = start
+        f.truncate(end)
+
+    def _start_compactor(self):
+        if config.COMPACT_INTERVAL <= 0 or self._compactor is not None:
+            return
+
+        self._compactor = threading.Thread(target=self._compact_periodically, name=f"compact-{self.name}", daemon=True)
+        self._compactor.start()
+
+    def _compact_periodically(self):
+        while True:
+            time.sleep(config.COMPACT_INTERVAL)
+            try:
+                if os.path.exists(self.log_path) and os.path.getsize(self.log_path) >= config.COMPACT_MIN_BYTES:
+                    self.compact()
+            except OSError:
+                # try again on the next round
+                pass
+
+    def _start_flusher(self):
+        if self.fsync != "interval" or self._flusher is not None:
+            return
+
+        self._flusher = threading.Thread(target=self._flush_periodically, name=f"fsync-{self.name}", daemon=True)
+        self._flusher.start()
+
+    def _flush_periodically(self):
+        # appends made since the last fsync are forced to disk at most FSYNC_INTERVAL seconds later
+        while True:
+            time.sleep(config.FSYNC_INTERVAL)
+            try:
+                with self._lock:
+                    if self._pending_fsync:
+                        os.fsync(self._log_file.fileno())
+                        self._last_fsync = time.monotonic()
+                        self._pending_fsync = False
+            except OSError:
+                # try again on the next round
+                pass
+
+    def compact(self):
+        """
+        Fold the append log into the snapshot and truncate the log.
+        """
+        with self.transaction(), self._lock:
+            self._write(self._replay(self._read()))
+            if self._log_file is not None:
+                self._log_file.truncate(0)
+            elif os.path.exists(self.log_path):
+                open(self.log_path, 'w').close()
+
+    def load(self) -> List[Dict]:
+        if self.mode == "append":
+            # the snapshot and the log are read under the store lock, so that a compaction
+            # by another process cannot replace the one and truncate the other in between
+            with self.transaction(), self._lock:
+                return self._replay(self._read())
+        return self._read()
+
+    def get(self, key) -> Optional[Dict]:
+        for row in self.load():
+            if self.key_of(row) == key:
+                return row
+        return None
+
+    def insert(self, row: Dict):
+        self.insert_many([row])
+
+    def update(self, key, changes: Dict) -> Dict:
+        if self.mode == "append":
+            # the row is validated by the caller, the log only records the change
+            self._append([{"op": "update", "key": key, "changes": changes}])
+            return changes
+
+        with self.transaction():
+            data = self._read()
+            for row in data:
+                if self.key_of(row) == key:
+                    row.update(changes)
+                    self._write(data)
+                    return row
+        raise ValueError(f"{self.name} row {key} not found")
+
+    def update_many(self, updates: List[Tuple]):
+        if self.mode == "append":
+            self._append([{"op": "update", "key": key, "changes": changes} for key, changes in updates])
+            return
+
+        with self.transaction():
+            data = self._read()
+            rows = {self.key_of(row): row for row in data}
+            for key, changes in updates:
+                if key not in rows:
+                    raise ValueError(f"{self.name} row {key} not found")
+                rows[key].update(changes)
+            self._write(data)
+
+    def delete(self, key):
+        self.delete_many([key])
+
+    def insert_many(self, rows: List[Dict]):
+        if self.mode == "append":
+            self._append([{"op": "insert", "row": row} for row in rows])
+            return
+
+        with self.transaction():
+            data = self._read()
+            data.extend(rows)
+            self._write(data)
+
+    def delete_many(self, keys: List):
+        if self.mode == "append":
+            self._append([{"op": "delete", "key": key} for key in keys])
+            return
+
+        keys = set(keys)
+        with self.transaction():
+            data = self._read()
+            remaining = [row for row in data if self.key_of(row) not in keys]
+            if len(remaining) != len(data):
+                self._write(remaining)
+
+    def write_many(self, inserts: List[Dict], deletes: List):
+        if self.mode == "append":
+            self._append([{"op": "delete", "key": key} for key in deletes] +
+                         [{"op": "insert", "row": row} for row in inserts])
+            return
+
+        keys = set(deletes)
+        with self.transaction():
+            data = [row for row in self._read() if self.key_of(row) not in keys]
+            data.extend(inserts)
+            self._write(data)
+
+
+class SQLiteStorage(StorageEngine):
+    """
+    Stores the rows of an entity in a table of an embedded sqlite database.
+    The primary key is indexed so single row reads and writes are O(log n).
+    """
+
+    def __init__(self, name: str, db_path: str, key_fields: Tuple[str, ...] = ("id",)):
+        super().__init__(name, key_fields, lock_path=f"{db_path}.{name}.lock")
+        self.db_path = db_path
+        self.table = name
+        self._local = threading.local()
+        self._execute(
+            f'CREATE TABLE IF NOT EXISTS "{self.table}" (pk TEXT PRIMARY KEY, data TEXT NOT NULL)'
+        )
+        self._execute('CREATE TABLE IF NOT EXISTS store_versions (name TEXT PRIMARY KEY, version INTEGER NOT NULL)')
+        self._execute('INSERT OR IGNORE INTO store_versions (name, version) VALUES (?, 0)', (self.table,))
+        self._execute('CREATE TABLE IF NOT EXISTS store_sequences (name TEXT PRIMARY KEY, value INTEGER NOT NULL)')
+        # random identity of the database, so that a recreated database never repeats a signature
+        self._execute('CREATE TABLE IF NOT EXISTS store_meta (name TEXT PRIMARY KEY, value TEXT NOT NULL)')
+        self._execute("INSERT OR IGNORE INTO store_meta (name, value) VALUES ('database_id', ?)", (uuid.uuid4().hex,))
+
+    @property
+    def connection(self) -> sqlite3.Connection:
+        # sqlite connections cannot be shared between threads
+        conn = getattr(self._local, "connection", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = conn
+        return conn
+
+    def _execute(self, sql: str, params: tuple = ()):
+        return self.connection.execute(sql, params)
+
+    def _write(self, sql: str, params_list: List[tuple]):
+        self._write_all([(sql, params_list)])
+
+    def _write_all(self, statements: List[Tuple[str, List[tuple]]]):
+        # every mutation bumps the table version in the same transaction
+        conn = self.connection
+        with span(f"storage.write.{self.name}"):
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                for sql, params_list in statements:
+                    conn.executemany(sql, params_list)
+                conn.execute('UPDATE store_versions SET version = version + 1 WHERE name = ?', (self.table,))
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+        record_bytes(self.name, written=sum(len(value) for _, params_list in statements
+                                            for params in params_list for value in params))
+
+    def next_ids(self, count: int) -> List[int]:
+        conn = self.connection
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute('SELECT value FROM store_sequences WHERE name = ?', (self.table,)).fetchone()
+            if row is None:
+                # the first allocation continues after the ids already stored
+                row = conn.execute(f'SELECT COALESCE(MAX(CAST(pk AS INTEGER)), 0) FROM "{self.table}"').fetchone()
+                conn.execute('INSERT INTO store_sequences (name, value) VALUES (?, ?)', (self.table, row[0]))
+            value = row[0] + count
+            conn.execute('UPDATE store_sequences SET value = ? WHERE name = ?', (value, self.table))
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+        return list(range(value - count + 1, value + 1))
+
+    def signature(self):
+        row = self._execute(
+            "SELECT (SELECT value FROM store_meta WHERE name = 'database_id'), version "
+            "FROM store_versions WHERE name = ?", (self.table,)).fetchone()
+        return tuple(row) if row else None
+
+    @staticmethod
+    def _encode_key(key) -> str:
+        # stays on the stdlib encoder, the stored keys must not depend on the codec
+        return json.dumps(list(key) if isinstance(key, tuple) else key)
+
+    def load(self) -> List[Dict]:
+        with span(f"storage.read.{self.name}"):
+            return list(self.scan())
+
+    def get(self, key) -> Optional[Dict]:
+        row = self._execute(
+            f'SELECT data FROM "{self.table}" WHERE pk = ?', (self._encode_key(key),)
+        ).fetchone()
+        if row is None:
+            return None
+        record_bytes(self.name, read=len(row[0]))
+        return codec.loads(row[0])
+
+    def insert(self, row: Dict):
+        self.insert_many([row])
+
+    def insert_many(self, rows: List[Dict]):
+        try:
+            self._write(
+                f'INSERT INTO "{self.table}" (pk, data) VALUES (?, ?)',
+                [(self._encode_key(self.key_of(row)), codec.dumps_str(row)) for row in rows]
+            )
+        except sqlite3.IntegrityError:
+            raise ValueError(f"{self.name} row already exists")
+
+    def update(self, key, changes: Dict) -> Dict:
+        row = self.get(key)
+        if row is None:
+            raise ValueError(f"{self.name} row {key} not found")
+
+        row.update(changes)
+        self._write(
+            f'UPDATE "{self.table}" SET data = ? WHERE pk = ?',
+            [(codec.dumps_str(row), self._encode_key(key))]
+        )
+        return row
+
+    def update_many(self, updates: List[Tuple]):
+        rows = {}
+        for key, changes in updates:
+            row = rows.get(key) or self.get(key)
+            if row is None:
+                raise ValueError(f"{self.name} row {key} not found")
+            row.update(changes)
+            rows[key] = row
+
+        self._write(
+            f'UPDATE "{self.table}" SET data = ? WHERE pk = ?',
+            [(codec.dumps_str(row), self._encode_key(key)) for key, row in rows.items()]
+        )
+
+    def delete(self, key):
+        self.delete_many([key])
+
+    def delete_many(self, keys: List):
+        self._write(f'DELETE FROM "{self.table}" WHERE pk = ?', [(self._encode_key(key),) for key in keys])
+
+    def write_many(self, inserts: List[Dict], deletes: List):
+        try:
+            self._write_all([
+                (f'DELETE FROM "{self.table}" WHERE pk = ?', [(self._encode_key(key),) for key in deletes]),
+                (f'INSERT INTO "{self.table}" (pk, data) VALUES (?, ?)',
+                 [(self._encode_key(self.key_of(row)), codec.dumps_str(row)) for row in inserts]),
+            ])
+        except sqlite3.IntegrityError:
+            raise ValueError(f"{self.name} row already exists")
+
+    def scan(self, predicate: Callable[[Dict], bool] = None) -> Iterator[Dict]:
+        for (data,) in self._execute(f'SELECT data FROM "{self.table}" ORDER BY rowid'):
+            record_bytes(self.name, read=len(data))
+            row = codec.loads(data)
+            if predicate is None or predicate(row):
+                yield row
+
+
+_storages: Dict[str, StorageEngine] = {}
+_storages_lock = threading.Lock()
+
+
+def create_storage(name: str, backend: str = None) -> StorageEngine:
+    """
+    Build a new storage engine for the given store using the configured backend.
+    """
+    backend = backend or config.STORAGE_BACKEND
+
+    if name == "tasks" and config.TASK_FORMAT == "columnar":
+        return _create_columnar_storage(name, backend)
+    return _create_row_storage(name, backend)
+
+
+def _create_row_storage(name: str, backend: str) -> StorageEngine:
+    file_name, key_fields = STORES[name]
+
+    if backend == "json":
+        return JsonFileStorage(name, os.path.join(config.DB_DIR, file_name), key_fields,
+                               mode=config.JSON_MODE, fsync=config.FSYNC_POLICY)
+    if backend == "sqlite":
+        return SQLiteStorage(name, config.SQLITE_PATH, key_fields)
+
+    raise ValueError(f"Unknown storage backend {backend}")
+
+
+def _create_columnar_storage(name: str, backend: str) -> StorageEngine:
+    from common.columnar import ColumnarTaskStorage
+
+    file_name, key_fields = STORES[name]
+    storage = ColumnarTaskStorage(name, os.path.join(config.DB_DIR, os.path.splitext(file_name)[0] + ".columns"),
+                                  key_fields, fsync=config.FSYNC_POLICY)
+    with storage.transaction():
+        if storage.signature() is None:
+            # first use, convert the rows kept by the configured backend
+            rows = _create_row_storage(name, backend).load()
+            if rows:
+                storage.import_rows(rows)
+    return storage
+
+
+def get_storage(name: str) -> StorageEngine:
+    """
+    Return the storage engine shared by all controllers for the given store.
+    """
+    from common.cache import EntityCache
+
+    with _storages_lock:
+        if name not in _storages:
+            storage = create_storage(name)
+            if config.CACHE_ENABLED and storage.cacheable:
+                storage = EntityCache(storage)
+            for index_name, fields, unique in INDEXES.get(name, []):
+                storage.add_index(index_name, fields, unique)
+            for index_name, fields, key in SORTED_INDEXES.get(name, []):
+                storage.add_sorted_index(index_name, fields, key)
+            for index_name, fields in TEXT_INDEXES.get(name, []):
+                storage.add_text_index(index_name, fields)
+            for index_name, fields, counted, *through in COUNT_INDEXES.get(name, []):
+                storage.add_count_index(index_name, fields, counted, *through)
+            _storages[name] = storage
+        return _storages[name]
+
+
+def get_cache_stats() -> Dict[str, Dict]:
+    """
+    Hit/miss counters of the shared entity caches, keyed by store name.
+    """
+    return {name: storage.stats() for name, storage in _storages.items() if hasattr(storage, "stats")}
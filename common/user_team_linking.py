@@ -1,11 +1,11 @@
-import json
-import os
-from datetime import datetime
-from typing import Dict, List
 
 from pydantic import BaseModel
 from pydantic import PositiveInt
 
+from common.change_feed import change_feed
+from common.schema import parse_timestamp
+from common.storage import get_storage
+
 
 class UserTeamLinking(BaseModel):
     user_id: PositiveInt
@@ -14,80 +14,114 @@ class UserTeamLinking(BaseModel):
 
 class UserTeamLinkingBase:
     def __init__(self):
-        self.user_file_path = os.path.join("db", 'users.json')
-        self.team_file_path = os.path.join("db", 'team.json')
-        self.linking_file_path = os.path.join("db", 'user_team_linking.json')
-
-    def read_file(self, file_path: str):
-        data = []
-
-        for line in open(file_path, 'r'):
-            data.extend(json.loads(line))
-
-        return data
-
-    def write_file(self, file_path: str, data: List[Dict]):
-        with open(file_path, 'w') as f:
-            json.dump(data, f)
+        self.user_storage = get_storage("users")
+        self.team_storage = get_storage("teams")
+        self.linking_storage = get_storage("user_team_linking")
 
     def add_users_to_team(self, team_id, users):
-        linking_data = self.read_file(self.linking_file_path)
-        user_data = self.read_file(self.user_file_path)
-
-        user_list = {}
-        for item in user_data:
-            user_list[item["id"]] = item["id"]
-
         for user in users:
-            if user not in user_list:
+            if self.user_storage.get(user) is None:
                 raise ValueError(f"User with id = {user} not found")
 
-            user_team_linking = UserTeamLinking(user_id=user, team_id=team_id)
-            if user_team_linking.dict() not in linking_data:
-                linking_data.append(user_team_linking.dict())
+        with self.linking_storage.transaction():
+            new_links = []
+            for user in dict.fromkeys(users):
+                user_team_linking = UserTeamLinking(user_id=user, team_id=team_id)
+                if self.linking_storage.get((user, team_id)) is None:
+                    new_links.append(user_team_linking.dict())
 
-        self.write_file(self.linking_file_path, linking_data)
+            if new_links:
+                self.linking_storage.insert_many(new_links)
+                # published under the store lock, so the sequence follows the order of the writes
+                change_feed.publish([("team.users_added",
+                                      {"team_id": team_id, "user_ids": [link["user_id"] for link in new_links]})])
 
     def remove_users_from_team(self, team_id, users_to_remove):
-        linking_data = self.read_file(self.linking_file_path)
-        for user in users_to_remove:
-            user_team_linking = UserTeamLinking(user_id=user, team_id=team_id)
-            if user_team_linking.dict() in linking_data:
-                linking_data.remove(user_team_linking.dict())
-        self.write_file(self.linking_file_path, linking_data)
+        with self.linking_storage.transaction():
+            links = [(user, team_id) for user in dict.fromkeys(users_to_remove)
+                     if self.linking_storage.get((user, team_id)) is not None]
+
+            if links:
+                self.linking_storage.delete_many(links)
+                change_feed.publish([("team.users_removed",
+                                      {"team_id": team_id, "user_ids": [user for user, _ in links]})])
+
+    def apply_memberships(self, operations) -> dict:
+        """
+        Link and unlink many (team, user) pairs in one transaction and one write.
+
+        :param operations: objects with team_id, user_id and action ("add" or "remove"),
+            applied in order, so the last operation on a pair wins
+        :return: {"added" : <links created>, "removed" : <links deleted>}
+
+        Constraint:
+         * every team, and every user being added, must exist, otherwise nothing is applied
+        """
+        with self.linking_storage.transaction():
+            # final state of every pair touched: True linked, False unlinked
+            wanted = {}
+            # each team and user is looked up once
+            teams = {}
+            users = {}
+            for index, operation in enumerate(operations):
+                if operation.team_id not in teams:
+                    teams[operation.team_id] = self.team_storage.get(operation.team_id) is not None
+                if not teams[operation.team_id]:
+                    raise ValueError(f"Operation {index}: Team with id = {operation.team_id} not found")
+                adding = operation.action == "add"
+                if adding and operation.user_id not in users:
+                    users[operation.user_id] = self.user_storage.get(operation.user_id) is not None
+                if adding and not users[operation.user_id]:
+                    raise ValueError(f"Operation {index}: User with id = {operation.user_id} not found")
+                wanted[(operation.user_id, operation.team_id)] = adding
+
+            inserts = []
+            deletes = []
+            for key, adding in wanted.items():
+                linked = self.linking_storage.get(key) is not None
+                if adding and not linked:
+                    inserts.append({"user_id": key[0], "team_id": key[1]})
+                elif linked and not adding:
+                    deletes.append(key)
+
+            if inserts or deletes:
+                self.linking_storage.write_many(inserts, deletes)
+
+            added = {}
+            for link in inserts:
+                added.setdefault(link["team_id"], []).append(link["user_id"])
+            removed = {}
+            for user_id, team_id in deletes:
+                removed.setdefault(team_id, []).append(user_id)
+            change_feed.publish(
+                [("team.users_added", {"team_id": team_id, "user_ids": user_ids})
+                 for team_id, user_ids in added.items()] +
+                [("team.users_removed", {"team_id": team_id, "user_ids": user_ids})
+                 for team_id, user_ids in removed.items()]
+            )
+        return {"added": len(inserts), "removed": len(deletes)}
 
     def list_users_in_a_team(self, team_id):
-        user_data = self.read_file(self.user_file_path)
-        linking_data = self.read_file(self.linking_file_path)
-
-        user_list = {
-            item["id"]: {"user_id": item["id"], "user_name": item["name"], "display_name": item["display_name"]}
-            for item in user_data
-        }
-
-        response = [user_list[item["user_id"]] for item in linking_data if item["team_id"] == team_id]
+        response = []
+        for item in self.linking_storage.find_all("team_id", team_id):
+            user = self.user_storage.get(item["user_id"])
+            if user is not None:
+                response.append({"user_id": user["id"], "user_name": user["name"], "display_name": user["display_name"]})
 
         return response
 
     def get_teams_of_a_user(self, user_id):
-        team_data = self.read_file(self.team_file_path)
-        linking_data = self.read_file(self.linking_file_path)
-
-        team_list = {
-            item["id"]: {"name": item["name"], "description": item["description"],
-                         "creation_time": datetime.fromisoformat(item["creation_time"])}
-            for item in team_data
-        }
-
-        response = [team_list[item["team_id"]] for item in linking_data if item["user_id"] == user_id]
+        response = []
+        for item in self.linking_storage.find_all("user_id", user_id):
+            team = self.team_storage.get(item["team_id"])
+            if team is not None:
+                response.append({"name": team["name"], "description": team["description"],
+                                 "creation_time": parse_timestamp(team["creation_time"])})
 
         return response
 
     def check_if_user_and_team_linking_exists(self, team_id, user_id):
-        linking_data = self.read_file(self.linking_file_path)
-        user_team_linking = UserTeamLinking(user_id=user_id, team_id=team_id)
-
-        if user_team_linking.dict() in linking_data:
+        if self.linking_storage.get((user_id, team_id)) is not None:
             return True
         else:
             return False
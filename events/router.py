@@ -0,0 +1,93 @@
+import asyncio
+from typing import Optional
+
+from fastapi import APIRouter, Header, HTTPException, Query, status
+from fastapi.responses import StreamingResponse
+from pydantic import PositiveInt
+
+from common import codec, config
+from common.change_feed import change_feed
+from common.concurrency import AsyncProxy
+
+from .schema import ChangeList
+
+router = APIRouter(
+    prefix="/events",
+    tags=["events"]
+)
+
+feed = AsyncProxy(change_feed)
+
+# max events returned by one request for changes
+CHANGES_MAX_LIMIT = 10000
+# events read from the feed per step of the event stream
+STREAM_CHUNK = 500
+# seconds between keep-alive comments on an idle event stream
+STREAM_KEEPALIVE = 15.0
+
+
+@router.get("", response_model=ChangeList)
+async def list_changes(
+        since: int = Query(0, ge=0),
+        limit: int = Query(1000, gt=0, le=CHANGES_MAX_LIMIT),
+        board_id: Optional[PositiveInt] = None,
+        team_id: Optional[PositiveInt] = None,
+):
+    """
+    Task, board and team membership changes after the sequence number `since`, oldest first.
+    Pass the returned next_seq as `since` to get the following changes.
+    """
+    try:
+        return await feed.as_response.since(since, limit, board_id, team_id)
+    except Exception as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+
+@router.get("/stream")
+async def stream_changes(
+        since: Optional[int] = Query(None, ge=0),
+        board_id: Optional[PositiveInt] = None,
+        team_id: Optional[PositiveInt] = None,
+        last_event_id: Optional[str] = Header(None),
+):
+    """
+    Server-Sent Events stream of the changes. Starts after `since`, after the
+    Last-Event-ID header sent by a reconnecting EventSource, or else at the
+    latest change. A "reset" event is sent when the requested changes are no
+    longer kept: the client should reload its data.
+    """
+    if since is None and last_event_id is not None and last_event_id.isdigit():
+        since = int(last_event_id)
+    seq = since if since is not None else await feed.last_seq()
+
+    async def events():
+        nonlocal seq
+        idle = 0.0
+        while True:
+            try:
+                page = await feed.since(seq, STREAM_CHUNK, board_id, team_id)
+            except ValueError as e:
+                seq = await feed.last_seq()
+                yield _sse("reset", {"next_seq": seq, "detail": str(e)})
+                continue
+
+            for event in page["events"]:
+                yield _sse(event["type"], event, event["seq"])
+            if page["next_seq"] != seq:
+                seq = page["next_seq"]
+                idle = 0.0
+                continue
+
+            if idle >= STREAM_KEEPALIVE:
+                yield ": keep-alive\n\n"
+                idle = 0.0
+            await asyncio.sleep(config.CHANGE_FEED_POLL_INTERVAL)
+            idle += config.CHANGE_FEED_POLL_INTERVAL
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+
+def _sse(event_type: str, data, event_id: int = None) -> str:
+    lines = [f"id: {event_id}"] if event_id is not None else []
+    lines += [f"event: {event_type}", f"data: {codec.dumps_str(data)}"]
+    return "\n".join(lines) + "\n\n"
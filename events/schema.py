@@ -0,0 +1,21 @@
+from typing import Any, Dict, List
+
+from pydantic import BaseModel
+
+
+class ChangeEvent(BaseModel):
+    """
+    One mutation of a task, board or team membership
+    """
+    seq: int
+    time: str
+    type: str
+    data: Dict[str, Any]
+
+
+class ChangeList(BaseModel):
+    """
+    Response format for the changes since a sequence number
+    """
+    next_seq: int
+    events: List[ChangeEvent]
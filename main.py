@@ -1,7 +1,19 @@
 from fastapi import FastAPI
 
+from common import config
+from common.codec import FastJSONResponse
+from common.instrumentation import ServerTimingMiddleware
 from common.router import add_routes
+from common.startup import startup
 
-app = FastAPI()
+app = FastAPI(default_response_class=FastJSONResponse)
 
 add_routes(app)
+
+if config.INSTRUMENTATION_ENABLED:
+    app.add_middleware(ServerTimingMiddleware)
+
+
+@app.on_event("startup")
+def warm_up():
+    startup.start()
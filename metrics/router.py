@@ -0,0 +1,41 @@
+from fastapi import APIRouter
+
+from board.export import export_cache
+from board.summary import board_summaries
+from common import config
+from common.codec import FastJSONResponse
+from common.conditional import version_tags
+from common.instrumentation import metrics
+from common.startup import startup
+from common.storage import get_cache_stats
+
+router = APIRouter(
+    tags=["metrics"]
+)
+
+
+@router.get("/metrics")
+async def get_metrics():
+    """
+    Latency histograms per span (storage reads/writes, index lookups, model building,
+    response encoding and route handlers), bytes read/written per store and cache counters.
+    Spans are only recorded when FACTWISE_INSTRUMENTATION=1.
+    """
+    return {
+        "enabled": config.INSTRUMENTATION_ENABLED,
+        **metrics.snapshot(),
+        "caches": get_cache_stats(),
+        "export_cache": export_cache.stats(),
+        "board_summaries": board_summaries.stats(),
+        "etags": version_tags.stats(),
+        "startup": startup.stats(),
+    }
+
+
+@router.get("/ready")
+async def get_ready():
+    """
+    Readiness of the worker: 503 until the stores of FACTWISE_PRELOAD are loaded,
+    then 200, with the time to ready and where each store was loaded from.
+    """
+    return FastJSONResponse(startup.stats(), status_code=200 if startup.ready else 503)
@@ -0,0 +1,72 @@
+from typing import List
+
+from board.schema import TaskList
+from common.instrumentation import span
+from common.schema import parse_timestamp, trusted_model
+from common.search import query_terms, row_matches
+from common.storage import TEXT_INDEXES, get_storage
+from teams.schema import TeamListResponse
+from users.schema import UserListResponse
+
+
+class SearchController:
+    """
+    Prefix search over task titles and descriptions, user names and display names
+    and team names, answered from the text indexes of the stores (common/search.py).
+
+    Every word of the query must start a word of the result, e.g. "rel not"
+    finds the task "Write the release notes".
+    """
+
+    def __init__(self):
+        self.task_storage = get_storage("tasks")
+        self.user_storage = get_storage("users")
+        self.team_storage = get_storage("teams")
+
+    def search_tasks(self, query: str, limit: int, board_id: int = None) -> List[TaskList]:
+        """
+        :param query: the words to look for
+        :param limit: max number of tasks to return
+        :param board_id: only search the tasks of this board
+        :return: A list of tasks, as in list_tasks_in_board
+        """
+        terms = query_terms(query)
+        with span("model.search_tasks"):
+            if board_id is not None:
+                # the tasks of one board are few, they are checked one by one
+                fields = TEXT_INDEXES["tasks"][0][1]
+                tasks = [task for task in self.task_storage.find_all("board_id", board_id)
+                         if row_matches(task, fields, terms)][:limit]
+            else:
+                tasks = self.task_storage.search("text", terms, limit)
+            return [trusted_model(TaskList, task) for task in tasks]
+
+    def search_users(self, query: str, limit: int) -> List[UserListResponse]:
+        """
+        :param query: the words to look for in the name and display name
+        :param limit: max number of users to return
+        """
+        terms = query_terms(query)
+        with span("model.search_users"):
+            return [trusted_model(UserListResponse, user, creation_time=parse_timestamp(user["creation_time"]))
+                    for user in self.user_storage.search("text", terms, limit)]
+
+    def search_teams(self, query: str, limit: int) -> List[TeamListResponse]:
+        """
+        :param query: the words to look for in the team name
+        :param limit: max number of teams to return
+        """
+        terms = query_terms(query)
+        with span("model.search_teams"):
+            return [trusted_model(TeamListResponse, team, creation_time=parse_timestamp(team["creation_time"]))
+                    for team in self.team_storage.search("text", terms, limit)]
+
+    def search_all(self, query: str, limit: int) -> dict:
+        """
+        :return: {"tasks" : [...], "users" : [...], "teams" : [...]}, at most limit of each
+        """
+        return {
+            "tasks": self.search_tasks(query, limit),
+            "users": self.search_users(query, limit),
+            "teams": self.search_teams(query, limit),
+        }
@@ -0,0 +1,55 @@
+from typing import List, Optional
+
+from fastapi import APIRouter, HTTPException, Query, status
+from pydantic import PositiveInt
+
+from board.schema import TaskList
+from common.concurrency import AsyncProxy
+from teams.schema import TeamListResponse
+from users.schema import UserListResponse
+
+from .controller import SearchController
+from .schema import SearchResults
+
+router = APIRouter(
+    prefix="/search",
+    tags=["search"]
+)
+
+search_controller = AsyncProxy.lazy(SearchController)
+
+# max number of results per entity
+SEARCH_MAX_LIMIT = 1000
+
+
+@router.get("", response_model=SearchResults)
+async def search_all(q: str = Query(..., max_length=256), limit: int = Query(20, gt=0, le=SEARCH_MAX_LIMIT)):
+    try:
+        return await search_controller.as_response.search_all(q, limit)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+
+@router.get("/tasks", response_model=List[TaskList])
+async def search_tasks(q: str = Query(..., max_length=256), limit: int = Query(20, gt=0, le=SEARCH_MAX_LIMIT),
+                       board_id: Optional[PositiveInt] = None):
+    try:
+        return await search_controller.as_response.search_tasks(q, limit, board_id)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+
+@router.get("/users", response_model=List[UserListResponse])
+async def search_users(q: str = Query(..., max_length=256), limit: int = Query(20, gt=0, le=SEARCH_MAX_LIMIT)):
+    try:
+        return await search_controller.as_response.search_users(q, limit)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+
+@router.get("/teams", response_model=List[TeamListResponse])
+async def search_teams(q: str = Query(..., max_length=256), limit: int = Query(20, gt=0, le=SEARCH_MAX_LIMIT)):
+    try:
+        return await search_controller.as_response.search_teams(q, limit)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
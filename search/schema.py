@@ -0,0 +1,16 @@
+from typing import List
+
+from pydantic import BaseModel
+
+from board.schema import TaskList
+from teams.schema import TeamListResponse
+from users.schema import UserListResponse
+
+
+class SearchResults(BaseModel):
+    """
+    Response format for the search across tasks, users and teams
+    """
+    tasks: List[TaskList]
+    users: List[UserListResponse]
+    teams: List[TeamListResponse]
@@ -0,0 +1,119 @@
+from typing import Dict, Iterable
+
+from board.schema import TaskStatus
+from common.instrumentation import span
+from common.storage import get_storage
+
+BOARD_STATUSES = ('Open', 'Closed')
+
+# differences returned by one verification at most
+MAX_DIFFERENCES = 100
+
+
+def _with_statuses(counts: Dict, statuses: Iterable[str]) -> Dict[str, int]:
+    # every known status is listed, with 0 when there is no row in it
+    return {**{status: 0 for status in statuses}, **counts}
+
+
+class StatsController:
+    """
+    Board and task counts of the workspace, of a team and of a user.
+
+    They are read from the running counts the entity cache keeps for count_by
+    (COUNT_INDEXES in common/storage.py), updated by every task and board
+    mutation, so no task row is loaded to answer them. The task counts of a team
+    are kept per team too (through the team of each task's board), so they take
+    the same time whatever the number of boards of the team.
+    """
+
+    def __init__(self):
+        self.task_storage = get_storage("tasks")
+        self.board_storage = get_storage("boards")
+        self.team_storage = get_storage("teams")
+        self.user_storage = get_storage("users")
+
+    def overview(self) -> dict:
+        """
+        :return:
+        {
+          "board_counts" : {"<board status>" : <number of boards>},
+          "total_boards" : <number of boards>,
+          "task_counts" : {"<task status>" : <number of tasks>},
+          "total_tasks" : <number of tasks>
+        }
+        """
+        with span("model.stats_overview"):
+            board_counts = self.board_storage.count_by("board_status")
+            task_counts = self.task_storage.count_by("task_status")
+            return {
+                "board_counts": _with_statuses(board_counts, BOARD_STATUSES),
+                "total_boards": sum(board_counts.values()),
+                "task_counts": _with_statuses(task_counts, (status.value for status in TaskStatus)),
+                "total_tasks": sum(task_counts.values()),
+            }
+
+    def team_stats(self, team_id: int) -> dict:
+        """
+        :param team_id: the team identifier
+
+        :return: The counts of the overview for the boards of the team, and
+        {
+          "team_id" : "<team_id>",
+          "assignees" : [{"user_id" : "<user_id>", "user_name" : "<name>", "display_name" : "<display name>",
+                          "task_count" : <tasks of the team assigned to the user>}]
+        }
+        """
+        if self.team_storage.get(team_id) is None:
+            raise ValueError("Team not found")
+
+        with span("model.team_stats"):
+            board_counts = self.board_storage.count_by("board_status", ("team_id", team_id))
+            task_counts = self.task_storage.count_by("task_status", ("team_id", team_id))
+            assignees = self.task_storage.count_by("user_id", ("team_id", team_id))
+
+            assignee_list = []
+            for user_id in sorted(assignees):
+                user = self.user_storage.get(user_id)
+                assignee_list.append({"user_id": user_id, "user_name": user["name"] if user else None,
+                                      "display_name": user["display_name"] if user else None,
+                                      "task_count": assignees[user_id]})
+            return {
+                "team_id": team_id,
+                "board_counts": _with_statuses(board_counts, BOARD_STATUSES),
+                "total_boards": sum(board_counts.values()),
+                "task_counts": _with_statuses(task_counts, (status.value for status in TaskStatus)),
+                "total_tasks": sum(task_counts.values()),
+                "assignees": assignee_list,
+            }
+
+    def user_stats(self, user_id: int) -> dict:
+        """
+        :param user_id: the user identifier
+
+        :return:
+        {
+          "user_id" : "<user_id>",
+          "task_counts" : {"<task status>" : <tasks assigned to the user>},
+          "total_tasks" : <tasks assigned to the user>
+        }
+        """
+        if self.user_storage.get(user_id) is None:
+            raise ValueError("User not found")
+
+        task_counts = self.task_storage.count_by("task_status", ("user_id", user_id))
+        return {
+            "user_id": user_id,
+            "task_counts": _with_statuses(task_counts, (status.value for status in TaskStatus)),
+            "total_tasks": sum(task_counts.values()),
+        }
+
+    def verify(self) -> dict:
+        """
+        Recount the running counts of the tasks and boards from the stores and
+        replace them with the recount.
+
+        :return: {"verified" : <whether every count was right>, "differences" : [...]}
+        """
+        with span("model.stats_verify"):
+            differences = self.task_storage.verify_counts() + self.board_storage.verify_counts()
+        return {"verified": not differences, "differences": differences[:MAX_DIFFERENCES]}
@@ -0,0 +1,31 @@
+"""
+Recount the task and board statistics of a running server from the stores,
+verify its running counts against the recount and print the differences.
+
+    python -m stats.rebuild --url http://127.0.0.1:8000
+
+Every worker keeps its own counts and the request is answered by one of them.
+Exits with status 1 when some count was wrong (it is fixed by the recount).
+"""
+import argparse
+import json
+import sys
+import urllib.request
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://127.0.0.1:8000", help="base url of the server")
+    args = parser.parse_args()
+
+    request = urllib.request.Request(args.url.rstrip("/") + "/stats/rebuild", method="POST")
+    with urllib.request.urlopen(request) as response:
+        result = json.loads(response.read())
+
+    print(json.dumps(result, indent=2))
+    if not result["verified"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
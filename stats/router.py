@@ -0,0 +1,48 @@
+from fastapi import APIRouter, Depends, HTTPException, status
+from pydantic import PositiveInt
+
+from common.concurrency import AsyncProxy
+from common.conditional import Conditional, StoreVersion
+
+from .controller import StatsController
+from .schema import StatsOverview, StatsVerification, TeamStats, UserStats
+
+router = APIRouter(
+    prefix="/stats",
+    tags=["stats"]
+)
+
+stats_controller = AsyncProxy.lazy(StatsController)
+
+
+@router.get("", response_model=StatsOverview)
+async def stats_overview(version: Conditional = Depends(StoreVersion("tasks", "boards"))):
+    if version.not_modified:
+        return version.not_modified_response()
+    return version.tag(await stats_controller.overview())
+
+
+@router.get("/teams/{team_id}", response_model=TeamStats)
+async def team_stats(team_id: PositiveInt,
+                     version: Conditional = Depends(StoreVersion("tasks", "boards", "teams", "users"))):
+    if version.not_modified:
+        return version.not_modified_response()
+    try:
+        return version.tag(await stats_controller.team_stats(team_id))
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+
+@router.get("/users/{user_id}", response_model=UserStats)
+async def user_stats(user_id: PositiveInt, version: Conditional = Depends(StoreVersion("tasks", "users"))):
+    if version.not_modified:
+        return version.not_modified_response()
+    try:
+        return version.tag(await stats_controller.user_stats(user_id))
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+
+@router.post("/rebuild", response_model=StatsVerification)
+async def rebuild_stats():
+    return await stats_controller.verify()
@@ -0,0 +1,48 @@
+from typing import Any, Dict, List
+
+from pydantic import BaseModel
+
+from board.schema import BoardAssignee
+
+
+class StatsOverview(BaseModel):
+    """
+    Response format for the board and task counts of the whole workspace
+    """
+    board_counts: Dict[str, int]
+    total_boards: int
+    task_counts: Dict[str, int]
+    total_tasks: int
+
+
+class TeamStats(StatsOverview):
+    """
+    Response format for the board and task counts of one team, with the tasks of each assignee
+    """
+    team_id: int
+    assignees: List[BoardAssignee]
+
+
+class UserStats(BaseModel):
+    """
+    Response format for the counts of the tasks assigned to one user
+    """
+    user_id: int
+    task_counts: Dict[str, int]
+    total_tasks: int
+
+
+class CountDifference(BaseModel):
+    index: str
+    group: Any
+    value: Any
+    running: int
+    recounted: int
+
+
+class StatsVerification(BaseModel):
+    """
+    Response format for the recount of the running counts
+    """
+    verified: bool
+    differences: List[CountDifference]
@@ -1,12 +1,16 @@
-import json
-import os
 from datetime import datetime
-from typing import List
+from typing import Iterator, List
 
+from board.versioning import boards_of_team, bump_board_versions
+from common.instrumentation import span
+from common.pagination import paginate
+from common.schema import new_bulk_results, parse_timestamp, trusted_model
+from common.storage import get_storage
 from common.user_team_linking import UserTeamLinkingBase
 from users.controller import UserController
 
 from .schema import (
+    MembershipOperation,
     TeamCreateRequest,
     TeamListResponse,
     TeamAddRemoveUsersRequest,
@@ -16,16 +20,12 @@ from .schema import (
 
 class TeamBase:
     def __init__(self):
-        self.team_file_path = os.path.join("db", 'team.json')
-
-    def _load_teams(self):
+        self.storage = get_storage("teams")
+        self.user_storage = get_storage("users")
         self.teams = []
-        for line in open(self.team_file_path, 'r'):
-            self.teams.extend(json.loads(line))
 
-    def _save_teams(self):
-        with open(self.team_file_path, 'w') as f:
-            json.dump(self.teams, f)
+    def _load_teams(self):
+        self.teams = self.storage.load()
 
     def create_team(self, team: TeamCreateRequest) -> int:
         """
@@ -47,35 +47,75 @@ class TeamBase:
         user_controller = UserController()
         user = user_controller._get_user_by_id(team.admin)
 
-        self._load_teams()
+        with self.storage.transaction():
+            # Check if the team name already exists
+            if self.storage.find("name", team.name):
+                raise ValueError("Team name already exists")
 
-        # Check if the team name already exists
-        if any(t['name'] == team.name for t in self.teams):
-            raise ValueError("Team name already exists")
-
-        # Generate new team id
-        if self.teams:
-            new_id = max(t['id'] for t in self.teams) + 1
-        else:
-            new_id = 1
-
-        # Create new team
-        new_team = {
-            "id": new_id,
-            "name": team.name,
-            "description": team.description,
-            "creation_time": str(datetime.now()),
-            "admin": team.admin,
-            "users": []
-        }
+            # Generate new team id
+            new_id = self.storage.next_id()
+
+            # Create new team
+            new_team = {
+                "id": new_id,
+                "name": team.name,
+                "description": team.description,
+                "creation_time": str(datetime.now()),
+                "admin": team.admin,
+                "users": []
+            }
 
-        self.teams.append(new_team)
-        self._save_teams()
+            self.storage.insert(new_team)
 
         return new_id
 
-    def list_teams(self) -> List[TeamListResponse]:
+    def create_teams_bulk(self, teams: List[TeamCreateRequest]) -> List[dict]:
         """
+        Create many teams, validated in one pass and persisted in one write.
+
+        :param teams: A list of team details, as for create_team
+        :return: One result per team, in request order
+        [
+          {"index" : <position in the request>, "id" : "<team_id>", "error" : "<reason it was not created>"}
+        ]
+        """
+        results = new_bulk_results(len(teams))
+
+        with self.storage.transaction():
+            valid = []
+            names = set()
+            for index, team in enumerate(teams):
+                if self.user_storage.get(team.admin) is None:
+                    results[index]["error"] = "User not found"
+                elif team.name in names or self.storage.find("name", team.name):
+                    results[index]["error"] = "Team name already exists"
+                else:
+                    names.add(team.name)
+                    valid.append(index)
+
+            creation_time = str(datetime.now())
+            rows = []
+            for index, team_id in zip(valid, self.storage.next_ids(len(valid)) if valid else []):
+                team = teams[index]
+                rows.append({
+                    "id": team_id,
+                    "name": team.name,
+                    "description": team.description,
+                    "creation_time": creation_time,
+                    "admin": team.admin,
+                    "users": []
+                })
+                results[index]["id"] = team_id
+
+            if rows:
+                self.storage.insert_many(rows)
+        return results
+
+    def list_teams(self, after_id: int = None, limit: int = None) -> List[TeamListResponse]:
+        """
+        :param after_id: return only teams with a larger id (keyset pagination)
+        :param limit: max number of teams to return
+
         :return: A json list with the response.
         [
           {
@@ -86,19 +126,12 @@ class TeamBase:
           }
         ]
         """
-        self._load_teams()
-
-        team_list = []
-        for t in self.teams:
-            team_list.append(TeamListResponse(
-                id=t['id'],
-                name=t['name'],
-                description=t['description'],
-                creation_time=datetime.fromisoformat(t['creation_time']),
-                admin=t['admin']
-            ))
+        with span("model.list_teams"):
+            return list(self.iter_teams(after_id, limit))
 
-        return team_list
+    def iter_teams(self, after_id: int = None, limit: int = None) -> Iterator[TeamListResponse]:
+        for t in paginate(self.storage.scan_after(after_id), limit=limit):
+            yield trusted_model(TeamListResponse, t, creation_time=parse_timestamp(t['creation_time']))
 
     def describe_team(self, data) -> TeamListResponse:
         """
@@ -118,19 +151,11 @@ class TeamBase:
 
         """
         team_id = data['id']
-        self._load_teams()
+        t = self.storage.get(team_id)
+        if t is None:
+            return None
 
-        for t in self.teams:
-            if t['id'] == team_id:
-                return TeamListResponse(
-                    id=t['id'],
-                    name=t['name'],
-                    description=t['description'],
-                    creation_time=datetime.fromisoformat(t['creation_time']),
-                    admin=t['admin']
-                )
-
-        return None
+        return trusted_model(TeamListResponse, t, creation_time=parse_timestamp(t['creation_time']))
 
     def update_team(self, data):
         """
@@ -159,23 +184,23 @@ class TeamBase:
         user_controller = UserController()
         user = user_controller._get_user_by_id(new_team.admin)
 
-        self._load_teams()
-
-        for i, t in enumerate(self.teams):
-            if t['id'] == team_id:
-                # Check if the new team name already exists
-                if any(tt['name'] == new_team.name for tt in self.teams if tt != t):
-                    raise ValueError("Team name already exists")
+        with self.storage.transaction():
+            self.get_team_by_id(team_id)
 
-                # Update team
-                self.teams[i]['name'] = new_team.name
-                self.teams[i]['description'] = new_team.description
-                self.teams[i]['admin'] = new_team.admin
+            # Check if the new team name already exists
+            existing_team = self.storage.find("name", new_team.name)
+            if existing_team and existing_team['id'] != team_id:
+                raise ValueError("Team name already exists")
 
-                self._save_teams()
-                return
+            # Update team
+            self.storage.update(team_id, {
+                "name": new_team.name,
+                "description": new_team.description,
+                "admin": new_team.admin,
+            })
 
-        raise ValueError("Team not found")
+        # the team is shown in the export of its boards
+        bump_board_versions(boards_of_team(team_id))
 
     def add_users_to_team(self, team_id: int, users: TeamAddRemoveUsersRequest):
         """
@@ -210,6 +235,21 @@ class TeamBase:
         user_team_linking = UserTeamLinkingBase()
         user_team_linking.remove_users_from_team(team_id, users.users)
 
+    def apply_memberships(self, operations: List[MembershipOperation]) -> dict:
+        """
+        :param operations: A list of membership changes, applied in order
+        [
+          {"team_id" : "<team_id>", "user_id" : "<user_id>", "action" : "add | remove"}
+        ]
+
+        :return: {"added" : <links created>, "removed" : <links deleted>}
+
+        Constraint:
+        * All operations are validated first and written in one write, or none is applied
+        """
+        user_team_linking = UserTeamLinkingBase()
+        return user_team_linking.apply_memberships(operations)
+
     # list users of a team
     def list_team_users(self, team_id):
         """
@@ -234,12 +274,10 @@ class TeamBase:
 
 
     def get_team_by_id(self, team_id: int) -> dict:
-        self._load_teams()
-
-        for team in self.teams:
-            if team['id'] == team_id:
-                return team
-        raise ValueError('Team not found')
+        team = self.storage.get(team_id)
+        if team is None:
+            raise ValueError('Team not found')
+        return team
 
     def get_all_team_data(self):
         self._load_teams()
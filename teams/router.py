@@ -1,10 +1,18 @@
 from typing import List
 
-from fastapi import APIRouter, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, status
 from pydantic import PositiveInt
 
+from common.concurrency import AsyncProxy
+from common.conditional import Conditional, StoreVersion
+from common.pagination import ListFormat, PageParams, ndjson_response
+from common.schema import BulkResponse
+
 from .controller import TeamBase
 from .schema import (
+    MembershipBulkRequest,
+    MembershipBulkResponse,
+    TeamBulkCreateRequest,
     TeamCreateRequest,
     TeamCreateResponse,
     TeamListResponse,
@@ -17,29 +25,49 @@ router = APIRouter(
     tags=["teams"]
 )
 
-team_base = TeamBase()
+team_base = AsyncProxy.lazy(TeamBase)
 
 
 @router.post("/teams", status_code=status.HTTP_201_CREATED, response_model=TeamCreateResponse)
 async def create_team(team: TeamCreateRequest):
     try:
-        team_id = team_base.create_team(team)
+        team_id = await team_base.create_team(team)
         return {"id": team_id}
     except ValueError as e:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
 
 
+@router.post("/teams/bulk", response_model=BulkResponse)
+async def create_teams_bulk(request: TeamBulkCreateRequest):
+    results = await team_base.create_teams_bulk(request.teams)
+    return BulkResponse.from_results(results)
+
+
+@router.post("/teams/memberships", response_model=MembershipBulkResponse)
+async def apply_memberships(request: MembershipBulkRequest):
+    try:
+        return await team_base.apply_memberships(request.operations)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+
 @router.get("/teams", response_model=List[TeamListResponse])
-async def list_teams():
-    return team_base.list_teams()
+async def list_teams(page: PageParams = Depends(), version: Conditional = Depends(StoreVersion("teams"))):
+    if version.not_modified:
+        return version.not_modified_response()
+    if page.format == ListFormat.NDJSON:
+        return version.tag(ndjson_response(team_base.target.iter_teams(page.after_id, page.limit)))
+    return version.tag(await team_base.as_response.list_teams(page.after_id, page.limit))
 
 
 @router.get("/teams/{team_id}", response_model=TeamListResponse)
-async def describe_team(team_id: PositiveInt):
+async def describe_team(team_id: PositiveInt, version: Conditional = Depends(StoreVersion("teams"))):
+    if version.not_modified:
+        return version.not_modified_response()
     try:
-        team_detail = team_base.describe_team({"id": team_id})
+        team_detail = await team_base.describe_team({"id": team_id})
         if team_detail:
-            return team_detail
+            return version.tag(team_detail)
         else:
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Team not found")
     except ValueError as e:
@@ -49,7 +77,7 @@ async def describe_team(team_id: PositiveInt):
 @router.put("/teams/{team_id}", status_code=status.HTTP_204_NO_CONTENT)
 async def update_team(team_id: PositiveInt, team: TeamCreateRequest):
     try:
-        team_base.update_team({"id": team_id, "team": team})
+        await team_base.update_team({"id": team_id, "team": team})
     except ValueError as e:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
 
@@ -57,7 +85,7 @@ async def update_team(team_id: PositiveInt, team: TeamCreateRequest):
 @router.post("/teams/{team_id}/users", status_code=status.HTTP_204_NO_CONTENT)
 async def add_users_to_team(team_id: int, users: TeamAddRemoveUsersRequest):
     try:
-        team_base.add_users_to_team(team_id, users)
+        await team_base.add_users_to_team(team_id, users)
     except ValueError as e:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
 
@@ -65,14 +93,16 @@ async def add_users_to_team(team_id: int, users: TeamAddRemoveUsersRequest):
 @router.delete("/teams/{team_id}/users", status_code=status.HTTP_204_NO_CONTENT)
 async def remove_users_from_team(team_id: int, users: TeamAddRemoveUsersRequest):
     try:
-        team_base.remove_users_from_team(team_id, users)
+        await team_base.remove_users_from_team(team_id, users)
     except ValueError as e:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
 
 
 @router.get("/teams/{team_id}/users", response_model=List[UsersInTeamListResponse])
-async def list_team_users(team_id: int):
+async def list_team_users(team_id: int, version: Conditional = Depends(StoreVersion("user_team_linking", "users"))):
+    if version.not_modified:
+        return version.not_modified_response()
     try:
-        return team_base.list_team_users(team_id)
+        return version.tag(await team_base.as_response.list_team_users(team_id))
     except ValueError as e:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
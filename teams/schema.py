@@ -1,8 +1,11 @@
 from datetime import datetime
+from enum import Enum
 from typing import List
 
 from pydantic import BaseModel, Field, PositiveInt
 
+from common.schema import BULK_MAX_ITEMS
+
 
 class TeamCreateRequest(BaseModel):
     name: str = Field(..., max_length=64)
@@ -10,6 +13,10 @@ class TeamCreateRequest(BaseModel):
     admin: PositiveInt
 
 
+class TeamBulkCreateRequest(BaseModel):
+    teams: List[TeamCreateRequest] = Field(..., max_items=BULK_MAX_ITEMS)
+
+
 class TeamCreateResponse(BaseModel):
     id: int
 
@@ -30,3 +37,23 @@ class UsersInTeamListResponse(BaseModel):
 
 class TeamAddRemoveUsersRequest(BaseModel):
     users: List[int] = Field(..., max_items=50)
+
+
+class MembershipAction(str, Enum):
+    ADD = 'add'
+    REMOVE = 'remove'
+
+
+class MembershipOperation(BaseModel):
+    team_id: PositiveInt
+    user_id: PositiveInt
+    action: MembershipAction
+
+
+class MembershipBulkRequest(BaseModel):
+    operations: List[MembershipOperation] = Field(..., max_items=BULK_MAX_ITEMS)
+
+
+class MembershipBulkResponse(BaseModel):
+    added: int
+    removed: int
@@ -0,0 +1,120 @@
+import os
+import threading
+
+import pytest
+
+from common import config
+from common.cache import EntityCache
+from common.storage import JsonFileStorage
+
+
+def append_storage(tmp_path) -> JsonFileStorage:
+    return JsonFileStorage("tasks", str(tmp_path / "task.json"), mode="append", fsync="never")
+
+
+def run_threads(*targets, timeout: float = 30):
+    threads = [threading.Thread(target=target, daemon=True) for target in targets]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(timeout)
+    assert not any(thread.is_alive() for thread in threads), "the threads are deadlocked"
+
+
+@pytest.fixture(autouse=True)
+def no_snapshots(monkeypatch):
+    monkeypatch.setattr(config, "SNAPSHOT_ENABLED", False)
+
+
+def test_insert_after_torn_record_is_kept(tmp_path):
+    storage = append_storage(tmp_path)
+    storage.insert({"id": 1, "title": "one"})
+    storage.insert({"id": 2, "title": "two"})
+
+    # a writer crashed in the middle of its record
+    with open(storage.log_path, 'ab') as f:
+        f.write(b'{"op": "insert", "row": {"id": 9, "ti')
+
+    restarted = append_storage(tmp_path)
+    restarted.insert({"id": 3, "title": "three"})
+    restarted.insert({"id": 4, "title": "four"})
+
+    assert sorted(row["id"] for row in restarted.load()) == [1, 2, 3, 4]
+    restarted.compact()
+    assert sorted(row["id"] for row in append_storage(tmp_path).load()) == [1, 2, 3, 4]
+
+
+def test_replay_skips_damaged_record(tmp_path):
+    storage = append_storage(tmp_path)
+    storage.insert({"id": 1, "title": "one"})
+    with open(storage.log_path, 'ab') as f:
+        f.write(b'{"op": "insert", "row": \n')
+    storage.insert({"id": 2, "title": "two"})
+
+    assert sorted(row["id"] for row in append_storage(tmp_path).load()) == [1, 2]
+    assert os.path.getsize(storage.log_path) > 0
+
+
+def test_replay_skips_record_without_op(tmp_path):
+    storage = append_storage(tmp_path)
+    storage.insert({"id": 1, "title": "one"})
+    with open(storage.log_path, 'ab') as f:
+        f.write(b'{"row": {"id": 9}}\n{"op": "update", "changes": {"title": "x"}}\n[1, 2]\n')
+    storage.insert({"id": 2, "title": "two"})
+
+    assert sorted(row["title"] for row in append_storage(tmp_path).load()) == ["one", "two"]
+
+
+def test_cached_reads_and_transactions_do_not_deadlock(tmp_path):
+    cache = EntityCache(append_storage(tmp_path))
+    # another worker process appending to the same log, so the cache keeps reloading
+    other = append_storage(tmp_path)
+    cache.insert({"id": 0, "title": "zero"})
+    done = threading.Event()
+
+    def read():
+        while not done.is_set():
+            assert cache.get(0) is not None
+
+    def write():
+        for key in range(1, 200):
+            with cache.transaction():
+                cache.insert({"id": key, "title": str(key)})
+
+    def append_elsewhere():
+        for key in range(1000, 1200):
+            other.insert({"id": key, "title": str(key)})
+
+    def write_then_stop():
+        run_threads(write, append_elsewhere)
+        done.set()
+
+    run_threads(read, write_then_stop)
+    assert len(cache.load()) == 1 + 199 + 200
+
+
+def test_compaction_keeps_concurrent_appends(tmp_path):
+    writers = [append_storage(tmp_path) for _ in range(3)]
+    compactor = append_storage(tmp_path)
+    done = threading.Event()
+
+    def write(storage, start):
+        def run():
+            for key in range(start, start + 300):
+                storage.insert({"id": key, "title": str(key)})
+                if key % 3 == 0:
+                    storage.update(key, {"title": "updated"})
+        return run
+
+    def compact():
+        while not done.is_set():
+            compactor.compact()
+
+    def write_then_stop():
+        run_threads(*(write(storage, index * 1000) for index, storage in enumerate(writers)))
+        done.set()
+
+    run_threads(compact, write_then_stop)
+    rows = {row["id"]: row for row in append_storage(tmp_path).load()}
+    assert sorted(rows) == [index * 1000 + key for index in range(3) for key in range(300)]
+    assert all((row["title"] == "updated") == (key % 3 == 0) for key, row in rows.items())
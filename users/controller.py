@@ -1,8 +1,11 @@
-import json
-import os
 from datetime import datetime
-from typing import List
+from typing import Iterator, List
 
+from board.versioning import boards_with_tasks_of_user, bump_board_versions
+from common.instrumentation import span
+from common.pagination import paginate
+from common.schema import new_bulk_results, parse_timestamp, trusted_model
+from common.storage import get_storage
 from common.user_team_linking import UserTeamLinkingBase
 
 from .schema import UserRequest, UserListResponse, UserTeamResponse
@@ -10,18 +13,11 @@ from .schema import UserRequest, UserListResponse, UserTeamResponse
 
 class UserController:
     def __init__(self):
-        self.user_file = os.path.join("db", 'users.json')
+        self.storage = get_storage("users")
         self.users = []
 
-    def _save_users(self):
-        with open(self.user_file, 'w') as f:
-            json.dump(self.users, f)
-
     def _load_users(self):
-        self.users = []
-
-        for line in open(self.user_file, 'r'):
-            self.users.extend(json.loads(line))
+        self.users = self.storage.load()
 
     def create_user(self, user_data: UserRequest) -> int:
         """
@@ -39,24 +35,60 @@ class UserController:
             * name can be max 64 characters
             * display name can be max 64 characters
         """
-        self._load_users()
-
-        # Check if the user name already exists
-        if any(t['name'] == user_data.name for t in self.users):
-            raise ValueError("User name already exists")
+        with self.storage.transaction():
+            # Check if the user name already exists
+            if self.storage.find("name", user_data.name):
+                raise ValueError("User name already exists")
 
-        user_id = len(self.users) + 1
+            user_id = self.storage.next_id()
 
-        user_data = user_data.dict()
-        user_data['creation_time'] = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-        user_data['id'] = user_id
-        self.users.append(user_data)
-        self._save_users()
+            user_data = user_data.dict()
+            user_data['creation_time'] = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+            user_data['id'] = user_id
+            self.storage.insert(user_data)
         return user_id
 
-    def list_users(self) -> List[UserListResponse]:
+    def create_users_bulk(self, users: List[UserRequest]) -> List[dict]:
         """
-        List all users.
+        Create many users, validated in one pass and persisted in one write.
+
+        :param users: A list of user details, as for create_user
+        :return: One result per user, in request order
+        [
+          {"index" : <position in the request>, "id" : "<user_id>", "error" : "<reason it was not created>"}
+        ]
+
+        Constraint:
+            * same as create_user, users violating them are reported and skipped
+        """
+        results = new_bulk_results(len(users))
+
+        with self.storage.transaction():
+            valid = []
+            names = set()
+            for index, user in enumerate(users):
+                if user.name in names or self.storage.find("name", user.name):
+                    results[index]["error"] = "User name already exists"
+                    continue
+                names.add(user.name)
+                valid.append(index)
+
+            creation_time = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+            rows = []
+            for index, user_id in zip(valid, self.storage.next_ids(len(valid)) if valid else []):
+                user_data = users[index].dict()
+                user_data['creation_time'] = creation_time
+                user_data['id'] = user_id
+                rows.append(user_data)
+                results[index]["id"] = user_id
+
+            if rows:
+                self.storage.insert_many(rows)
+        return results
+
+    def list_users(self, after_id: int = None, limit: int = None) -> List[UserListResponse]:
+        """
+        List all users, or one page of them when after_id/limit are given.
 
         :return: A list with the response
         [
@@ -67,21 +99,15 @@ class UserController:
           }
         ]
         """
-        self._load_users()
+        with span("model.list_users"):
+            return list(self.iter_users(after_id, limit))
 
-        if not self.users:
-            return []
-
-        user_list = []
-        for user in self.users:
-            user_list.append(UserListResponse(
-                id=user['id'],
-                name=user['name'],
-                display_name=user['display_name'],
-                description=user['description'],
-                creation_time=datetime.strptime(user['creation_time'], '%Y-%m-%d %H:%M:%S')
-            ))
-        return user_list
+    def iter_users(self, after_id: int = None, limit: int = None) -> Iterator[UserListResponse]:
+        """
+        Lazily yield the users in id order, starting after after_id, at most limit of them.
+        """
+        for user in paginate(self.storage.scan_after(after_id), limit=limit):
+            yield trusted_model(UserListResponse, user, creation_time=parse_timestamp(user['creation_time']))
 
     def describe_user(self, user_data: dict) -> UserListResponse:
         """
@@ -102,13 +128,7 @@ class UserController:
 
         """
         user = self._get_user_by_id(user_data['id'])
-        return UserListResponse(
-            id=user['id'],
-            name=user['name'],
-            display_name=user['display_name'],
-            description=user['description'],
-            creation_time=datetime.strptime(user['creation_time'], '%Y-%m-%d %H:%M:%S')
-        )
+        return trusted_model(UserListResponse, user, creation_time=parse_timestamp(user['creation_time']))
 
     def update_user(self, user_data: dict) -> int:
         """
@@ -124,13 +144,17 @@ class UserController:
         """
 
         user_id = user_data['id']
-        user = self._get_user_by_id(user_id)
+        self._get_user_by_id(user_id)
         updated_user = user_data['user']
+        changes = {}
         if 'display_name' in updated_user:
-            user['display_name'] = updated_user['display_name']
+            changes['display_name'] = updated_user['display_name']
         if 'description' in updated_user:
-            user['description'] = updated_user['description']
-        self._save_users()
+            changes['description'] = updated_user['description']
+        self.storage.update(user_id, changes)
+
+        # the user is shown in the export of the boards with tasks assigned to them
+        bump_board_versions(boards_with_tasks_of_user(user_id))
         return user_id
 
     def get_user_teams(self, user_id) -> List[UserTeamResponse]:
@@ -153,12 +177,10 @@ class UserController:
         return user_team_linking.get_teams_of_a_user(user_id)
 
     def _get_user_by_id(self, user_id: int) -> dict:
-        self._load_users()
-
-        for user in self.users:
-            if user['id'] == user_id:
-                return user
-        raise ValueError('User not found')
+        user = self.storage.get(user_id)
+        if user is None:
+            raise ValueError('User not found')
+        return user
 
     def get_all_user_data(self):
         self._load_users()
@@ -1,40 +1,64 @@
 from typing import List
 
-from fastapi import APIRouter, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, status
 from pydantic import PositiveInt
 
+from common.concurrency import AsyncProxy
+from common.conditional import Conditional, StoreVersion
+from common.pagination import ListFormat, PageParams, ndjson_response
+from common.schema import BulkResponse
+
 from .controller import UserController
-from .schema import UserRequest, UserResponse, UserListResponse, UserUpdateRequest, UserTeamResponse
+from .schema import (
+    UserBulkCreateRequest,
+    UserRequest,
+    UserResponse,
+    UserListResponse,
+    UserUpdateRequest,
+    UserTeamResponse,
+)
 
 router = APIRouter(
     prefix="/users",
     tags=["users"]
 )
 
-user_controller = UserController()
+user_controller = AsyncProxy.lazy(UserController)
 
 
 @router.post("/users", status_code=status.HTTP_201_CREATED, response_model=UserResponse)
 async def create_user(request: UserRequest):
     try:
-        user_id = user_controller.create_user(request)
+        user_id = await user_controller.create_user(request)
         return {"id": user_id}
     except ValueError as e:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
 
 
+@router.post("/users/bulk", response_model=BulkResponse)
+async def create_users_bulk(request: UserBulkCreateRequest):
+    results = await user_controller.create_users_bulk(request.users)
+    return BulkResponse.from_results(results)
+
+
 @router.get("/users", response_model=List[UserListResponse])
-async def list_users():
+async def list_users(page: PageParams = Depends(), version: Conditional = Depends(StoreVersion("users"))):
+    if version.not_modified:
+        return version.not_modified_response()
     try:
-        return user_controller.list_users()
+        if page.format == ListFormat.NDJSON:
+            return version.tag(ndjson_response(user_controller.target.iter_users(page.after_id, page.limit)))
+        return version.tag(await user_controller.as_response.list_users(page.after_id, page.limit))
     except ValueError as e:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
 
 
 @router.get("/users/{user_id}", response_model=UserListResponse)
-async def describe_user(user_id: PositiveInt):
+async def describe_user(user_id: PositiveInt, version: Conditional = Depends(StoreVersion("users"))):
+    if version.not_modified:
+        return version.not_modified_response()
     try:
-        return user_controller.describe_user({"id": user_id})
+        return version.tag(await user_controller.describe_user({"id": user_id}))
     except ValueError as e:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
 
@@ -42,15 +66,18 @@ async def describe_user(user_id: PositiveInt):
 @router.put("/users/{user_id}", status_code=status.HTTP_200_OK, response_model=UserResponse)
 async def update_user(user_id: PositiveInt, request: UserUpdateRequest):
     try:
-        user_id = user_controller.update_user({"id": user_id, "user": request.dict()})
+        user_id = await user_controller.update_user({"id": user_id, "user": request.dict()})
         return {"id": user_id}
     except ValueError as e:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
 
 
 @router.get("/users/{user_id}/teams", response_model=List[UserTeamResponse])
-async def get_user_teams(user_id: PositiveInt):
+async def get_user_teams(user_id: PositiveInt,
+                         version: Conditional = Depends(StoreVersion("user_team_linking", "teams"))):
+    if version.not_modified:
+        return version.not_modified_response()
     try:
-        return user_controller.get_user_teams(user_id)
+        return version.tag(await user_controller.as_response.get_user_teams(user_id))
     except ValueError as e:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
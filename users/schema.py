@@ -1,6 +1,9 @@
 from datetime import datetime
+from typing import List
 
-from pydantic import BaseModel, constr
+from pydantic import BaseModel, Field, constr
+
+from common.schema import BULK_MAX_ITEMS
 
 
 class UserRequest(BaseModel):
@@ -12,6 +15,13 @@ class UserRequest(BaseModel):
     description: constr(max_length=256)
 
 
+class UserBulkCreateRequest(BaseModel):
+    """
+    Request format for bulk create users method
+    """
+    users: List[UserRequest] = Field(..., max_items=BULK_MAX_ITEMS)
+
+
 class UserResponse(BaseModel):
     """
     Response format for create user method